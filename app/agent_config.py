@@ -5,45 +5,204 @@ Centralized agent registration and configuration module
 for the metro train disruption multi-agent response system.
 """
  
-from agents.TrainBreakdownAgent import TrainBreakdownAgent
-from agents.DriverCoordinationAgent import DriverCoordinationAgent
-from agents.DepotMaintenanceAgent import DepotMaintenanceAgent
-from agents.PublicCommunicationAgent import PublicCommunicationAgent
-from agents.IncidentResolutionAgent import IncidentResolutionAgent
-from agents.InternalNotificationAgent import InternalNotificationAgent
-from agents.PublicUpdateAgent import PublicUpdateAgent
- 
-# Global list of initialized agents
-# (In practice, these can be managed by a planner or passed to an orchestrator)
-agents = {
-    "TrainBreakdownAgent": TrainBreakdownAgent(),
-    "DriverCoordinationAgent": DriverCoordinationAgent(),
-    "DepotMaintenanceAgent": DepotMaintenanceAgent(),
-    "PublicCommunicationAgent": PublicCommunicationAgent(),
-    "IncidentResolutionAgent": IncidentResolutionAgent(),
-    "InternalNotificationAgent": InternalNotificationAgent(),
-    "PublicUpdateAgent": PublicUpdateAgent()
+import importlib
+import os
+from typing import Any, Callable, Dict, List
+ 
+# Registered agents: name -> "module:factory". Modules are only imported
+# when an agent is first built, so importing this file stays cheap.
+AGENT_FACTORIES: Dict[str, str] = {
+    "TrainBreakdownAgent": "agents.TrainBreakdownAgent:create_train_breakdown_agent",
+    "DriverCoordinationAgent": "agents.DriverCoordinationAgent:create_driver_coordination_agent",
+    "DepotMaintenanceAgent": "agents.DepotMaintenanceAgent:create_depot_maintenance_agent",
+    "PublicCommunicationAgent": "agents.PublicCommunicationAgent:create_public_communication_agent",
+    "IncidentResolutionAgent": "agents.IncidentResolutionAgent:create_incident_resolution_agent",
+    "InternalNotificationAgent": "agents.InternalNotificationAgent:create_internal_notification_agent",
+    "PublicUpdateAgent": "agents.PublicUpdateAgent:create_public_update_agent"
+}
+ 
+# Agents built by get_agent(), keyed by name
+agents = {}
+ 
+# How MetroPlanner runs the team:
+# - "graph": follow AGENT_GRAPH, running independent agents concurrently
+# - "round_robin": every agent speaks in turn and sees the whole transcript
+EXECUTION_MODE = os.getenv("METRO_EXECUTION_MODE", "graph")
+ 
+# Dependency graph of the response workflow: agent -> agents it waits for.
+# Declaration order is also the order steps are reported in.
+AGENT_GRAPH: Dict[str, List[str]] = {
+    "TrainBreakdownAgent": [],
+    "DriverCoordinationAgent": ["TrainBreakdownAgent"],
+    "DepotMaintenanceAgent": ["TrainBreakdownAgent"],
+    "PublicCommunicationAgent": ["TrainBreakdownAgent"],
+    "IncidentResolutionAgent": ["DriverCoordinationAgent", "DepotMaintenanceAgent", "PublicCommunicationAgent"],
+    "InternalNotificationAgent": ["IncidentResolutionAgent"],
+    "PublicUpdateAgent": ["IncidentResolutionAgent"],
+}
+ 
+# Seconds an agent's turn may take before it is cancelled and its fallback step
+# is used instead. Driver coordination waits on crew availability lookups and
+# incident resolution on the incident's resolved event (METRO_RESOLUTION_TIMEOUT),
+# so they get longer; agents without an entry use METRO_AGENT_TIMEOUT.
+AGENT_TIMEOUTS: Dict[str, float] = {
+    "DriverCoordinationAgent": 60.0,
+    "IncidentResolutionAgent": 60.0
 }
  
+# Agents whose turn is one tool call with arguments taken from the report. In
+# graph mode they run that call without the model when the report parses
+# cleanly (see planner/DirectTools.py). METRO_DIRECT_AGENTS overrides the list
+# with comma-separated names, or "none" to ask the model for every turn.
+DIRECT_AGENTS: List[str] = [
+    "TrainBreakdownAgent",
+    "IncidentResolutionAgent",
+    "InternalNotificationAgent",
+    "PublicUpdateAgent",
+]
+ 
+# Model context strategy per agent (see agents/model_context.py). Agents early
+# in the workflow only need the report; later ones get a rolling summary of the
+# transcript instead of all of it. METRO_CONTEXT_STRATEGY overrides the strategy
+# of every agent, e.g. "unbounded" to measure the baseline.
+AGENT_CONTEXT_STRATEGIES: Dict[str, Dict[str, Any]] = {
+    "TrainBreakdownAgent": {"strategy": "buffered", "buffer_size": 4},
+    "DriverCoordinationAgent": {"strategy": "buffered", "buffer_size": 6},
+    "DepotMaintenanceAgent": {"strategy": "buffered", "buffer_size": 6},
+    "PublicCommunicationAgent": {"strategy": "token_limited", "token_limit": 2000},
+    "IncidentResolutionAgent": {"strategy": "rolling_summary", "keep_last": 4},
+    "InternalNotificationAgent": {"strategy": "rolling_summary", "keep_last": 4},
+    "PublicUpdateAgent": {"strategy": "rolling_summary", "keep_last": 4},
+}
+ 
+def get_agent_factory(name: str) -> Callable:
+    """
+    Imports and returns the factory function of a registered agent.
+ 
+    Args:
+        name (str): Name of the registered agent.
+ 
+    Returns:
+        Callable: The agent's create_*_agent function.
+ 
+    Raises:
+        ValueError: If the agent name is not registered.
+    """
+    if name not in AGENT_FACTORIES:
+        raise ValueError(f"Agent '{name}' is not registered.")
+    module_name, factory_name = AGENT_FACTORIES[name].split(":")
+    return getattr(importlib.import_module(module_name), factory_name)
+ 
+def create_agent(name: str, **kwargs):
+    """
+    Builds a new instance of a registered agent.
+ 
+    Args:
+        name (str): Name of the registered agent.
+        **kwargs: Passed to the agent's factory (e.g. model_client_stream).
+ 
+    Returns:
+        AssistantAgent: A new agent instance, or None if the factory failed.
+    """
+    return get_agent_factory(name)(**kwargs)
+ 
 def get_agent(name: str):
     """
-    Retrieve an agent by its name.
+    Retrieve an agent by its name, building it on first use.
  
     Args:
         name (str): Name of the registered agent.
  
     Returns:
-        ConversableAgent: Instance of the agent.
+        AssistantAgent: Shared instance of the agent.
  
     Raises:
         ValueError: If the agent name is not registered.
     """
     if name not in agents:
-        raise ValueError(f"Agent '{name}' is not registered.")
+        agents[name] = create_agent(name)
     return agents[name]
  
 def list_agents():
     """
     Returns a list of all registered agent names.
     """
-    return list(agents.keys())
\ No newline at end of file
+    return list(AGENT_FACTORIES.keys())
+ 
+def get_context_strategy(name: str) -> Dict[str, Any]:
+    """
+    Returns the model context strategy of an agent, e.g. {"strategy": "buffered", "buffer_size": 6}.
+ 
+    Agents without an entry keep the full transcript ("unbounded").
+    """
+    override = os.getenv("METRO_CONTEXT_STRATEGY")
+    if override:
+        return {"strategy": override}
+    return AGENT_CONTEXT_STRATEGIES.get(name, {"strategy": "unbounded"})
+ 
+def get_direct_agents() -> List[str]:
+    """
+    Returns the agents that may skip the model for their tool call.
+ 
+    Defaults to DIRECT_AGENTS; METRO_DIRECT_AGENTS overrides it.
+    """
+    override = os.getenv("METRO_DIRECT_AGENTS")
+    if override is None:
+        return DIRECT_AGENTS
+    if override.strip().lower() == "none":
+        return []
+    return [name.strip() for name in override.split(",") if name.strip()]
+ 
+def get_agent_timeout(name: str) -> float:
+    """
+    Returns the turn timeout of an agent in seconds.
+ 
+    Agents without an entry in AGENT_TIMEOUTS use METRO_AGENT_TIMEOUT (default 45).
+    """
+    return AGENT_TIMEOUTS.get(name, float(os.getenv("METRO_AGENT_TIMEOUT", "45")))
+ 
+def get_execution_levels(graph: Dict[str, List[str]] = AGENT_GRAPH) -> List[List[str]]:
+    """
+    Groups the agents of a dependency graph into levels that can run concurrently.
+ 
+    Every agent appears in the first level after all of its dependencies.
+    Within a level, agents keep their declaration order.
+ 
+    Args:
+        graph (dict): Mapping of agent name to the agent names it depends on.
+ 
+    Returns:
+        list: Levels of agent names, in execution order.
+ 
+    Raises:
+        ValueError: If the graph references unknown agents or contains a cycle.
+    """
+    for name, dependencies in graph.items():
+        unknown = [dep for dep in dependencies if dep not in graph]
+        if unknown:
+            raise ValueError(f"Agent '{name}' depends on unregistered agents: {unknown}")
+ 
+    levels = []
+    done = set()
+    remaining = list(graph)
+    while remaining:
+        level = [name for name in remaining if all(dep in done for dep in graph[name])]
+        if not level:
+            raise ValueError(f"Agent graph contains a cycle between: {remaining}")
+        levels.append(level)
+        done.update(level)
+        remaining = [name for name in remaining if name not in done]
+    return levels
+ 
+def get_ancestors(name: str, graph: Dict[str, List[str]] = AGENT_GRAPH) -> List[str]:
+    """
+    Returns every agent that must finish before the given agent, in declaration order.
+    """
+    ancestors = set()
+    stack = list(graph.get(name, []))
+    while stack:
+        dep = stack.pop()
+        if dep not in ancestors:
+            ancestors.add(dep)
+            stack.extend(graph.get(dep, []))
+    return [agent for agent in graph if agent in ancestors]
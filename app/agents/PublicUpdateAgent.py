@@ -7,39 +7,31 @@ Built using AutoGen v0.5.6 using AssistantAgent and FunctionTool.
 """
 
 from autogen_agentchat.agents import AssistantAgent
-from autogen_core.tools import FunctionTool
+from tools.tool_executor import PooledFunctionTool
 from tools.PostPublicUpdateTool import post_public_update
 from dotenv import load_dotenv
 from config.llm_config import get_llm_config
 import os
+from agents.client import create_model_client_for_agent
+from agents.model_context import create_model_context_for_agent
+from prompts import load_prompt
 
 load_dotenv()
 
-# Define system behavior for the agent
-SYSTEM_MESSAGE = """You are the Public Update Agent in the metro disruption response system.
-
-Responsibilities:
-- Create and post a final update to inform the public that normal service has been restored
-- Keep the message positive, clear, and concise
-- Include the lines/stations affected and confirmation that they are now operational
-- Thank the public for their patience
-
-Use only the registered tool. Be professional and customer-focused.
-"""
-
 # Initialize the AutoGen-compatible Function wrapper
-post_public_update_tool = FunctionTool(
+post_public_update_tool = PooledFunctionTool(
     post_public_update,
     name="post_public_update",
-    description="Posts a final status update informing the public that normal service has been restored."
+    description="Posts a final status update to every public channel informing the public that normal service has been restored."
 )
 
-def create_public_update_agent(llm_config=None):
+def create_public_update_agent(llm_config=None, model_client_stream=False):
     """
     Creates and returns a PublicUpdateAgent instance configured with appropriate tools.
     
     Args:
         llm_config (dict, optional): Configuration for the language model. Defaults to None.
+        model_client_stream (bool, optional): Stream model output chunks as events. Defaults to False.
     
     Returns:
         AssistantAgent: The configured PublicUpdateAgent.
@@ -48,30 +40,15 @@ def create_public_update_agent(llm_config=None):
     if llm_config is None:
         llm_config = get_llm_config()
     
-    # Create a model client using the Azure configuration
-    from autogen_ext.models.azure import AzureAIChatCompletionClient
-    from azure.core.credentials import AzureKeyCredential
-    
-    model_client = AzureAIChatCompletionClient(
-        endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
-        credential=AzureKeyCredential(os.getenv('AZURE_OPENAI_API_KEY')),
-        model=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),  # This is needed for GitHub Models
-        model_info={
-            "json_output": False,
-            "function_calling": True,  # Enable function calling for tools
-            "vision": False,
-            "family": "unknown",
-            "structured_output": False
-        }
-    )
+    # Use the centralized client factory so all agents share one connection pool
+    model_client = create_model_client_for_agent()
     
     # Return the configured agent with the model_client
     return AssistantAgent(
         name="PublicUpdateAgent",
-        system_message=SYSTEM_MESSAGE,
+        system_message=load_prompt("PublicUpdateAgent.txt"),
         model_client=model_client,
-        tools=[post_public_update_tool]
+        model_context=create_model_context_for_agent("PublicUpdateAgent", model_client),
+        tools=[post_public_update_tool],
+        model_client_stream=model_client_stream
     )
-
-# Create the agent instance for direct import
-PublicUpdateAgent = create_public_update_agent()
\ No newline at end of file
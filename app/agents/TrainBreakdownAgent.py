@@ -6,7 +6,7 @@ Built using AutoGen v0.5.6.
 """
 
 from autogen_agentchat.agents import AssistantAgent
-from autogen_core.tools import FunctionTool
+from tools.tool_executor import PooledFunctionTool
 from tools.LogIncidentTool import log_incident
 from dotenv import load_dotenv
 from config.llm_config import get_llm_config
@@ -14,33 +14,25 @@ import os
 
 # Import your client factory
 from agents.client import create_model_client_for_agent
+from agents.model_context import create_model_context_for_agent
+from prompts import load_prompt
 
 load_dotenv()
 
-# Define system behavior for the agent
-SYSTEM_MESSAGE = """You are the Train Breakdown Agent.
-
-Your job is to:
-- Receive a description of a metro disruption (e.g., station, line, or area).
-- Use the log_incident tool to register the event.
-- Acknowledge the incident using only tool output. Do not invent facts.
-
-Format your response with "🚨 " at the beginning to indicate it's a critical incident response.
-"""
-
 # Initialize the AutoGen-compatible Function wrapper
-log_incident_tool = FunctionTool(
+log_incident_tool = PooledFunctionTool(
     log_incident,
     name="log_incident",
     description="Logs a metro train breakdown at a specified location."
 )
 
-def create_train_breakdown_agent(llm_config=None):
+def create_train_breakdown_agent(llm_config=None, model_client_stream=False):
     """
     Creates and returns a TrainBreakdownAgent instance configured with appropriate tools.
     
     Args:
         llm_config (dict, optional): Configuration for the language model. Defaults to None.
+        model_client_stream (bool, optional): Stream model output chunks as events. Defaults to False.
     
     Returns:
         AssistantAgent: The configured TrainBreakdownAgent.
@@ -54,14 +46,13 @@ def create_train_breakdown_agent(llm_config=None):
         # Create agent with model_client as required by v0.5.6
         return AssistantAgent(
             name="TrainBreakdownAgent",
-            system_message=SYSTEM_MESSAGE,
+            system_message=load_prompt("TrainBreakdownAgent.txt"),
             model_client=model_client,
-            tools=[log_incident_tool]
+            model_context=create_model_context_for_agent("TrainBreakdownAgent", model_client),
+            tools=[log_incident_tool],
+            model_client_stream=model_client_stream
         )
     except Exception as e:
         print(f"Error creating TrainBreakdownAgent: {e}")
         # Just use the fallback in MetroPlanner instead, so return None
         return None
-
-# Create the agent instance for direct import
-TrainBreakdownAgent = create_train_breakdown_agent()
\ No newline at end of file
@@ -1,203 +1,379 @@
-import os
+"""
+client.py
+
+Model clients for the metro agents.
+
+Agents get their client from the shared model registry. When no Azure OpenAI
+credentials are configured (or METRO_MODEL_BACKEND=mock), the registry serves
+MockModelClient: an offline stand-in that speaks the full ChatCompletionClient
+interface, calls the agents' tools, and simulates model latency and failures,
+so the planner can be exercised and benchmarked without a network.
+
+Mock settings (environment variables):
+- METRO_MOCK_LATENCY: "none", "fixed:<seconds>" or "lognormal:<median>,<sigma>" (default none)
+- METRO_MOCK_TAIL: "<probability>:<seconds>" extra delay added to a fraction of calls (default none)
+- METRO_MOCK_TOKEN_DELAY: seconds between streamed chunks (default 0)
+- METRO_MOCK_ERROR_RATE: fraction of calls that raise MockModelError (default 0)
+- METRO_MOCK_SEED: seed for latency and error sampling (default random)
+- METRO_MOCK_SCRIPT: JSON file with per-agent scripted turns (default: call every tool, then answer)
+"""
+
 import asyncio
-from typing import Dict, Any
-from dotenv import load_dotenv
 import json
+import math
+import os
+import random
+import re
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    CreateResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+    SystemMessage,
+    UserMessage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from dotenv import load_dotenv
+from pydantic import BaseModel
 
 # Load environment variables
 load_dotenv()
 
-print(f"Azure OpenAI Configuration:")
-print(f"  Endpoint: {os.getenv('AZURE_OPENAI_ENDPOINT')}")
-print(f"  Deployment: {os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME')}")
-print(f"  Model: {os.getenv('AZURE_OPENAI_MODEL_NAME', 'gpt-4o')}")
-print(f"  API Version: {os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-01')}")
-print(f"  API Key: {os.getenv('AZURE_OPENAI_API_KEY')[:5]}...{os.getenv('AZURE_OPENAI_API_KEY')[-5:] if os.getenv('AZURE_OPENAI_API_KEY') else 'Not set'}")
-# Create a shared client instance to reuse across all agents
-_shared_client = None
+from config.model_registry import MODEL_INFO, get_model_registry
 
 def create_model_client_for_agent():
     """
-    Creates an Azure OpenAI model client for AutoGen agents using the same approach 
-    that worked in test_custom.py
+    Returns the model client for an AutoGen agent.
+
+    All agents share the clients held by the model registry, which pools HTTP
+    connections and limits in-flight requests per endpoint.
     """
-    global _shared_client
-    
-    # If we already created a client, return it (singleton pattern)
-    if _shared_client is not None:
-        return _shared_client
-    
-    # Always use MockModelClient for now to avoid Azure errors
-    # This guarantees the app will work while you debug Azure issues
-    _shared_client = MockModelClient()
-    print("Using MockModelClient for all agents to ensure stability")
-    return _shared_client
-    
-    # Check required environment variables
-    required_vars = ['AZURE_OPENAI_ENDPOINT', 'AZURE_OPENAI_API_KEY', 'AZURE_OPENAI_DEPLOYMENT_NAME']
-    for var in required_vars:
-        if not os.getenv(var):
-            print(f"ERROR: Missing required environment variable {var}")
-            return MockModelClient()
-    
-    try:
-        # Try to create a real client with Azure OpenAI
-        print(f"Using deployment: {os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME')}")
-        
-        # Import just what we need
-        from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
-        
-        # Instead of the client that didn't work, try the one from test_custom.py
-        client = AzureOpenAIChatCompletionClient(
-            azure_endpoint=os.getenv('AZURE_OPENAI_ENDPOINT'),
-            azure_deployment=os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME'),
-            api_key=os.getenv('AZURE_OPENAI_API_KEY'),
-            api_version=os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-01'),
-            model=os.getenv('AZURE_OPENAI_MODEL_NAME', "gpt-4o"),
-            model_info={
-                "json_output": False,
-                "function_calling": True,
-                "vision": False,
-                "family": "chat_completion", 
-                "structured_output": False
-            }
+    return get_model_registry().get_client()
+
+
+class MockModelError(Exception):
+    """An injected model failure, standing in for a 429/5xx from the real endpoint."""
+
+
+class LatencyModel:
+    """
+    Samples the delay of one simulated model call.
+
+    The base delay is fixed or lognormal; on top of that, a fraction of calls
+    (tail_probability) take tail_seconds longer, like a throttled or cold replica.
+    """
+
+    def __init__(self, kind: str = "none", median: float = 0.0, sigma: float = 0.0,
+                 tail_probability: float = 0.0, tail_seconds: float = 0.0):
+        if kind not in ("none", "fixed", "lognormal"):
+            raise ValueError(f"Unknown latency model '{kind}'. Use none, fixed or lognormal.")
+        self.kind = kind
+        self.median = median
+        self.sigma = sigma
+        self.tail_probability = tail_probability
+        self.tail_seconds = tail_seconds
+
+    @classmethod
+    def parse(cls, spec: Optional[str], tail: Optional[str] = None) -> "LatencyModel":
+        """
+        Builds a latency model from the METRO_MOCK_LATENCY / METRO_MOCK_TAIL syntax.
+
+        Args:
+            spec (str): "none", "fixed:0.4" or "lognormal:0.4,0.5" (median seconds, sigma).
+            tail (str, optional): "0.01:3" adds 3 seconds to 1% of calls.
+
+        Returns:
+            LatencyModel: The parsed model.
+        """
+        kind, _, params = (spec or "none").strip().partition(":")
+        values = [float(v) for v in params.split(",") if v.strip()]
+        median = values[0] if values else 0.0
+        sigma = values[1] if len(values) > 1 else 0.0
+
+        tail_probability, tail_seconds = 0.0, 0.0
+        if tail:
+            probability, _, seconds = tail.partition(":")
+            tail_probability, tail_seconds = float(probability), float(seconds or 0)
+        return cls(kind.lower(), median, sigma, tail_probability, tail_seconds)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            delay = self.median
+        elif self.kind == "lognormal" and self.median > 0:
+            delay = rng.lognormvariate(math.log(self.median), self.sigma)
+        else:
+            delay = 0.0
+        if self.tail_probability and rng.random() < self.tail_probability:
+            delay += self.tail_seconds
+        return delay
+
+
+def _agent_name(messages: Sequence[LLMMessage]) -> str:
+    """Recovers the agent name ("Train Breakdown Agent" -> "TrainBreakdownAgent") from the system message."""
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            match = re.search(r"You are the ((?:[A-Z][a-z]+ )+)Agent", message.content)
+            if match:
+                return match.group(1).replace(" ", "") + "Agent"
+    return "default"
+
+
+def _incident_text(messages: Sequence[LLMMessage]) -> str:
+    for message in messages:
+        if isinstance(message, UserMessage) and isinstance(message.content, str):
+            return message.content.strip()
+    return "the reported disruption"
+
+
+def _location(incident: str) -> str:
+    match = re.search(r"\b(?:at|near|between)\s+([A-Z][\w' -]*?)(?=\s+(?:due|because|after|during|on|with)\b|[.,;!]|$)", incident)
+    return match.group(1).strip() if match else incident
+
+
+def _tool_parameters(tool: Union[Tool, ToolSchema]) -> Dict[str, Any]:
+    schema = tool.schema if isinstance(tool, Tool) else tool
+    return schema.get("parameters", {}).get("properties", {})
+
+
+def _tool_name(tool: Union[Tool, ToolSchema]) -> str:
+    return tool.name if isinstance(tool, Tool) else tool["name"]
+
+
+def _default_arguments(tool: Union[Tool, ToolSchema], incident: str, location: str) -> Dict[str, Any]:
+    """Fills a tool's parameters from the incident text: numbers from the parameter description, text from the incident."""
+    arguments: Dict[str, Any] = {}
+    for name, spec in _tool_parameters(tool).items():
+        if spec.get("type") in ("integer", "number"):
+            number = re.search(r"\d+", spec.get("description", ""))
+            arguments[name] = int(number.group()) if number else 1
+        elif spec.get("type") == "boolean":
+            arguments[name] = True
+        elif name == "location":
+            arguments[name] = location
+        else:
+            arguments[name] = incident
+    return arguments
+
+
+def _fill(value: Any, variables: Dict[str, str]) -> Any:
+    """Substitutes {incident}, {location} and {agent} in scripted strings."""
+    if isinstance(value, str):
+        for key, replacement in variables.items():
+            value = value.replace("{" + key + "}", replacement)
+        return value
+    if isinstance(value, dict):
+        return {k: _fill(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, variables) for v in value]
+    return value
+
+
+class MockModelClient(ChatCompletionClient):
+    """
+    An offline ChatCompletionClient for development and load testing.
+
+    Each call is answered from the agent's script when one is configured, and
+    otherwise by the default behaviour: on the first turn call every offered
+    tool with arguments taken from the incident, and after tool results reply
+    with a short text summary. Latency and failures are sampled per call.
+
+    A script maps agent names (or "*") to a list of turns, or to an object with
+    "turns", "latency", "tail" and "error_rate" keys. A turn is one of
+    {"content": "..."}, {"tool_calls": [{"name": ..., "arguments": {...}}]} or
+    {"error": "..."}. Turn n answers the agent's n-th model call within a run;
+    once the turns run out the default behaviour takes over.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[LatencyModel] = None,
+        error_rate: float = 0.0,
+        token_delay: float = 0.0,
+        scripts: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None,
+        model_info: Optional[ModelInfo] = None,
+        max_tokens: int = 128000,
+    ):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.scripts = {name: self._normalize_script(script) for name, script in (scripts or {}).items()}
+        self.max_tokens = max_tokens
+        self._model_info = model_info or MODEL_INFO
+        self._rng = random.Random(seed)
+
+        self._actual_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "MockModelClient":
+        """Creates a mock client configured from the METRO_MOCK_* environment variables."""
+        scripts = None
+        script_path = os.getenv("METRO_MOCK_SCRIPT")
+        if script_path:
+            with open(script_path, encoding="utf-8") as f:
+                scripts = json.load(f)
+        seed = os.getenv("METRO_MOCK_SEED")
+        return cls(
+            latency=LatencyModel.parse(os.getenv("METRO_MOCK_LATENCY"), os.getenv("METRO_MOCK_TAIL")),
+            error_rate=float(os.getenv("METRO_MOCK_ERROR_RATE", "0")),
+            token_delay=float(os.getenv("METRO_MOCK_TOKEN_DELAY", "0")),
+            scripts=scripts,
+            seed=int(seed) if seed else None,
         )
-        
-        print("Created shared Azure OpenAI model client for all agents")
-        _shared_client = client
-        return client
-        
-    except Exception as e:
-        print(f"Failed to create Azure client: {str(e)}")
-        print("Falling back to MockModelClient")
-        _shared_client = MockModelClient()
-        return _shared_client
-
-class MockModelClient:
-    """A mock model client that simulates responses without calling OpenAI"""
-    
-    def __init__(self):
-        self.name = "MockModelClient"
-        # Add model_info attribute to fix the error
-        self.model_info = {
-            "json_output": False,
-            "function_calling": True,
-            "vision": False,
-            "family": "chat_completion", 
-            "structured_output": False
-        }
-    # Add this right after the load_dotenv() call
-
-    async def create(self, messages=None, **kwargs):
-        """Simulate creating a completion response"""
-        # Extract the last user message content
-        user_message = "Unknown request"
-        for msg in messages:
-            if msg.get("role") == "user":
-                user_message = msg.get("content", "")
-                
-        # Log the request details for debugging
-        print(f"MockModelClient received request: {user_message[:50]}...")
-        
-        # Generate a response based on keywords in the request
-        if "breakdown" in user_message.lower() or "incident" in user_message.lower():
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": "I need to log this incident immediately."
-                        }
-                    }
-                ]
-            }
-        elif "driver" in user_message.lower() or "bus" in user_message.lower():
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": "I'll coordinate with the bus drivers now."
-                        }
-                    }
-                ]
-            }
-        elif "depot" in user_message.lower() or "maintenance" in user_message.lower():
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": "I'll notify the maintenance team to prepare buses."
-                        }
-                    }
-                ]
-            }
-        elif "communication" in user_message.lower() or "public" in user_message.lower():
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": "I'll draft a public announcement for social media."
-                        }
-                    }
-                ]
-            }
-            
-        # If tools were provided and tool usage is needed, generate a tool call
-        if kwargs.get("tools") and len(kwargs["tools"]) > 0:
-            tool_name = kwargs["tools"][0]["function"]["name"]
-            
-            # Common arguments for different tools
-            arguments = {}
-            
-            if "log_incident" in tool_name:
-                arguments = {"location": "Downtown station"}
-            elif "notify" in tool_name:
-                arguments = {"message": "Reporting for duty"}
-            elif "confirm" in tool_name:
-                arguments = {"status": "confirmed"}
-            elif "draft" in tool_name:
-                arguments = {"message": "Service disruption announcement"}
-            elif "post" in tool_name:
-                arguments = {"channel": "all", "message": "Service update"}
-            elif "check" in tool_name:
-                arguments = {"id": "incident-123"}
-            
-            return {
-                "choices": [
-                    {
-                        "message": {
-                            "role": "assistant",
-                            "content": None,
-                            "tool_calls": [
-                                {
-                                    "id": "call_123",
-                                    "type": "function",
-                                    "function": {
-                                        "name": tool_name,
-                                        "arguments": json.dumps(arguments)
-                                    }
-                                }
-                            ]
-                        }
-                    }
+
+    @staticmethod
+    def _normalize_script(script: Any) -> Dict[str, Any]:
+        if isinstance(script, list):
+            script = {"turns": script}
+        normalized = dict(script)
+        normalized.setdefault("turns", [])
+        if "latency" in normalized or "tail" in normalized:
+            normalized["latency"] = LatencyModel.parse(normalized.get("latency"), normalized.get("tail"))
+        return normalized
+
+    def _script_for(self, agent: str) -> Dict[str, Any]:
+        return self.scripts.get(agent) or self.scripts.get("*") or {"turns": []}
+
+    async def _simulate_call(self, script: Dict[str, Any], cancellation_token: Optional[CancellationToken]) -> None:
+        """Waits out the sampled latency and raises an injected error when one is drawn."""
+        self.calls += 1
+        delay = script.get("latency", self.latency).sample(self._rng)
+        if delay > 0:
+            sleep = asyncio.ensure_future(asyncio.sleep(delay))
+            if cancellation_token is not None:
+                cancellation_token.link_future(sleep)
+            await sleep
+        error_rate = script.get("error_rate", self.error_rate)
+        if error_rate and self._rng.random() < error_rate:
+            self.errors += 1
+            raise MockModelError("Injected model error (simulated 503 from the model endpoint)")
+
+    def _respond(self, messages: Sequence[LLMMessage], tools: Sequence[Union[Tool, ToolSchema]],
+                 script: Dict[str, Any], agent: str) -> Union[str, List[FunctionCall]]:
+        incident = _incident_text(messages)
+        variables = {"incident": incident, "location": _location(incident), "agent": agent}
+
+        turn_index = sum(1 for m in messages if isinstance(m, AssistantMessage))
+        turns = script["turns"]
+        if turn_index < len(turns):
+            turn = _fill(turns[turn_index], variables)
+            if "error" in turn:
+                self.errors += 1
+                raise MockModelError(turn["error"])
+            if turn.get("tool_calls"):
+                return [
+                    FunctionCall(id=f"call_{uuid.uuid4().hex[:12]}", name=call["name"],
+                                 arguments=json.dumps(call.get("arguments", {})))
+                    for call in turn["tool_calls"]
                 ]
-            }
-                
-        # Default generic response
-        return {
-            "choices": [
-                {
-                    "message": {
-                        "role": "assistant",
-                        "content": "I'm handling this metro disruption situation."
-                    }
-                }
+            return turn.get("content", "")
+
+        last = messages[-1] if messages else None
+        if isinstance(last, FunctionExecutionResultMessage):
+            results = "; ".join(result.content for result in last.content)
+            return f"{agent} completed its actions for {variables['location']}: {results}"
+        if tools:
+            return [
+                FunctionCall(id=f"call_{uuid.uuid4().hex[:12]}", name=_tool_name(tool),
+                             arguments=json.dumps(_default_arguments(tool, incident, variables["location"])))
+                for tool in tools
             ]
+        return f"{agent} acknowledges the incident at {variables['location']}."
+
+    def _result(self, messages: Sequence[LLMMessage], tools: Sequence[Union[Tool, ToolSchema]],
+                content: Union[str, List[FunctionCall]]) -> CreateResult:
+        prompt_tokens = self.count_tokens(messages, tools=tools)
+        if isinstance(content, str):
+            completion_tokens = max(len(content) // 4, 1)
+            finish_reason = "stop"
+        else:
+            completion_tokens = sum(len(call.name) + len(call.arguments) for call in content) // 4 + 1
+            finish_reason = "function_calls"
+        usage = RequestUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self._actual_usage = usage
+        self._total_usage = RequestUsage(
+            prompt_tokens=self._total_usage.prompt_tokens + prompt_tokens,
+            completion_tokens=self._total_usage.completion_tokens + completion_tokens,
+        )
+        return CreateResult(finish_reason=finish_reason, content=content, usage=usage, cached=False)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        agent = _agent_name(messages)
+        script = self._script_for(agent)
+        await self._simulate_call(script, cancellation_token)
+        content = self._respond(messages, tools, script, agent)
+        return self._result(messages, tools, content)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        # The sampled latency is the time to first chunk; text then streams word by word
+        agent = _agent_name(messages)
+        script = self._script_for(agent)
+        await self._simulate_call(script, cancellation_token)
+        content = self._respond(messages, tools, script, agent)
+        if isinstance(content, str):
+            for chunk in re.findall(r"\S+\s*", content):
+                if self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                yield chunk
+        yield self._result(messages, tools, content)
+
+    async def close(self) -> None:
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._actual_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        # Roughly four characters per token, which is close enough for English prompts
+        text = "".join(str(m.content) for m in messages)
+        text += "".join(json.dumps(t.schema if isinstance(t, Tool) else t) for t in tools)
+        return len(text) // 4 + 3 * len(messages)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self.max_tokens - self.count_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self._model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._model_info
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self._total_usage.prompt_tokens,
+            "completion_tokens": self._total_usage.completion_tokens,
         }
-    
-    async def close(self):
-        """Mock close method"""
-        pass
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+model_context.py
+
+Model context strategies for the metro agents.
+
+In a round-robin chat every agent receives the whole transcript on top of its
+own tool calls and results, so prompt size grows with every turn. Each agent's model context
+decides which of those messages actually go into its prompt:
+
+- "unbounded": everything (AutoGen's default)
+- "buffered": the last buffer_size messages
+- "token_limited": recent messages up to token_limit tokens
+- "rolling_summary": the incident report, a condensed line per older message,
+  and the last keep_last messages verbatim
+
+The strategy of each agent is configured in agent_config.AGENT_CONTEXT_STRATEGIES.
+Every context is wrapped in a MeteredChatCompletionContext, which counts the
+prompt tokens sent with the strategy and what the full transcript would have cost.
+"""
+
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from autogen_core.model_context import (
+    BufferedChatCompletionContext,
+    ChatCompletionContext,
+    TokenLimitedChatCompletionContext,
+    UnboundedChatCompletionContext,
+)
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    UserMessage,
+)
+
+from agent_config import get_context_strategy
+
+CONTEXT_STRATEGIES = ("unbounded", "buffered", "token_limited", "rolling_summary")
+
+
+def _first_line(text: str, max_chars: int) -> str:
+    line = " ".join(str(text).split())
+    return line if len(line) <= max_chars else line[: max_chars - 1].rstrip() + "…"
+
+
+class RollingSummaryChatCompletionContext(ChatCompletionContext):
+    """
+    Keeps the first message (the incident report) and the last keep_last
+    messages verbatim, and replaces everything in between with one summary
+    message of a single condensed line per message.
+
+    Summaries are extractive, so no extra model call is made; each message is
+    condensed once and the summary grows by one line as messages age out. While
+    the summary would be no shorter than the messages it replaces, the full
+    transcript is returned instead.
+    """
+
+    def __init__(self, keep_last: int = 4, line_chars: int = 160,
+                 initial_messages: Optional[List[LLMMessage]] = None):
+        super().__init__(initial_messages)
+        if keep_last <= 0:
+            raise ValueError("keep_last must be greater than 0.")
+        self._keep_last = keep_last
+        self._line_chars = line_chars
+        self._summary_lines: List[str] = []
+        self._summarized = 1  # messages [1, _summarized) are already in _summary_lines
+
+    def _summarize(self, message: LLMMessage) -> Optional[str]:
+        if isinstance(message, UserMessage):
+            return f"- {message.source}: {_first_line(message.content, self._line_chars)}"
+        if isinstance(message, AssistantMessage):
+            if isinstance(message.content, str):
+                return f"- you: {_first_line(message.content, self._line_chars)}"
+            return "- you called: " + ", ".join(call.name for call in message.content)
+        if isinstance(message, FunctionExecutionResultMessage):
+            results = "; ".join(result.content for result in message.content)
+            return f"- tool result: {_first_line(results, self._line_chars)}"
+        return None
+
+    async def get_messages(self) -> List[LLMMessage]:
+        if len(self._messages) <= self._keep_last + 1:
+            return list(self._messages)
+
+        tail_start = len(self._messages) - self._keep_last
+        # Never separate tool results from the call that produced them
+        while tail_start > 1 and isinstance(self._messages[tail_start], FunctionExecutionResultMessage):
+            tail_start -= 1
+
+        for message in self._messages[self._summarized:tail_start]:
+            line = self._summarize(message)
+            if line:
+                self._summary_lines.append(line)
+        self._summarized = max(self._summarized, tail_start)
+
+        head = self._messages[:1]
+        if not self._summary_lines:
+            return head + self._messages[tail_start:]
+        summary = UserMessage(
+            content="Summary of earlier messages:\n" + "\n".join(self._summary_lines),
+            source="summary",
+        )
+        # Short messages can cost less verbatim than summarized
+        middle_chars = sum(len(str(message.content)) for message in self._messages[1:tail_start])
+        if len(summary.content) >= middle_chars:
+            return list(self._messages)
+        return head + [summary] + self._messages[tail_start:]
+
+    async def clear(self) -> None:
+        await super().clear()
+        self._summary_lines = []
+        self._summarized = 1
+
+    async def load_state(self, state: Mapping[str, Any]) -> None:
+        await super().load_state(state)
+        self._summary_lines = []
+        self._summarized = 1
+
+
+class MeteredChatCompletionContext(ChatCompletionContext):
+    """
+    Wraps a context strategy and records, for every model call, the prompt
+    tokens of the messages the strategy returned and of the full transcript.
+    """
+
+    def __init__(self, inner: ChatCompletionContext, count_tokens: Callable[[List[LLMMessage]], int],
+                 strategy: str = "unbounded"):
+        super().__init__()
+        self.inner = inner
+        self.strategy = strategy
+        self._count_tokens = count_tokens
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.unbounded_prompt_tokens = 0
+
+    async def add_message(self, message: LLMMessage) -> None:
+        await super().add_message(message)
+        await self.inner.add_message(message)
+
+    async def get_messages(self) -> List[LLMMessage]:
+        messages = await self.inner.get_messages()
+        self.model_calls += 1
+        self.prompt_tokens += self._count_tokens(messages)
+        self.unbounded_prompt_tokens += self._count_tokens(self._messages)
+        return messages
+
+    async def clear(self) -> None:
+        await super().clear()
+        await self.inner.clear()
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.unbounded_prompt_tokens = 0
+
+    async def save_state(self) -> Mapping[str, Any]:
+        return await self.inner.save_state()
+
+    async def load_state(self, state: Mapping[str, Any]) -> None:
+        await super().load_state(state)
+        await self.inner.load_state(state)
+
+    def stats(self) -> Dict[str, Any]:
+        saved = self.unbounded_prompt_tokens - self.prompt_tokens
+        return {
+            "strategy": self.strategy,
+            "model_calls": self.model_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "unbounded_prompt_tokens": self.unbounded_prompt_tokens,
+            "saved_tokens": saved,
+            "saved_ratio": round(saved / self.unbounded_prompt_tokens, 4) if self.unbounded_prompt_tokens else 0.0,
+        }
+
+
+def _token_counter(model_client: ChatCompletionClient) -> Callable[[List[LLMMessage]], int]:
+    def count(messages: List[LLMMessage]) -> int:
+        if not messages:
+            return 0
+        try:
+            return model_client.count_tokens(messages)
+        except Exception:
+            # Tokenizer unavailable (e.g. offline without tiktoken data): about four characters per token
+            return sum(len(str(message.content)) for message in messages) // 4
+    return count
+
+
+def create_model_context(model_client: ChatCompletionClient, strategy: str = "unbounded",
+                         **options: Any) -> ChatCompletionContext:
+    """
+    Builds one of the supported context strategies.
+
+    Args:
+        model_client (ChatCompletionClient): Used by "token_limited" to count tokens.
+        strategy (str): One of CONTEXT_STRATEGIES.
+        **options: buffer_size, token_limit, keep_last or line_chars, depending on the strategy.
+
+    Returns:
+        ChatCompletionContext: The context.
+
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    if strategy == "unbounded":
+        return UnboundedChatCompletionContext()
+    if strategy == "buffered":
+        return BufferedChatCompletionContext(buffer_size=options.get("buffer_size", 6))
+    if strategy == "token_limited":
+        return TokenLimitedChatCompletionContext(model_client, token_limit=options.get("token_limit", 2000))
+    if strategy == "rolling_summary":
+        return RollingSummaryChatCompletionContext(
+            keep_last=options.get("keep_last", 4), line_chars=options.get("line_chars", 160)
+        )
+    raise ValueError(f"Unknown model context strategy '{strategy}'. Use one of {CONTEXT_STRATEGIES}.")
+
+
+def create_model_context_for_agent(name: str, model_client: ChatCompletionClient) -> MeteredChatCompletionContext:
+    """
+    Builds the metered model context configured for an agent in agent_config.
+
+    Args:
+        name (str): Name of the registered agent.
+        model_client (ChatCompletionClient): The agent's model client.
+
+    Returns:
+        MeteredChatCompletionContext: The configured strategy, with token accounting.
+    """
+    options = dict(get_context_strategy(name))
+    strategy = options.pop("strategy", "unbounded")
+    inner = create_model_context(model_client, strategy, **options)
+    return MeteredChatCompletionContext(inner, _token_counter(model_client), strategy=strategy)
@@ -1,36 +1,133 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from planner.MetroPlanner import MetroPlanner
+from planner.TeamFactory import team_pool_stats
+from planner.JobQueue import QueueFullError, get_job_queue
+from planner.RequestCoalescer import get_coalescer
+from planner.DirectTools import get_direct_turn_stats
+from config.model_registry import get_model_registry
+from prompts import get_prompt_registry
+from tools.tool_executor import get_tool_executor
+from services.driver_dispatch import get_dispatch_engine
+from services.ack_tracker import get_ack_tracker
+from services.incident_store import get_incident_store
+from services.public_publisher import get_public_publisher
+from services.notification_bus import OVERFLOW_POLICIES, get_notification_bus
 import asyncio
+import json
+import os
+import time
 import traceback
 
-router = APIRouter(prefix="/api/metro_task", tags=["metro_task"])
+# Mounted under /api/metro_task by main.py
+router = APIRouter(tags=["metro_task"])
 
 # Input model for text-based tasks
 class MetroTaskTextInput(BaseModel):
     text: str
 
+# Input model for batches: incidents run concurrently, at most `concurrency`
+# at a time (capped at METRO_BATCH_CONCURRENCY)
+class MetroBatchInput(BaseModel):
+    incidents: List[str]
+    concurrency: Optional[int] = None
+
 # Output model for task results  
 class Step(BaseModel):
     name: str
     content: str
 
 class MetroTaskResult(BaseModel):
+    # "completed", "partial" (run budget or deadline ran out, or an agent timed
+    # out and fell back) or "error"
     status: str
     message: Optional[str] = None
     steps: List[Step]
+    # Why the run ended, e.g. a turn, token or time limit of its RunBudget
+    stop_reason: Optional[str] = None
+    # Agents whose turn exceeded their timeout and whose fallback step was used
+    timed_out_agents: Optional[List[str]] = None
+    # Agents that ran their tool call without the model (see planner/DirectTools.py)
+    direct_agents: Optional[List[str]] = None
+    # Milliseconds each agent took, keyed by agent name (absent for fallback responses)
+    timings: Optional[Dict[str, float]] = None
+    # Prompt tokens per agent with its context strategy vs. the full transcript
+    context_tokens: Optional[Dict[str, Dict[str, Any]]] = None
+    # Set when the run went through the coalescer: the normalized incident and
+    # whether this report joined a run started by an earlier, matching report
+    incident_key: Optional[str] = None
+    coalesced: Optional[bool] = None
+
+# Job mode: the incident runs in the background and is polled by ID
+class MetroJobSubmitted(BaseModel):
+    job_id: str
+    status: str
+
+class MetroJobStatus(BaseModel):
+    job_id: str
+    status: str
+    version: int
+    message: Optional[str] = None
+    steps: List[Step]
+    timings: Dict[str, float]
+    queued_ms: float
+    run_ms: Optional[float] = None
+
+# Driver acknowledgments of a dispatch, posted by the paging gateway
+class DriverAckInput(BaseModel):
+    dispatch_id: str
+    driver_ids: List[str]
+
+class DriverAckStatus(BaseModel):
+    dispatch_id: str
+    # Drivers the dispatch reached; null while acks arrive before the dispatch is registered
+    recipients: Optional[int] = None
+    ack_count: int
+    waiting: int
+
+# Status change of an incident, posted by the operations feed
+class IncidentStatusInput(BaseModel):
+    status: str
+
+# Longest a GET /jobs/{job_id} or GET /incidents/{incident_id} request may be held open
+MAX_JOB_WAIT_SECONDS = 30.0
+
+# How often /run/text checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Incidents of one batch that run at the same time, and the largest batch accepted
+BATCH_CONCURRENCY = int(os.getenv("METRO_BATCH_CONCURRENCY", "8"))
+MAX_BATCH_SIZE = int(os.getenv("METRO_BATCH_MAX_SIZE", "500"))
 
 # Dependency to get a MetroPlanner instance
 def get_planner():
     return MetroPlanner()
 
 @router.post("/run/text", response_model=MetroTaskResult)
-async def run_task_text(task: MetroTaskTextInput, planner: MetroPlanner = Depends(get_planner)):
-    """Run the metro task planner with a text input"""
+async def run_task_text(
+    task: MetroTaskTextInput,
+    request: Request,
+    timeout: Optional[float] = Query(None, gt=0, description="Seconds until the run's deadline"),
+    planner: MetroPlanner = Depends(get_planner)
+):
+    """
+    Run the metro task planner with a text input.
+
+    When the client disconnects, the run's in-flight model and tool calls are
+    cancelled (unless matching reports are still waiting for it).
+    """
     try:
         print(f"Running metro task with input: {task.text}")
-        result = await planner.run(task.text)
+        run = asyncio.create_task(get_coalescer().run(planner, task.text, timeout=timeout))
+        while not run.done():
+            await asyncio.wait({run}, timeout=DISCONNECT_POLL_SECONDS)
+            if not run.done() and await request.is_disconnected():
+                print("Client disconnected, cancelling the run")
+                run.cancel()
+                return {"status": "error", "message": "Client disconnected", "steps": []}
+        result = run.result()
         print(f"Task completed with status: {result['status']}")
         return result
     except Exception as e:
@@ -42,6 +139,119 @@ async def run_task_text(task: MetroTaskTextInput, planner: MetroPlanner = Depend
             "steps": []
         }
 
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/run/stream")
+async def run_task_stream(
+    task: MetroTaskTextInput,
+    tokens: bool = False,
+    timeout: Optional[float] = Query(None, gt=0, description="Seconds until the run's deadline"),
+    planner: MetroPlanner = Depends(get_planner)
+):
+    """
+    Run the metro task planner and stream each step as a Server-Sent Event.
+
+    Events:
+    - step:  a formatted Step, sent as soon as the agent finishes its turn
+    - token: a model output chunk {"name", "content"} (only when ?tokens=true)
+    - done:  the final {"status", "message", "timings", "timed_out_agents", "direct_agents", "incident_key", "coalesced"} of the run
+
+    Reports of an incident that is already running attach to that run. Closing
+    the stream cancels the run once no other report is following it.
+    """
+    async def event_source():
+        try:
+            print(f"Streaming metro task with input: {task.text}")
+            async for event in get_coalescer().run_stream(planner, task.text, stream_tokens=tokens, timeout=timeout):
+                if event["event"] == "step":
+                    yield _format_sse("step", Step(**event["data"]).model_dump())
+                else:
+                    yield _format_sse(event["event"], event["data"])
+        except Exception as e:
+            print(f"Error in streamed task: {str(e)}")
+            traceback.print_exc()
+            yield _format_sse("done", {"status": "error", "message": f"Server error: {str(e)}"})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/run/batch")
+async def run_task_batch(
+    batch: MetroBatchInput,
+    timeout: Optional[float] = Query(None, gt=0, description="Deadline of each run in seconds"),
+    planner: MetroPlanner = Depends(get_planner)
+):
+    """
+    Run a list of incidents and stream each result as a line of NDJSON.
+
+    Lines arrive in completion order as {"index", "incident", "elapsed_ms", "result"},
+    where result is a MetroTaskResult; a failing incident gets an error result and
+    the batch carries on. The last line is {"summary": {...}} with status counts
+    and timings. Closing the response cancels the incidents still running.
+
+    Every incident gets a run of its own: batches replay shifts or drills, where
+    repeated reports are separate incidents rather than duplicates to coalesce.
+    """
+    if not batch.incidents:
+        raise HTTPException(status_code=422, detail="incidents must not be empty")
+    if len(batch.incidents) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_SIZE} incidents per batch")
+    concurrency = max(1, min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(index: int, text: str) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = MetroTaskResult(**await planner.run(text, timeout=timeout)).model_dump()
+            except Exception as e:
+                print(f"Error in batch item {index}: {str(e)}")
+                traceback.print_exc()
+                result = {"status": "error", "message": f"Server error: {str(e)}", "steps": []}
+            return {
+                "index": index,
+                "incident": text,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                "result": result
+            }
+
+    async def lines():
+        print(f"Running batch of {len(batch.incidents)} incidents, {concurrency} at a time")
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(run_item(index, text)) for index, text in enumerate(batch.incidents)]
+        statuses: Dict[str, int] = {}
+        elapsed = []
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                statuses[item["result"]["status"]] = statuses.get(item["result"]["status"], 0) + 1
+                elapsed.append(item["elapsed_ms"])
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        elapsed.sort()
+        wall_seconds = time.perf_counter() - started
+        yield json.dumps({"summary": {
+            "incidents": len(tasks),
+            "concurrency": concurrency,
+            "statuses": statuses,
+            "wall_ms": round(wall_seconds * 1000, 1),
+            "incidents_per_second": round(len(tasks) / wall_seconds, 3) if wall_seconds else 0.0,
+            "item_ms": {
+                "mean": round(sum(elapsed) / len(elapsed), 1),
+                "p50": elapsed[len(elapsed) // 2],
+                "max": elapsed[-1]
+            }
+        }}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 # New route that just returns fallback steps without running the full workflow
 @router.post("/fallback/text", response_model=MetroTaskResult)
 async def get_fallback_steps(task: MetroTaskTextInput, planner: MetroPlanner = Depends(get_planner)):
@@ -66,4 +276,187 @@ async def get_fallback_steps(task: MetroTaskTextInput, planner: MetroPlanner = D
             "status": "error",
             "message": f"Server error generating fallback: {str(e)}",
             "steps": []
-        }
\ No newline at end of file
+        }
+
+@router.post("/jobs", response_model=MetroJobSubmitted, status_code=202)
+async def submit_job(task: MetroTaskTextInput):
+    """
+    Queue an incident and return its job ID immediately.
+
+    The job runs on one of the METRO_JOB_WORKERS background workers; poll
+    GET /jobs/{job_id} for its steps. Returns 503 when the queue is full.
+    """
+    try:
+        job = get_job_queue().submit(task.text)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    print(f"Queued metro job {job.id} with input: {task.text}")
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/jobs/{job_id}", response_model=MetroJobStatus)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0.0, ge=0, description="Seconds to wait for a change (long-poll)"),
+    since: int = Query(-1, description="Version the client already has; wait returns once the job is newer")
+):
+    """
+    Get a job's status and the steps produced so far.
+
+    With ?wait=N the request is held for up to N seconds (max 30) until the job
+    changes after version `since` or finishes.
+    """
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    await queue.wait(job, since_version=since, timeout=min(wait, MAX_JOB_WAIT_SECONDS))
+    return job.snapshot()
+
+@router.post("/acks", response_model=DriverAckStatus)
+async def ingest_driver_acks(acks: DriverAckInput):
+    """
+    Record driver acknowledgments of a dispatch sent by notify_driver.
+
+    Wakes any confirm_driver_ack call waiting on the dispatch. Repeated acks of
+    the same driver are counted once.
+    """
+    return get_ack_tracker().record_ack(acks.dispatch_id, acks.driver_ids).to_dict()
+
+@router.get("/acks/{dispatch_id}", response_model=DriverAckStatus)
+async def get_driver_acks(dispatch_id: str):
+    """Get the ack progress of a dispatch."""
+    record = get_ack_tracker().get(dispatch_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dispatch: {dispatch_id}")
+    return record.to_dict()
+
+@router.get("/incidents")
+async def list_incidents(
+    station: Optional[str] = Query(None, description="Station name, e.g. central"),
+    line: Optional[str] = Query(None, description="Line name, e.g. red"),
+    status: Optional[str] = Query(None, description="open or resolved"),
+    since: Optional[float] = Query(None, description="Only incidents reported at or after this Unix time"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """List recorded incidents, newest first."""
+    incidents = await get_incident_store().find(station=station, line=line, status=status, since=since, limit=limit)
+    return [incident.to_dict() for incident in incidents]
+
+@router.get("/incidents/{incident_id}")
+async def get_incident(
+    incident_id: str,
+    wait: float = Query(0.0, ge=0, description="Seconds to wait for the incident to reach `status` (long-poll)"),
+    status: str = Query("resolved", description="Status to wait for")
+):
+    """
+    Get an incident record.
+
+    With ?wait=N the request is held for up to N seconds (max 30) until the
+    incident reaches `status` (default resolved).
+    """
+    store = get_incident_store()
+    if wait > 0:
+        incident = await store.wait_for_status(incident_id, (status,), timeout=min(wait, MAX_JOB_WAIT_SECONDS))
+    else:
+        incident = await store.get(incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail=f"Unknown incident: {incident_id}")
+    return incident.to_dict()
+
+@router.post("/incidents/{incident_id}/status")
+async def set_incident_status(incident_id: str, update: IncidentStatusInput):
+    """
+    Ingest a status change from the operations feed, e.g. {"status": "resolved"}
+    once service has resumed.
+
+    Wakes check_incident_status calls and long-polls waiting on the incident.
+    """
+    try:
+        incident = await get_incident_store().update_status(incident_id, update.status)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if incident is None:
+        raise HTTPException(status_code=404, detail=f"Unknown incident: {incident_id}")
+    return incident.to_dict()
+
+@router.get("/notices/{notice_id}")
+async def get_notice(notice_id: str):
+    """Get the per-channel delivery status of a public notice."""
+    notice = get_public_publisher().get(notice_id)
+    if notice is None:
+        raise HTTPException(status_code=404, detail=f"Unknown notice: {notice_id}")
+    return notice.to_dict()
+
+@router.get("/notifications/stream")
+async def stream_notifications(
+    topics: str = Query(..., description="Comma-separated topics, e.g. role:bus_ops,line:red"),
+    name: str = Query("console", description="Subscriber name shown in /stats"),
+    policy: Optional[str] = Query(None, description=f"Overflow policy: {', '.join(OVERFLOW_POLICIES)}")
+):
+    """
+    Subscribe to internal notifications as Server-Sent Events.
+
+    Sends a `notification` event per notification on any of the topics. A
+    notification counts as acknowledged once its event was written out. The
+    subscription ends when the client disconnects.
+    """
+    topic_list = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    if not topic_list:
+        raise HTTPException(status_code=422, detail="No topics given")
+    bus = get_notification_bus()
+    try:
+        subscription = bus.subscribe(name, topic_list, policy=policy)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    async def event_source():
+        try:
+            yield _format_sse("subscribed", {"subscription_id": subscription.id, "topics": topic_list})
+            while True:
+                notification = await subscription.get()
+                yield _format_sse("notification", notification.to_dict())
+                subscription.ack(notification)
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Runtime statistics for capacity planning.
+
+    - team_pools: size, hit rate and wait times of the pooled agent teams
+    - model_clients: in-flight requests and connection pool use per model endpoint
+    - completion_cache: hit/miss/eviction counters (null when caching is disabled)
+    - jobs: queue depth, busy workers, and wait/run times of background jobs
+    - coalescing: runs started vs. duplicate reports that joined a running incident
+    - prompts: the version of every prompt file and how often they were reloaded
+    - tools: concurrency limit, timeout, queueing and execution times per tool
+    - dispatch: driver pages sent, delivered and retried, and rate-limited gateway requests
+    - acks: tracked dispatches, driver acks received and confirm_driver_ack waits
+    - incidents: incident store writes, group commit sizes and times, and reads
+    - publisher: per public channel, notices delivered, failed, retried and dropped, queue depth and latencies
+    - notification_bus: subscribers, fan-out, drops and acknowledgments of internal notifications
+    - direct_turns: per agent, turns that ran their tool without the model and why others asked it
+    """
+    registry = get_model_registry()
+    return {
+        "jobs": get_job_queue().stats(),
+        "coalescing": get_coalescer().stats(),
+        "team_pools": team_pool_stats(),
+        "model_clients": registry.stats(),
+        "completion_cache": registry.cache_stats(),
+        "prompts": get_prompt_registry().stats(),
+        "tools": get_tool_executor().stats(),
+        "dispatch": get_dispatch_engine().stats(),
+        "acks": get_ack_tracker().stats(),
+        "incidents": get_incident_store().stats(),
+        "publisher": get_public_publisher().stats(),
+        "notification_bus": get_notification_bus().stats(),
+        "direct_turns": get_direct_turn_stats().stats()
+    }
@@ -0,0 +1,100 @@
+"""
+import_time.py
+
+Measures the cold-start import time of the FastAPI app: what a fresh uvicorn
+worker pays before it can serve its first request.
+
+Each run imports the module in a new interpreter. Interpreter start-up time is
+measured separately and subtracted, and the slowest imports of the last run
+are listed using Python's -X importtime.
+
+Usage (from the app/ directory):
+    python -m benchmarks.import_time --runs 5
+    python -m benchmarks.import_time --module main --top 20 --json import_time.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+
+def _timed_run(code: str, importtime: bool = False) -> Tuple[float, str]:
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", code]
+    started = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{completed.stderr[-2000:]}")
+    return elapsed, completed.stderr
+
+
+def _slowest_imports(importtime_output: str, top: int) -> List[Dict[str, float]]:
+    """Parses -X importtime output into the modules with the largest cumulative time."""
+    modules = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        modules.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return modules[:top]
+
+
+def measure(module: str = "main", runs: int = 5, top: int = 15) -> Dict:
+    """
+    Imports a module in fresh interpreters and reports the timings.
+
+    Args:
+        module (str): Module to import, relative to the current directory.
+        runs (int): Number of cold imports to time.
+        top (int): Number of slowest imports to list.
+
+    Returns:
+        dict: Median/min/max import time in milliseconds and the slowest imports.
+    """
+    interpreter = statistics.median(_timed_run("pass")[0] for _ in range(runs))
+    timings = [_timed_run(f"import {module}")[0] - interpreter for _ in range(runs)]
+    _, importtime_output = _timed_run(f"import {module}", importtime=True)
+    return {
+        "module": module,
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "interpreter_startup_ms": round(interpreter * 1000, 1),
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "slowest_imports": _slowest_imports(importtime_output, top),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of the app.")
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=5, help="number of cold imports (default: 5)")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list (default: 15)")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.runs, args.top)
+    print(f"import {result['module']}: median {result['median_ms']} ms "
+          f"(min {result['min_ms']}, max {result['max_ms']}, {result['runs']} runs, "
+          f"interpreter start-up {result['interpreter_startup_ms']} ms excluded)")
+    print("\nSlowest imports (cumulative):")
+    for entry in result["slowest_imports"]:
+        print(f"  {entry['cumulative_ms']:9.1f} ms  {entry['module']}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+load_test.py
+
+Load test for the metro task API: latency percentiles, throughput, per-agent
+timings, prompt tokens and peak memory at several concurrency levels.
+
+By default the FastAPI app is driven in-process over an ASGI transport with the
+offline mock model backend (see agents/client.py), so no network or model
+deployment is needed. Request coalescing is off in-process unless
+METRO_COALESCE_WINDOW is set, since the sample incidents repeat. With --url
+the same requests go to a running server instead; pass --server-pid to also
+read that server's peak RSS.
+
+Results are written as JSON. --compare prints the change against an earlier
+result file, e.g. one produced on another commit.
+
+Usage (from the app/ directory):
+    python -m benchmarks.load_test --concurrency 1,4,16 --requests 64
+    python -m benchmarks.load_test --endpoint fallback/text --json fallback.json
+    METRO_MOCK_LATENCY=lognormal:0.3,0.5 python -m benchmarks.load_test --json after.json --compare before.json
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --server-pid 1234
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+API_PREFIX = "/api/metro_task"
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+INCIDENTS = [
+    "Train breakdown at Central Station due to a signal failure.",
+    "Train stalled at Redhill Station after a power outage.",
+    "Derailment near Harbor Point, northbound line suspended.",
+    "Brake fault reported at Riverside Station on the Blue Line.",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def histogram(latencies_ms: List[float]) -> Dict[str, int]:
+    counts = {f"<={bound}": 0 for bound in HISTOGRAM_BUCKETS_MS}
+    counts[f">{HISTOGRAM_BUCKETS_MS[-1]}"] = 0
+    for latency in latencies_ms:
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if latency <= bound:
+                counts[f"<={bound}"] += 1
+                break
+        else:
+            counts[f">{HISTOGRAM_BUCKETS_MS[-1]}"] += 1
+    return counts
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "p50": round(percentile(ordered, 50), 1),
+        "p95": round(percentile(ordered, 95), 1),
+        "p99": round(percentile(ordered, 99), 1),
+        "mean": round(sum(ordered) / len(ordered), 1) if ordered else 0.0,
+        "max": round(ordered[-1], 1) if ordered else 0.0,
+    }
+
+
+def peak_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Peak resident set size of this process, or of pid (Linux only)."""
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+@asynccontextmanager
+async def open_client(url: Optional[str], timeout: float) -> AsyncIterator[httpx.AsyncClient]:
+    """An HTTP client for a running server, or for the app in this process with its lifespan running."""
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    # Use the offline model and the incident simulator unless the caller chose
+    # otherwise, and run every request: the sample incidents repeat and would
+    # otherwise coalesce
+    os.environ.setdefault("METRO_MODEL_BACKEND", "mock")
+    os.environ.setdefault("METRO_COALESCE_WINDOW", "0")
+    os.environ.setdefault("METRO_INCIDENT_FEED", "simulator")
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://metro.test", timeout=timeout) as client:
+            yield client
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, requests: int,
+                    incidents: List[str]) -> Dict[str, Any]:
+    """Sends requests with a fixed number of concurrent workers and summarizes the responses."""
+    path = f"{API_PREFIX}/{endpoint.strip('/')}"
+    payloads = itertools.cycle(incidents)
+    remaining = iter(range(requests))
+    latencies: List[float] = []
+    agent_timings: Dict[str, List[float]] = {}
+    prompt_tokens = {"prompt_tokens": 0, "unbounded_prompt_tokens": 0}
+    outcomes: Dict[str, int] = {}
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json={"text": next(payloads)})
+                outcome = f"http_{response.status_code}"
+                if response.status_code == 200:
+                    body = response.json()
+                    outcome = body.get("status", "unknown")
+                    for agent, ms in (body.get("timings") or {}).items():
+                        agent_timings.setdefault(agent, []).append(ms)
+                    for usage in (body.get("context_tokens") or {}).values():
+                        prompt_tokens["prompt_tokens"] += usage["prompt_tokens"]
+                        prompt_tokens["unbounded_prompt_tokens"] += usage["unbounded_prompt_tokens"]
+            except httpx.HTTPError as e:
+                outcome = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "duration_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "error_rate": round(1 - outcomes.get("completed", 0) / requests, 4) if requests else 0.0,
+        "latency_ms": _summary(latencies),
+        "histogram_ms": histogram(latencies),
+        "agent_timings_ms": {agent: _summary(values) for agent, values in agent_timings.items()},
+        "prompt_tokens": prompt_tokens,
+    }
+
+
+async def run_benchmark(endpoint: str = "run/text", concurrency_levels: List[int] = [1, 4, 16],
+                        requests: int = 32, warmup: int = 2, url: Optional[str] = None,
+                        server_pid: Optional[int] = None, incidents: List[str] = INCIDENTS,
+                        timeout: float = 120.0) -> Dict[str, Any]:
+    """
+    Runs one load level per concurrency setting against a single endpoint.
+
+    Args:
+        endpoint (str): Path under /api/metro_task, e.g. "run/text" or "fallback/text".
+        concurrency_levels (list): Concurrent clients for each level.
+        requests (int): Requests sent per level.
+        warmup (int): Untimed requests sent first, so pools and imports are warm.
+        url (str, optional): Base URL of a running server; in-process when omitted.
+        server_pid (int, optional): PID of that server, to report its peak RSS.
+        incidents (list): Incident texts, sent round-robin.
+        timeout (float): Per-request timeout in seconds.
+
+    Returns:
+        dict: Run metadata and one result per concurrency level.
+    """
+    async with open_client(url, timeout) as client:
+        if warmup:
+            await run_level(client, endpoint, 1, warmup, incidents)
+        levels = []
+        for concurrency in concurrency_levels:
+            level = await run_level(client, endpoint, concurrency, requests, incidents)
+            level["peak_rss_mb"] = peak_rss_mb(server_pid) if url else peak_rss_mb()
+            levels.append(level)
+            print(f"  c={concurrency:<4} {level['rps']:8.2f} req/s  p50 {level['latency_ms']['p50']:8.1f} ms  "
+                  f"p95 {level['latency_ms']['p95']:8.1f} ms  p99 {level['latency_ms']['p99']:8.1f} ms  "
+                  f"errors {level['error_rate']:.1%}  prompt tokens {level['prompt_tokens']['prompt_tokens']} "
+                  f"(unbounded {level['prompt_tokens']['unbounded_prompt_tokens']})")
+
+    return {
+        "endpoint": endpoint,
+        "target": url or "in-process",
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in os.environ.items() if key.startswith("METRO_")},
+        "levels": levels,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Describes the change of each concurrency level against a baseline result."""
+    lines = [f"Compared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')}):"]
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for level in current["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            lines.append(f"  c={level['concurrency']}: no baseline")
+            continue
+        parts = []
+        for metric in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][metric], level["latency_ms"][metric]
+            change = f"{(new - old) / old:+.1%}" if old else "n/a"
+            parts.append(f"{metric} {old:.1f} -> {new:.1f} ms ({change})")
+        old_rps, new_rps = before["rps"], level["rps"]
+        parts.append(f"rps {old_rps:.2f} -> {new_rps:.2f} ({(new_rps - old_rps) / old_rps:+.1%})" if old_rps else "rps n/a")
+        lines.append(f"  c={level['concurrency']}: " + ", ".join(parts))
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the metro task API.")
+    parser.add_argument("--endpoint", default="run/text", help="path under /api/metro_task (default: run/text)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("--requests", type=int, default=32, help="requests per level (default: 32)")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed warm-up requests (default: 2)")
+    parser.add_argument("--url", help="base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--server-pid", type=int, help="PID of the server given by --url, for its peak RSS")
+    parser.add_argument("--incident", action="append", help="incident text to send (repeatable)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--json", dest="json_path", help="write the results to this file")
+    parser.add_argument("--compare", dest="baseline_path", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    print(f"Load testing /{args.endpoint.strip('/')} ({args.url or 'in-process'}), {args.requests} requests per level")
+    result = asyncio.run(run_benchmark(
+        endpoint=args.endpoint,
+        concurrency_levels=levels,
+        requests=args.requests,
+        warmup=args.warmup,
+        url=args.url,
+        server_pid=args.server_pid,
+        incidents=args.incident or INCIDENTS,
+        timeout=args.timeout,
+    ))
+
+    slowest = max(result["levels"], key=lambda level: level["concurrency"])
+    if slowest["agent_timings_ms"]:
+        print(f"\nPer-agent p95 at c={slowest['concurrency']}:")
+        for agent, summary in slowest["agent_timings_ms"].items():
+            print(f"  {agent:<28} {summary['p95']:8.1f} ms")
+
+    if args.baseline_path:
+        with open(args.baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        print("\n".join(compare(result, baseline)))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+completion_cache.py
+
+Caches chat completions so repeated incident shapes skip the model call.
+
+Entries are keyed on the system message (the version of the prompt file it
+came from, see prompts/__init__.py, or else its normalized text), message
+history, tool schemas and request options. Lookups go to an in-memory LRU with a TTL first,
+then to an optional SQLite file that survives restarts. Tool-calling responses
+are cached like any other completion; the tools themselves still run.
+
+Settings (environment variables):
+- METRO_COMPLETION_CACHE: "1" to enable caching (default off)
+- METRO_COMPLETION_CACHE_SIZE: max entries kept in memory (default 1024)
+- METRO_COMPLETION_CACHE_TTL: seconds an entry stays valid (default 3600)
+- METRO_COMPLETION_CACHE_PATH: SQLite file for the persistent tier (default: memory only)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+from autogen_core.models import CreateResult, LLMMessage, SystemMessage
+from autogen_core.tools import Tool, ToolSchema
+from dotenv import load_dotenv
+
+from config.model_registry import DelegatingModelClient
+from prompts import get_prompt_registry
+
+load_dotenv()
+
+# Responses that are safe to replay; errors and truncated output are not cached
+CACHEABLE_FINISH_REASONS = ("stop", "function_calls")
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _normalize_message(message: LLMMessage) -> Dict[str, Any]:
+    data = message.model_dump(mode="json")
+    if isinstance(message, SystemMessage):
+        # A registered prompt is keyed by its version instead of its full text
+        version = get_prompt_registry().version_of(message.content)
+        data["content"] = f"prompt:{version}" if version else _normalize_text(message.content)
+    # Tool call IDs are generated per call and never affect the answer
+    content = data.get("content")
+    if isinstance(content, list):
+        for item in content:
+            if isinstance(item, dict):
+                item.pop("id", None)
+                item.pop("call_id", None)
+    return data
+
+
+def _tool_schema(tool: Union[Tool, ToolSchema]) -> Any:
+    return tool.schema if isinstance(tool, Tool) else tool
+
+
+def make_cache_key(
+    namespace: str,
+    messages: Sequence[LLMMessage],
+    tools: Sequence[Union[Tool, ToolSchema]],
+    json_output: Any,
+    extra_create_args: Mapping[str, Any],
+) -> str:
+    """
+    Builds a stable cache key for a completion request.
+
+    Args:
+        namespace (str): Identifies the model endpoint, so deployments never share entries.
+        messages (list): The LLM messages of the request.
+        tools (list): Tools or tool schemas offered to the model.
+        json_output: The json_output option of the request.
+        extra_create_args (dict): Extra create arguments of the request.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    payload = {
+        "namespace": namespace,
+        "messages": [_normalize_message(m) for m in messages],
+        "tools": [_tool_schema(t) for t in tools],
+        "json_output": json_output if isinstance(json_output, (bool, type(None))) else json_output.__name__,
+        "extra_create_args": dict(extra_create_args),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class CompletionCache:
+    """
+    Two-tier completion store: an in-memory LRU with TTL in front of an
+    optional SQLite table.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM completions WHERE expires_at < ?", (time.time(),))
+                self._db.commit()
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.writes = 0
+
+    async def get(self, key: str) -> Optional[CreateResult]:
+        """Returns the cached completion for a key, or None."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at >= time.time():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return CreateResult.model_validate_json(value)
+            del self._memory[key]
+            self.expirations += 1
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None:
+                value, expires_at = row
+                self._remember(key, value, expires_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return CreateResult.model_validate_json(value)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, result: CreateResult) -> None:
+        """Stores a completion in memory and, when configured, on disk."""
+        value = result.model_dump_json()
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        self.writes += 1
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM completions WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row
+
+    def _db_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.path is not None,
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "writes": self.writes,
+        }
+
+
+class CachingModelClient(DelegatingModelClient):
+    """Answers repeated completion requests from a CompletionCache."""
+
+    def __init__(self, inner, cache: CompletionCache, namespace: str = "default"):
+        super().__init__(inner)
+        self._cache = cache
+        self._namespace = namespace
+
+    def _key(self, messages: Sequence[LLMMessage], kwargs: Dict[str, Any]) -> str:
+        return make_cache_key(
+            self._namespace,
+            messages,
+            kwargs.get("tools", []),
+            kwargs.get("json_output"),
+            kwargs.get("extra_create_args", {}),
+        )
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        key = self._key(messages, kwargs)
+        cached = await self._cache.get(key)
+        if cached is not None:
+            cached.cached = True
+            return cached
+
+        result = await super().create(messages, **kwargs)
+        if result.finish_reason in CACHEABLE_FINISH_REASONS:
+            await self._cache.set(key, result)
+        return result
+
+    async def create_stream(self, messages: Sequence[LLMMessage], **kwargs: Any) -> AsyncGenerator[Union[str, CreateResult], None]:
+        key = self._key(messages, kwargs)
+        cached = await self._cache.get(key)
+        if cached is not None:
+            cached.cached = True
+            if isinstance(cached.content, str):
+                yield cached.content
+            yield cached
+            return
+
+        async for chunk in super().create_stream(messages, **kwargs):
+            if isinstance(chunk, CreateResult) and chunk.finish_reason in CACHEABLE_FINISH_REASONS:
+                await self._cache.set(key, chunk)
+            yield chunk
+
+
+_cache: Optional[CompletionCache] = None
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """Returns the process-wide completion cache, or None when caching is disabled."""
+    global _cache
+    if os.getenv("METRO_COMPLETION_CACHE", "0").lower() not in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        _cache = CompletionCache(
+            max_entries=int(os.getenv("METRO_COMPLETION_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("METRO_COMPLETION_CACHE_TTL", "3600")),
+            path=os.getenv("METRO_COMPLETION_CACHE_PATH") or None,
+        )
+    return _cache
@@ -0,0 +1,141 @@
+"""
+metrics.py
+
+Prometheus metrics for the metro response system, served at GET /metrics.
+
+- metro_run_duration_seconds: wall-clock time of a run, by execution mode and status
+- metro_agent_turn_duration_seconds: time of each agent's turn that went through
+  the model, by agent
+- metro_direct_turn_duration_seconds: time of each agent's turn that ran its tool
+  without the model (see planner/DirectTools.py), by agent
+- metro_direct_turns_total: fast path decisions, by agent and outcome ("direct",
+  or why the model was asked after all)
+- metro_model_call_duration_seconds: model requests (after the endpoint's
+  concurrency slot was granted), by endpoint and outcome
+- metro_model_prompt_tokens_total / metro_model_completion_tokens_total:
+  RequestUsage of every model response, by endpoint
+- metro_tool_duration_seconds: tool executions, by tool and outcome
+- metro_tool_queue_seconds: time a tool call waited for its tool's concurrency
+  limit and a worker thread (see tools/tool_executor.py), by tool
+- metro_fallback_steps_total: fallback steps used instead of an agent reply, by agent and reason
+
+Every observation is a lock-protected add on a pre-registered series, so the
+instrumentation stays on in production. Without prometheus-client installed the
+metrics are no-ops and /metrics answers 503.
+"""
+
+import asyncio
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from autogen_core.models import RequestUsage
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+except ImportError:
+    CONTENT_TYPE_LATEST = "text/plain; charset=utf-8"
+    Counter = Histogram = generate_latest = None
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus-client is not installed."""
+
+    def labels(self, *args: Any, **kwargs: Any) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+
+def _histogram(name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+    if Histogram is None:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets)
+
+
+def _counter(name: str, documentation: str, labels: Tuple[str, ...]):
+    if Counter is None:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+
+RUN_DURATION = _histogram(
+    "metro_run_duration_seconds", "Wall-clock time of an incident run",
+    ("mode", "status"), (0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180),
+)
+AGENT_TURN_DURATION = _histogram(
+    "metro_agent_turn_duration_seconds", "Time of an agent's turn, including its model and tool calls",
+    ("agent",), (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 45, 60),
+)
+MODEL_CALL_DURATION = _histogram(
+    "metro_model_call_duration_seconds", "Time of a model request once its concurrency slot was granted",
+    ("endpoint", "outcome"), (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+PROMPT_TOKENS = _counter(
+    "metro_model_prompt_tokens_total", "Prompt tokens reported by model responses", ("endpoint",),
+)
+COMPLETION_TOKENS = _counter(
+    "metro_model_completion_tokens_total", "Completion tokens reported by model responses", ("endpoint",),
+)
+TOOL_DURATION = _histogram(
+    "metro_tool_duration_seconds", "Execution time of a tool call",
+    ("tool", "outcome"), (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+TOOL_QUEUE_DURATION = _histogram(
+    "metro_tool_queue_seconds", "Time a tool call waited before it started executing",
+    ("tool",), (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DIRECT_TURN_DURATION = _histogram(
+    "metro_direct_turn_duration_seconds", "Time of an agent's turn that ran its tool without the model",
+    ("agent",), (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 45, 60),
+)
+DIRECT_TURNS = _counter(
+    "metro_direct_turns_total", "Agent turns that skipped the model, or why they could not", ("agent", "outcome"),
+)
+FALLBACK_STEPS = _counter(
+    "metro_fallback_steps_total", "Fallback steps used instead of an agent's reply", ("agent", "reason"),
+)
+
+
+def outcome_of(error: Optional[BaseException]) -> str:
+    """The outcome label of a call that raised error (None when it succeeded)."""
+    if error is None:
+        return "ok"
+    # A closed stream (GeneratorExit) was abandoned by its consumer, like a cancellation
+    return "cancelled" if isinstance(error, (asyncio.CancelledError, GeneratorExit)) else "error"
+
+
+def observe_run(mode: str, status: str, seconds: float, agent_seconds: Dict[str, float],
+                direct_agents: Iterable[str] = ()) -> None:
+    """Records a finished run and the turn time of each agent that took part, direct turns apart."""
+    RUN_DURATION.labels(mode, status).observe(seconds)
+    direct_agents = set(direct_agents)
+    for agent, turn_seconds in agent_seconds.items():
+        histogram = DIRECT_TURN_DURATION if agent in direct_agents else AGENT_TURN_DURATION
+        histogram.labels(agent).observe(turn_seconds)
+
+
+def observe_model_call(endpoint: str, outcome: str, seconds: float, usage: Optional[RequestUsage] = None) -> None:
+    """Records a model request and the tokens of its response."""
+    MODEL_CALL_DURATION.labels(endpoint, outcome).observe(seconds)
+    if usage is not None:
+        PROMPT_TOKENS.labels(endpoint).inc(usage.prompt_tokens)
+        COMPLETION_TOKENS.labels(endpoint).inc(usage.completion_tokens)
+
+
+def record_fallback(agent: str, reason: str) -> None:
+    """Counts a fallback step, e.g. reason "error", "agent_timeout" or "deadline"."""
+    FALLBACK_STEPS.labels(agent, reason).inc()
+
+
+def record_direct_turn(agent: str, outcome: str) -> None:
+    """Counts a fast path decision, e.g. outcome "direct", "low_confidence" or "error"."""
+    DIRECT_TURNS.labels(agent, outcome).inc()
+
+
+def render_metrics() -> Optional[bytes]:
+    """The Prometheus text exposition of all metrics, or None when prometheus-client is missing."""
+    return generate_latest() if generate_latest is not None else None
+
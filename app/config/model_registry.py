@@ -0,0 +1,376 @@
+"""
+model_registry.py
+
+Single registry for the chat-completion clients used by every agent.
+
+All agents share one model client per endpoint, and all of those clients share
+one keep-alive HTTP connection pool. Each endpoint also has a cap on in-flight
+requests so a burst of incidents queues locally instead of overloading the
+deployment.
+
+Settings (environment variables):
+- METRO_MODEL_BACKEND: "azure" or "mock" (default: azure when credentials are set)
+- METRO_MODEL_MAX_CONCURRENCY: max in-flight model requests per endpoint (default 32)
+- METRO_HTTP_MAX_CONNECTIONS: max open connections in the shared pool (default 64)
+- METRO_HTTP_MAX_KEEPALIVE: max idle keep-alive connections (default 32)
+- METRO_HTTP_KEEPALIVE_EXPIRY: seconds an idle connection is kept open (default 120)
+- METRO_MODEL_PREWARM_CONNECTIONS: connections opened at startup (default 4)
+
+Completion caching is configured in config/completion_cache.py.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional, Sequence, Union
+
+import httpx
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelCapabilities, ModelInfo, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+from dotenv import load_dotenv
+from opentelemetry.trace import StatusCode
+from pydantic import BaseModel
+
+from config.metrics import observe_model_call, outcome_of
+from config.tracing import set_usage, tracer
+
+load_dotenv()
+
+MODEL_INFO: ModelInfo = {
+    "json_output": False,
+    "function_calling": True,
+    "vision": False,
+    "family": "unknown",
+    "structured_output": False,
+}
+
+
+class EndpointPool:
+    """The shared client, HTTP pool and concurrency limit for one model endpoint."""
+
+    def __init__(self, name: str, client: ChatCompletionClient, max_concurrency: int,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        self.name = name
+        self.client = client
+        self.http_client = http_client
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.total_wait = 0.0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the event loop that serves requests
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def __aenter__(self) -> "EndpointPool":
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.total_wait += time.monotonic() - started
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.in_flight -= 1
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.errors += 1
+        self.semaphore.release()
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Open and idle connections of the shared HTTP pool, when one is in use."""
+        if self.http_client is None:
+            return {}
+        # httpx does not expose its pool publicly; read it defensively
+        pool = getattr(getattr(self.http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        return {
+            "open": len(connections),
+            "idle": sum(1 for connection in connections if connection.is_idle()),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "utilization": round(self.in_flight / self.max_concurrency, 4),
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.total_wait / self.requests * 1000, 2) if self.requests else 0.0,
+            "connections": self.connection_stats(),
+        }
+
+
+class DelegatingModelClient(ChatCompletionClient):
+    """
+    Base for clients that wrap another ChatCompletionClient.
+
+    Usage, token counting and model info are forwarded to the wrapped client;
+    subclasses override create()/create_stream().
+    """
+
+    def __init__(self, inner: ChatCompletionClient):
+        self._inner = inner
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self._inner.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool | type[BaseModel]] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        async for chunk in self._inner.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            yield chunk
+
+    async def close(self) -> None:
+        # The registry owns and closes the underlying clients
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._inner.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self._inner.total_usage()
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return self._inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self._inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._inner.model_info
+
+
+class PooledModelClient(DelegatingModelClient):
+    """
+    Agent-facing view of a shared endpoint client.
+
+    Every create()/create_stream() call waits for a free slot on the endpoint
+    before it is forwarded, and is recorded in the model call metrics and as a
+    "model.call" span once it has one.
+    """
+
+    def __init__(self, pool: EndpointPool):
+        super().__init__(pool.client)
+        self._pool = pool
+
+    async def create(self, messages: Sequence[LLMMessage], **kwargs: Any) -> CreateResult:
+        async with self._pool:
+            started = time.perf_counter()
+            span = tracer.start_span("model.call", attributes={"metro.endpoint": self._pool.name})
+            result, error = None, None
+            try:
+                result = await super().create(messages, **kwargs)
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                usage = result.usage if result is not None else None
+                observe_model_call(self._pool.name, outcome_of(error), time.perf_counter() - started, usage)
+                self._end_span(span, error, usage)
+
+    async def create_stream(self, messages: Sequence[LLMMessage], **kwargs: Any) -> AsyncGenerator[Union[str, CreateResult], None]:
+        async with self._pool:
+            started = time.perf_counter()
+            span = tracer.start_span("model.call", attributes={"metro.endpoint": self._pool.name, "metro.stream": True})
+            usage, error = None, None
+            try:
+                async for chunk in super().create_stream(messages, **kwargs):
+                    if isinstance(chunk, CreateResult):
+                        usage = chunk.usage
+                    yield chunk
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                observe_model_call(self._pool.name, outcome_of(error), time.perf_counter() - started, usage)
+                self._end_span(span, error, usage)
+
+    @staticmethod
+    def _end_span(span, error: Optional[BaseException], usage: Optional[RequestUsage]) -> None:
+        span.set_attribute("metro.outcome", outcome_of(error))
+        if isinstance(error, Exception):
+            span.record_exception(error)
+            span.set_status(StatusCode.ERROR, str(error))
+        set_usage(span, usage)
+        span.end()
+
+
+class ModelClientRegistry:
+    """Creates, shares, pre-warms and closes the model clients for all agents."""
+
+    def __init__(self):
+        self.backend = os.getenv("METRO_MODEL_BACKEND") or (
+            "azure" if os.getenv("AZURE_OPENAI_ENDPOINT") and os.getenv("AZURE_OPENAI_API_KEY") else "mock"
+        )
+        self.max_concurrency = int(os.getenv("METRO_MODEL_MAX_CONCURRENCY", "32"))
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("METRO_HTTP_MAX_CONNECTIONS", "64")),
+            max_keepalive_connections=int(os.getenv("METRO_HTTP_MAX_KEEPALIVE", "32")),
+            keepalive_expiry=float(os.getenv("METRO_HTTP_KEEPALIVE_EXPIRY", "120")),
+        )
+        self.prewarm_connections = int(os.getenv("METRO_MODEL_PREWARM_CONNECTIONS", "4"))
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._pools: Dict[str, EndpointPool] = {}
+        # Imported here because the cache wraps DelegatingModelClient defined above
+        from config.completion_cache import get_completion_cache
+        self.completion_cache = get_completion_cache()
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """The keep-alive connection pool shared by every endpoint client."""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+        return self._http_client
+
+    def get_client(self) -> ChatCompletionClient:
+        """
+        Returns a client for the configured endpoint.
+
+        Returns:
+            ChatCompletionClient: A PooledModelClient sharing the endpoint's client and limits,
+                wrapped in a CachingModelClient when the completion cache is enabled.
+        """
+        if self.backend == "mock":
+            key = "mock"
+        else:
+            key = f"{os.getenv('AZURE_OPENAI_ENDPOINT')}#{os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME')}"
+        if key not in self._pools:
+            self._pools[key] = self._create_pool(key)
+        client = PooledModelClient(self._pools[key])
+        if self.completion_cache is not None:
+            from config.completion_cache import CachingModelClient
+            # Cache hits are answered before taking a concurrency slot
+            client = CachingModelClient(client, self.completion_cache, namespace=key)
+        return client
+
+    def _create_pool(self, key: str) -> EndpointPool:
+        if self.backend == "mock":
+            from agents.client import MockModelClient
+            print("Using MockModelClient for all agents")
+            return EndpointPool(key, MockModelClient.from_env(), self.max_concurrency)
+
+        if self.backend != "azure":
+            raise ValueError(f"Unknown model backend: {self.backend}")
+
+        from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+
+        client = AzureOpenAIChatCompletionClient(
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01"),
+            model=os.getenv("AZURE_OPENAI_MODEL_NAME", "gpt-4o"),
+            model_info=MODEL_INFO,
+            http_client=self.http_client,
+        )
+        print(f"Created shared Azure OpenAI model client for {os.getenv('AZURE_OPENAI_DEPLOYMENT_NAME')}")
+        return EndpointPool(key, client, self.max_concurrency, http_client=self.http_client)
+
+    async def prewarm(self) -> None:
+        """
+        Opens keep-alive connections to the model endpoint ahead of the first
+        request, so the first agent turns do not pay DNS, TCP and TLS setup.
+        The model client itself is still only built when an agent needs it.
+        """
+        base_url = os.getenv("AZURE_OPENAI_ENDPOINT")
+        if self.backend != "azure" or not base_url or self.prewarm_connections <= 0:
+            return
+        results = await asyncio.gather(
+            *(self.http_client.head(base_url) for _ in range(self.prewarm_connections)),
+            return_exceptions=True,
+        )
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            print(f"Pre-warming {base_url} failed for {len(failures)} connection(s): {failures[0]}")
+
+    async def close(self) -> None:
+        """Closes every endpoint client and the shared connection pool."""
+        for pool in self._pools.values():
+            try:
+                await pool.client.close()
+            except Exception as e:
+                print(f"Error closing model client {pool.name}: {e}")
+        self._pools.clear()
+        if self.completion_cache is not None:
+            self.completion_cache.close()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns per-endpoint concurrency and connection pool utilization."""
+        return {
+            "backend": self.backend,
+            "http_limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+            },
+            "endpoints": {name: pool.stats() for name, pool in self._pools.items()},
+        }
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Returns completion cache counters, or None when caching is disabled."""
+        return self.completion_cache.stats() if self.completion_cache is not None else None
+
+
+_registry: Optional[ModelClientRegistry] = None
+
+
+def get_model_registry() -> ModelClientRegistry:
+    """Returns the process-wide model client registry."""
+    global _registry
+    if _registry is None:
+        _registry = ModelClientRegistry()
+    return _registry
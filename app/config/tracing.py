@@ -0,0 +1,128 @@
+"""
+tracing.py
+
+OpenTelemetry tracing for the metro response system.
+
+A run produces one "MetroPlanner.run" span with a child span per agent turn;
+"model.call" spans (model_registry.PooledModelClient) and the spans AutoGen
+opens for every FunctionTool invocation are children of the agent turn that
+made them (in round-robin mode, of AutoGen's span for the agent's turn).
+Spans carry the run ID, the incident key and token counts.
+
+Spans go to whatever exporter is configured at startup; without one (or
+without opentelemetry-sdk installed) the OpenTelemetry API hands out no-op
+spans and tracing costs next to nothing.
+
+Settings (environment variables):
+- METRO_TRACING: "otlp", "file", "console" or "none" (default none)
+- METRO_TRACING_FILE: JSON-lines file written by the "file" exporter (default traces.jsonl)
+- OTEL_EXPORTER_OTLP_ENDPOINT and the other standard OTEL_* variables configure the "otlp" exporter
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Dict, Iterator, Optional
+
+from autogen_core.models import RequestUsage
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+
+SERVICE_NAME = "metro-response"
+
+tracer = trace.get_tracer("metro")
+
+_provider = None
+
+
+def configure_tracing() -> Optional[str]:
+    """
+    Installs the exporter selected by METRO_TRACING as the global tracer provider.
+
+    Returns:
+        str: The exporter in use, or None when tracing stays disabled.
+    """
+    global _provider
+    exporter_name = os.getenv("METRO_TRACING", "none").lower()
+    if exporter_name in ("", "none") or _provider is not None:
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError:
+        print("METRO_TRACING is set but opentelemetry-sdk is not installed; tracing disabled")
+        return None
+
+    if exporter_name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("opentelemetry-exporter-otlp-proto-http is not installed; tracing disabled")
+            return None
+        exporter = OTLPSpanExporter()
+    elif exporter_name == "file":
+        path = os.getenv("METRO_TRACING_FILE", "traces.jsonl")
+        exporter = ConsoleSpanExporter(
+            out=open(path, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    elif exporter_name == "console":
+        exporter = ConsoleSpanExporter()
+    else:
+        raise ValueError(f"Unknown METRO_TRACING exporter: {exporter_name}")
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    print(f"Tracing enabled with the {exporter_name} exporter")
+    return exporter_name
+
+
+def shutdown_tracing() -> None:
+    """Flushes and closes the exporter, if one was configured."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def add_usage(total: RequestUsage, usage: Optional[RequestUsage]) -> RequestUsage:
+    """Adds the usage of one message to a running total."""
+    if usage is None:
+        return total
+    return RequestUsage(
+        prompt_tokens=total.prompt_tokens + usage.prompt_tokens,
+        completion_tokens=total.completion_tokens + usage.completion_tokens,
+    )
+
+
+def set_usage(span: trace.Span, usage: Optional[RequestUsage]) -> None:
+    """Records model token usage on a span, using the GenAI semantic convention names."""
+    if usage is not None:
+        span.set_attribute("gen_ai.usage.input_tokens", usage.prompt_tokens)
+        span.set_attribute("gen_ai.usage.output_tokens", usage.completion_tokens)
+
+
+@contextmanager
+def traced(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[trace.Span]:
+    """A span that is current inside the block. Not for use across yields of an async generator."""
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        yield span
+
+
+async def iterate_in_span(messages: AsyncGenerator[Any, None], span: trace.Span) -> AsyncGenerator[Any, None]:
+    """
+    Iterates an async generator with span current only while it runs.
+
+    Making a span current across the yields of a generator would leak it into
+    the consumer, so it is attached around each step instead. Tasks the
+    generator starts inherit the span as their parent.
+    """
+    parent = trace.set_span_in_context(span)
+    while True:
+        token = otel_context.attach(parent)
+        try:
+            message = await messages.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            otel_context.detach(token)
+        yield message
@@ -3,21 +3,75 @@ main.py
 
 Main FastAPI application for the Metro Multi-Agent Response System.
 - Registers the API route (/api/metro_task/run)
+- Exposes Prometheus metrics (/metrics)
 - Serves the frontend UI (index.html)
 - Mounts static assets (JS/CSS)
 """
 
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from api.routers import metro_task_router
+from config.model_registry import get_model_registry
+from planner.TeamFactory import get_team_pool
+from planner.JobQueue import get_job_queue
+from config.metrics import CONTENT_TYPE_LATEST, render_metrics
+from config.tracing import configure_tracing, shutdown_tracing
+from prompts import get_prompt_registry
+from tools.tool_executor import get_tool_executor
+from services.driver_dispatch import close_dispatch_engine
+from services.incident_store import close_incident_store, get_incident_store
+from services.incident_simulator import start_incident_simulator
+from services.public_publisher import close_public_publisher
+from services.notification_bus import close_notification_bus
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Sets up tracing, loads the prompts, opens model endpoint connections and
+    starts the job workers, the prompt file watcher and (with
+    METRO_INCIDENT_FEED=simulator) the incident simulator before the first
+    request; stops them, closes the shared model clients and the driver gateway,
+    gives queued public notices a few seconds to go out, commits queued
+    incident writes and flushes pending spans on shutdown.
+
+    Agents are built lazily by the first run that needs them; set
+    METRO_PREWARM_TEAMS to build that many teams at startup instead.
+    """
+    configure_tracing()
+    prompts = get_prompt_registry()
+    prompts.start_watching()
+    registry = get_model_registry()
+    await registry.prewarm()
+    prewarm_teams = int(os.getenv("METRO_PREWARM_TEAMS", "0"))
+    if prewarm_teams > 0:
+        await get_team_pool().prewarm(prewarm_teams)
+    simulator = start_incident_simulator(get_incident_store())
+    job_queue = get_job_queue()
+    job_queue.start()
+    yield
+    await job_queue.stop()
+    if simulator is not None:
+        simulator.stop()
+    await prompts.stop_watching()
+    get_tool_executor().shutdown()
+    await close_dispatch_engine()
+    await close_public_publisher()
+    await close_notification_bus()
+    await asyncio.to_thread(close_incident_store)
+    await registry.close()
+    shutdown_tracing()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Metro Disruption Response System",
     description="Uses AutoGen v0.5.6 multi-agent coordination",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Set up Jinja2 templates and static assets
@@ -36,3 +90,15 @@ async def serve_frontend(request: Request):
     Returns the HTML frontend UI for metro response simulation.
     """
     return templates.TemplateResponse("index.html", {"request": request})
+
+@app.get("/metrics")
+async def metrics():
+    """
+    GET /metrics
+
+    Returns run, agent, model call and tool metrics in the Prometheus text format.
+    """
+    body = render_metrics()
+    if body is None:
+        return Response("prometheus-client is not installed\n", status_code=503, media_type="text/plain")
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,189 @@
+"""
+DirectTools.py
+
+Tool-direct fast path for agents whose turn is one predictable tool call.
+
+TrainBreakdownAgent calls log_incident with the reported location,
+IncidentResolutionAgent calls check_incident_status for the same location,
+and InternalNotificationAgent and PublicUpdateAgent each announce the
+resolution once. For these agents the model round trip only copies fields of
+the report into tool arguments. In graph mode, MetroPlanner therefore builds
+the arguments from the parsed incident (IncidentParser.py), runs the agent's
+tool itself and uses the tool's message as the agent's step.
+
+The model is still asked when the fast path cannot be trusted:
+
+- the report was not parsed well enough (extraction_confidence() below
+  METRO_DIRECT_MIN_CONFIDENCE), e.g. it names no station or line
+- an announcing agent runs before the incident is confirmed resolved by a
+  direct IncidentResolutionAgent turn, since wording a partial recovery is
+  the model's job
+- the direct tool call fails
+
+Round-robin runs always ask the model. Which agents may go direct is set by
+agent_config.get_direct_agents().
+
+Every decision is counted per agent and outcome (stats() and
+metro_direct_turns_total). Direct turns are timed in
+metro_direct_turn_duration_seconds instead of
+metro_agent_turn_duration_seconds, so the latency saved per agent is the
+difference between the two.
+
+Settings (environment variables):
+- METRO_DIRECT_MIN_CONFIDENCE: extraction confidence needed to skip the model (default 1)
+"""
+
+import importlib
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from autogen_core.tools import BaseTool
+
+from agent_config import get_direct_agents
+from config.metrics import record_direct_turn
+from planner.IncidentParser import ParsedIncident
+
+# 1 needs a station or line and a recognised incident type; 0.5 accepts an unknown type
+MIN_CONFIDENCE = float(os.getenv("METRO_DIRECT_MIN_CONFIDENCE", "1"))
+
+# Counted per agent: the turn skipped the model, or why it asked the model after all
+OUTCOMES = ("direct", "low_confidence", "unresolved", "error")
+
+
+@dataclass(frozen=True)
+class DirectCall:
+    """A tool call built from the parsed incident instead of by the model."""
+
+    tool: BaseTool
+    arguments: Dict[str, Any]
+
+
+# A builder returns the tool arguments, or the outcome that sends the turn to the model
+Builder = Callable[[ParsedIncident, Dict[str, Dict[str, Any]]], Union[Dict[str, Any], str]]
+
+
+def extraction_confidence(incident: ParsedIncident) -> float:
+    """1 with a location and a known incident type, 0.5 with only the location, 0 without one."""
+    if incident.location is None:
+        return 0.0
+    return 0.5 if incident.incident_type == "disruption" else 1.0
+
+
+def _place(incident: ParsedIncident) -> str:
+    """The location as it reads in an announcement, e.g. "at Central Station on the Red Line"."""
+    parts = []
+    if incident.station:
+        parts.append(f"at {incident.station.title()} Station")
+    if incident.line:
+        parts.append(f"on the {incident.line.title()} Line")
+    return " ".join(parts)
+
+
+def _location_name(incident: ParsedIncident) -> str:
+    """The location as a controller would write it, e.g. "Central Station" or "Red Line"."""
+    if incident.station:
+        return f"{incident.station.title()} Station"
+    return f"{incident.line.title()} Line"
+
+
+def _resolved(results: Dict[str, Dict[str, Any]]) -> bool:
+    return results.get("IncidentResolutionAgent", {}).get("resolved") is True
+
+
+def _log_incident(incident: ParsedIncident, results: Dict[str, Dict[str, Any]]) -> Union[Dict[str, Any], str]:
+    return {"location": _location_name(incident), "description": incident.text}
+
+
+def _check_incident_status(incident: ParsedIncident, results: Dict[str, Dict[str, Any]]) -> Union[Dict[str, Any], str]:
+    return {"location": _location_name(incident)}
+
+
+def _send_internal_notification(incident: ParsedIncident, results: Dict[str, Dict[str, Any]]) -> Union[Dict[str, Any], str]:
+    if not _resolved(results):
+        return "unresolved"
+    # Names the station and line so the notification reaches their topics too
+    kind = incident.incident_type.replace("_", " ")
+    return {"summary": f"The {kind} incident {_place(incident)} is resolved and normal service has resumed."}
+
+
+def _post_public_update(incident: ParsedIncident, results: Dict[str, Dict[str, Any]]) -> Union[Dict[str, Any], str]:
+    if not _resolved(results):
+        return "unresolved"
+    return {"summary": f"Train services {_place(incident)} have resumed."}
+
+
+# Agent -> ("module:attribute" of its tool, argument builder)
+DIRECT_CALLS: Dict[str, Tuple[str, Builder]] = {
+    "TrainBreakdownAgent": ("agents.TrainBreakdownAgent:log_incident_tool", _log_incident),
+    "IncidentResolutionAgent": ("agents.IncidentResolutionAgent:check_incident_status_tool", _check_incident_status),
+    "InternalNotificationAgent": ("agents.InternalNotificationAgent:send_internal_notification_tool", _send_internal_notification),
+    "PublicUpdateAgent": ("agents.PublicUpdateAgent:post_public_update_tool", _post_public_update),
+}
+
+
+def _load_tool(spec: str) -> BaseTool:
+    module_name, attribute = spec.split(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def plan_direct_call(agent: str, incident: ParsedIncident,
+                     results: Dict[str, Dict[str, Any]]) -> Tuple[Optional[DirectCall], str]:
+    """
+    Decides whether an agent's turn can skip the model.
+
+    Args:
+        agent (str): Name of the agent about to take its turn.
+        incident (ParsedIncident): The parsed incident report of the run.
+        results (dict): Tool results of this run's earlier direct turns, by agent.
+
+    Returns:
+        tuple: The call to run and "direct", or None and the reason the model is
+            asked ("disabled", "low_confidence" or "unresolved").
+    """
+    if agent not in DIRECT_CALLS or agent not in get_direct_agents():
+        return None, "disabled"
+    if extraction_confidence(incident) < MIN_CONFIDENCE:
+        return None, "low_confidence"
+    spec, builder = DIRECT_CALLS[agent]
+    arguments = builder(incident, results)
+    if isinstance(arguments, str):
+        return None, arguments
+    return DirectCall(tool=_load_tool(spec), arguments=arguments), "direct"
+
+
+class DirectTurnStats:
+    """Fast path decisions and direct turn times per agent."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._direct_seconds: Dict[str, float] = {}
+
+    def record(self, agent: str, outcome: str, seconds: Optional[float] = None) -> None:
+        counts = self._counts.setdefault(agent, dict.fromkeys(OUTCOMES, 0))
+        counts[outcome] += 1
+        record_direct_turn(agent, outcome)
+        if outcome == "direct" and seconds is not None:
+            self._direct_seconds[agent] = self._direct_seconds.get(agent, 0.0) + seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the enabled agents and, per agent, direct turns, fallbacks to the model and the average direct turn time."""
+        agents = {}
+        for agent, counts in self._counts.items():
+            direct = counts["direct"]
+            agents[agent] = {
+                **counts,
+                "avg_direct_ms": round(self._direct_seconds.get(agent, 0.0) / direct * 1000, 1) if direct else 0.0,
+            }
+        return {
+            "enabled": [agent for agent in get_direct_agents() if agent in DIRECT_CALLS],
+            "min_confidence": MIN_CONFIDENCE,
+            "agents": agents,
+        }
+
+
+_stats = DirectTurnStats()
+
+
+def get_direct_turn_stats() -> DirectTurnStats:
+    return _stats
@@ -0,0 +1,94 @@
+"""
+IncidentParser.py
+
+Extracts the station or line and the incident type from a free-text incident
+report, and derives a key that is the same for reports of the same incident
+("Train breakdown at Central Station" and "central station: train broke down!"
+both map to "breakdown@central").
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Checked in order; the first matching type wins, so what happened to the
+# train outranks its cause ("breakdown due to a signal failure" is a breakdown)
+INCIDENT_TYPES = [
+    ("derailment", r"derail"),
+    ("fire", r"\bfire\b|\bsmoke\b"),
+    ("flooding", r"\bflood"),
+    ("medical", r"medical|passenger (?:ill|unwell|injur)"),
+    ("obstruction", r"obstruct|on the track|trespass"),
+    ("breakdown", r"break ?down|broke(?:n)? down|stalled|stuck|fault"),
+    ("power_outage", r"power (?:outage|failure|loss)|\boutage\b|blackout"),
+    ("signal_failure", r"signal"),
+]
+
+# Up to three words before "station"; the name starts after the last stop word
+_STATION = re.compile(r"((?:[\w'-]+\s+){0,2}[\w'-]+)\s+(?:station|stn)\b", re.IGNORECASE)
+_AT_PLACE = re.compile(r"\b(?:at|near|outside)\s+([A-Z][\w']*(?:[ -][A-Z][\w']*)*)")
+_LINE = re.compile(r"\b([A-Z][\w']*)\s+(?i:line)\b")
+
+_STOP_WORDS = {
+    "at", "near", "outside", "in", "on", "the", "of", "from", "to", "by", "and",
+    "reported", "train", "trains", "breakdown", "stalled", "broke", "down", "derailment",
+}
+
+
+def _station_name(words: str) -> Optional[str]:
+    name = []
+    for word in words.lower().split():
+        name = [] if word in _STOP_WORDS else name + [word]
+    return " ".join(name) or None
+
+
+@dataclass(frozen=True)
+class ParsedIncident:
+    """The parts of an incident report that identify the incident."""
+
+    text: str
+    incident_type: str
+    station: Optional[str] = None
+    line: Optional[str] = None
+
+    @property
+    def location(self) -> Optional[str]:
+        return self.station or (f"{self.line} line" if self.line else None)
+
+    @property
+    def key(self) -> str:
+        """Reports with the same key describe the same incident."""
+        if self.location:
+            return f"{self.incident_type}@{self.location}"
+        # Nothing to match on: only identical reports share a key
+        return f"{self.incident_type}#{re.sub(r'[^a-z0-9]+', ' ', self.text.lower()).strip()}"
+
+
+def parse_incident(text: str) -> ParsedIncident:
+    """
+    Parses a free-text incident report.
+
+    Args:
+        text (str): The incident description as submitted.
+
+    Returns:
+        ParsedIncident: Incident type ("disruption" when unknown), station and line.
+    """
+    lowered = text.lower()
+    incident_type = next(
+        (name for name, pattern in INCIDENT_TYPES if re.search(pattern, lowered)), "disruption"
+    )
+
+    station = None
+    match = _STATION.search(text)
+    if match:
+        station = _station_name(match.group(1))
+    if station is None:
+        match = _AT_PLACE.search(text)
+        if match and not _LINE.fullmatch(match.group(1)):
+            station = _station_name(match.group(1))
+
+    match = _LINE.search(text)
+    line = match.group(1).lower() if match else None
+
+    return ParsedIncident(text=text, incident_type=incident_type, station=station, line=line)
@@ -0,0 +1,260 @@
+"""
+JobQueue.py
+
+Runs incidents as background jobs so HTTP requests do not stay open for the
+whole multi-agent run.
+
+Submitted incidents wait in a bounded queue. A fixed number of asyncio workers
+take them in order and run MetroPlanner, so at most `workers` group chats run
+at once however bursty the traffic. Duplicate reports share one run through
+the RequestCoalescer. Each job keeps its steps as they arrive, and callers can
+long-poll for changes.
+
+Settings (environment variables):
+- METRO_JOB_WORKERS: concurrent incident runs (default 4)
+- METRO_JOB_QUEUE_SIZE: jobs that may wait before submissions are rejected (default 1000)
+- METRO_JOB_RETENTION: seconds a finished job stays queryable (default 3600)
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from planner.MetroPlanner import MetroPlanner
+from planner.RequestCoalescer import get_coalescer
+
+# "partial": the run budget or deadline ran out, and the steps so far are kept
+TERMINAL_STATUSES = ("completed", "partial", "error")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    """One submitted incident and everything known about its run so far."""
+
+    id: str
+    incident: str
+    status: str = "queued"
+    steps: List[Dict[str, str]] = field(default_factory=list)
+    message: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Incremented on every change, so pollers can ask for "anything newer than version N"
+    version: int = 0
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    async def update(self, **changes: Any) -> None:
+        async with self.changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+            self.changed.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        queued_until = self.started_at or now
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "version": self.version,
+            "message": self.message,
+            "steps": list(self.steps),
+            "timings": dict(self.timings),
+            "queued_ms": round((queued_until - self.submitted_at) * 1000, 1),
+            "run_ms": round(((self.finished_at or now) - self.started_at) * 1000, 1) if self.started_at else None,
+        }
+
+
+class JobQueue:
+    """A bounded queue of incident jobs served by a fixed pool of asyncio workers."""
+
+    def __init__(self, workers: int = 4, max_queue: int = 1000, retention_seconds: float = 3600.0,
+                 planner_factory: Callable[[], MetroPlanner] = MetroPlanner):
+        if workers < 1:
+            raise ValueError("Job queue needs at least one worker.")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention_seconds = retention_seconds
+        self.planner_factory = planner_factory
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+
+        # Counters reported by stats()
+        self._busy = 0
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._partial = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+        self._max_run = 0.0
+
+    def start(self) -> None:
+        """Starts the workers; safe to call more than once."""
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for index in range(len(self._tasks), self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"metro-job-worker-{index}"))
+
+    async def stop(self) -> None:
+        """Cancels the workers. Jobs still queued or running are marked as errors."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in self._jobs.values():
+            if not job.done:
+                await job.update(status="error", message="Server shutting down", finished_at=time.monotonic())
+
+    def submit(self, incident: str) -> Job:
+        """
+        Queues an incident for processing.
+
+        Args:
+            incident (str): Description of the metro incident.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            QueueFullError: If max_queue jobs are already waiting.
+        """
+        self.start()
+        self._prune()
+        job = Job(id=uuid.uuid4().hex, incident=incident)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+        self._jobs[job.id] = job
+        self._submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, since_version: int = -1, timeout: float = 0.0) -> Job:
+        """
+        Long-poll: waits until the job is newer than since_version, finished, or the timeout expires.
+
+        Args:
+            job (Job): The job to watch.
+            since_version (int): Version the caller already has.
+            timeout (float): Maximum seconds to wait.
+
+        Returns:
+            Job: The same job, in whatever state it is in when the wait ends.
+        """
+        if timeout <= 0:
+            return job
+        async with job.changed:
+            try:
+                await asyncio.wait_for(
+                    job.changed.wait_for(lambda: job.version > since_version or job.done), timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        self._busy += 1
+        self._started += 1
+        started = time.monotonic()
+        wait = started - job.submitted_at
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        await job.update(status="running", started_at=started)
+
+        try:
+            async for event in get_coalescer().run_stream(self.planner_factory(), job.incident):
+                if event["event"] == "step":
+                    await job.update(steps=job.steps + [event["data"]])
+                elif event["event"] == "done":
+                    await job.update(
+                        status=event["data"]["status"],
+                        message=event["data"].get("message"),
+                        timings=event["data"].get("timings", {}),
+                        finished_at=time.monotonic(),
+                    )
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            await job.update(status="error", message=f"Server error: {str(e)}", finished_at=time.monotonic())
+        finally:
+            self._busy -= 1
+            if not job.done:
+                await job.update(status="error", message="Run ended without a result", finished_at=time.monotonic())
+            run = time.monotonic() - started
+            self._total_run += run
+            self._max_run = max(self._max_run, run)
+            if job.status == "completed":
+                self._completed += 1
+            elif job.status == "partial":
+                self._partial += 1
+            else:
+                self._failed += 1
+
+    def _prune(self) -> None:
+        """Forgets finished jobs older than the retention period."""
+        cutoff = time.monotonic() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth, worker use and wait/run time statistics."""
+        finished = self._completed + self._partial + self._failed
+        return {
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "partial": self._partial,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "tracked_jobs": len(self._jobs),
+            "avg_wait_ms": round(self._total_wait / self._started * 1000, 2) if self._started else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+            "avg_run_ms": round(self._total_run / finished * 1000, 2) if finished else 0.0,
+            "max_run_ms": round(self._max_run * 1000, 2),
+        }
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Returns the process-wide job queue, creating it on first use."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            workers=int(os.getenv("METRO_JOB_WORKERS", "4")),
+            max_queue=int(os.getenv("METRO_JOB_QUEUE_SIZE", "1000")),
+            retention_seconds=float(os.getenv("METRO_JOB_RETENTION", "3600")),
+        )
+    return _job_queue
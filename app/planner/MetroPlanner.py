@@ -1,124 +1,476 @@
 import asyncio
+import json
+import os
 import re
+import time
 import traceback
-from typing import List, Dict, Any
+import uuid
+from typing import List, Dict, Any, AsyncGenerator, Optional
 from dotenv import load_dotenv
 from config.llm_config import get_llm_config
 
-# Import the agents
-from agents.TrainBreakdownAgent import TrainBreakdownAgent
-from agents.DriverCoordinationAgent import DriverCoordinationAgent
-from agents.DepotMaintenanceAgent import DepotMaintenanceAgent
-from agents.PublicCommunicationAgent import PublicCommunicationAgent
-from agents.IncidentResolutionAgent import IncidentResolutionAgent
-from agents.InternalNotificationAgent import InternalNotificationAgent
-from agents.PublicUpdateAgent import PublicUpdateAgent
+# Each run checks an isolated agent team out of a shared pool
+from planner.TeamFactory import get_team_pool
+from planner.RunBudget import BudgetTracker, RunBudget
+from config.metrics import observe_run, record_fallback
+from config.tracing import add_usage, iterate_in_span, set_usage, traced, tracer
+from planner.IncidentParser import ParsedIncident, parse_incident
+from planner.DirectTools import get_direct_turn_stats, plan_direct_call
+from agent_config import AGENT_GRAPH, EXECUTION_MODE, get_agent_timeout, get_ancestors, get_execution_levels
 
-# Import the group chat from autogen
-from autogen_agentchat.agents import UserProxyAgent
-from autogen_agentchat.teams import RoundRobinGroupChat
+from autogen_agentchat.base import Response, TaskResult
+from autogen_agentchat.messages import (
+    BaseChatMessage, ModelClientStreamingChunkEvent, TextMessage, ToolCallExecutionEvent,
+    ToolCallRequestEvent, ToolCallSummaryMessage,
+)
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import FunctionExecutionResult, RequestUsage
+from opentelemetry import trace
 
 load_dotenv()
 
+# Validated once at import so a bad graph fails fast
+EXECUTION_LEVELS = get_execution_levels(AGENT_GRAPH)
+
+# Seconds a request may run before its in-flight model and tool calls are cancelled
+DEFAULT_DEADLINE = float(os.getenv("METRO_REQUEST_DEADLINE", "150"))
+
+# Step prefixes of the agents; content that already starts with one keeps it,
+# e.g. a tool's "⚠️ Incident ... still open" in IncidentResolutionAgent's step
+STATUS_EMOJIS = ("🚨", "📣", "🚍", "⚠️", "✅", "📨", "📢", "🛠️")
+
 class MetroPlanner:
     
-    async def run(self, incident_description: str) -> dict:
+    def __init__(self, execution_mode: Optional[str] = None, budget: Optional[RunBudget] = None):
+        """
+        Args:
+            execution_mode (str, optional): "graph" or "round_robin". Defaults to
+                agent_config.EXECUTION_MODE.
+            budget (RunBudget, optional): Turn, token and time limits of each run.
+                Defaults to RunBudget.from_env().
+        """
+        self.execution_mode = execution_mode or EXECUTION_MODE
+        self.budget = budget or RunBudget.from_env()
+        if self.execution_mode not in ("graph", "round_robin"):
+            raise ValueError(f"Unknown execution mode: {self.execution_mode}")
+    
+    async def run(self, incident_description: str, timeout: Optional[float] = None) -> dict:
         """
         Runs the metro disruption response team on an incident.
         
         Args:
             incident_description (str): Description of the metro incident
+            timeout (float, optional): Seconds until the run's deadline
             
         Returns:
-            dict: Response with status and steps
+            dict: Response with status, steps, per-agent timings in milliseconds,
+                  per-agent prompt token usage and the agents that skipped the model
+        """
+        steps = []
+        async for event in self.run_stream(incident_description, timeout=timeout):
+            if event["event"] == "step":
+                steps.append(event["data"])
+            elif event["event"] == "done":
+                result = {
+                    "status": event["data"]["status"],
+                    "steps": steps,
+                    "timings": event["data"]["timings"],
+                    "context_tokens": event["data"].get("context_tokens", {}),
+                    "stop_reason": event["data"].get("stop_reason"),
+                    "timed_out_agents": event["data"].get("timed_out_agents", []),
+                    "direct_agents": event["data"].get("direct_agents", [])
+                }
+                if event["data"].get("message"):
+                    result["message"] = event["data"]["message"]
+                return result
+    
+    async def run_stream(self, incident_description: str, stream_tokens: bool = False,
+                         timeout: Optional[float] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Runs the metro disruption response team and yields each step as soon
+        as the producing agent finishes its turn.
+        
+        The run gets a deadline, propagated through a CancellationToken into the
+        group chat, the model clients and the tools. When it passes, in-flight
+        model and tool calls are cancelled and the agents that had not replied
+        get their fallback step. An agent whose turn exceeds its timeout
+        (agent_config.get_agent_timeout) is cancelled the same way; in graph mode
+        only that agent falls back and the run continues, in round-robin mode the
+        run stops there. Closing the generator cancels the run.
+        
+        In graph mode, agents with a direct tool call (planner/DirectTools.py)
+        run it without the model when the report was parsed confidently.
+        
+        Args:
+            incident_description (str): Description of the metro incident
+            stream_tokens (bool): Also yield model output chunks as "token" events
+            timeout (float, optional): Seconds until the deadline. Defaults to
+                METRO_REQUEST_DEADLINE.
+            
+        Yields:
+            dict: Events of the form {"event": "step" | "token" | "done", "data": {...}}.
+                  The final event is always "done" and carries the run status,
+                  the reason the run stopped, the agents that timed out, the
+                  agents that skipped the model, per-agent timings in milliseconds and per-agent prompt tokens
+                  with and without the agent's context strategy. The status is
+                  "partial" when the run budget or the deadline ran out before
+                  every agent had replied.
         """
         print(f"Running team with input: {incident_description}")
+        emitted = set()
+        timings: Dict[str, float] = {}
+        context_tokens: Dict[str, Dict[str, Any]] = {}
+        timed_out: List[str] = []
+        direct: List[str] = []
+        stop_reason = None
+        # Reported to the run metrics; stays "cancelled" if the caller goes away first
+        status = "cancelled"
+        run_started = time.perf_counter()
+        usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        # Not made current here: this generator yields to the caller between steps
+        run_span = tracer.start_span("MetroPlanner.run", attributes={
+            "metro.run_id": uuid.uuid4().hex,
+            "metro.incident_key": parse_incident(incident_description).key,
+            "metro.execution_mode": self.execution_mode,
+        })
+        
+        # The run token is cancelled at the deadline, by a stalled round-robin
+        # turn, or when the caller goes away
+        loop = asyncio.get_running_loop()
+        run_token = CancellationToken()
+        cancel_reason: Dict[str, str] = {}
+        def cancel_run(reason: str) -> None:
+            if not run_token.is_cancelled():
+                cancel_reason["reason"] = reason
+                run_token.cancel()
+        timeout = timeout if timeout is not None else DEFAULT_DEADLINE
+        deadline = loop.call_later(timeout, cancel_run, f"Deadline of {timeout:g} seconds exceeded")
+        messages = None
         
         try:
-            # Filter out None agents
-            agents_list = [
-                a for a in [
-                    UserProxyAgent(
-                        name="UserProxyAgent",
-                        is_termination_msg=lambda x: True  ,
-                        code_execution_config=False,
-                        description="You represent the operations control center submitting an incident report.",
-                    ),
-                    TrainBreakdownAgent,
-                    DriverCoordinationAgent, 
-                    DepotMaintenanceAgent,
-                    PublicCommunicationAgent,
-                    IncidentResolutionAgent,
-                    InternalNotificationAgent,
-                    PublicUpdateAgent
-                ] if a is not None
-            ]
-            
-            # Check if we have enough valid agents to proceed
-            if len(agents_list) < 3:  # UserProxy + at least 2 agents
-                print(f"Not enough valid agents to create a group chat ({len(agents_list)}), using fallback")
-                return {
-                    "status": "error",
-                    "message": "Not enough valid agents to create group chat",
-                    "steps": self._generate_fallback_steps(incident_description)
-                }
-                
-            # Create the group chat with all agents in the specified order
-            try:
-                # If all agents are valid, try to run the full system
-                group_chat = RoundRobinGroupChat(
-                    participants=agents_list,
-                    # max_round=7
-                )
+            async with get_team_pool(stream_tokens).acquire() as team:
+                # Check if we have enough valid agents to proceed
+                if len(team.agents) < 2:
+                    print(f"Not enough valid agents to create a group chat ({len(team.agents)}), using fallback")
+                    status = "error"
+                    for step in self._generate_fallback_steps(incident_description):
+                        record_fallback(step["name"], "no_agents")
+                        yield {"event": "step", "data": step}
+                    yield {"event": "done", "data": {"status": "error", "message": "Not enough valid agents to create group chat", "timings": {}}}
+                    return
                 
-                # Start the group chat with the incident description
-                result = await group_chat.run(task=incident_description)
-                print(f"Group chat completed with status: {result.status}")
-                print(f"Group chat result: {result}")
-                
-                # Process messages and format responses here
-                steps = []
-                for msg in result.messages:
-                    # Only include messages from our agents (not the user proxy)
-                    if hasattr(msg, "source") and msg.source != "UserProxyAgent":
-                        # Format the content
-                        agent_name = msg.source
-                        content = msg.content
-                        
-                        # Process by agent type and add emoji prefixes
-                        formatted_name = self._format_agent_name(agent_name)
-                        content = self._format_content_with_emoji(agent_name, content)
-                        
-                        # Add to steps
-                        steps.append({
-                            "name": formatted_name,
-                            "content": content
-                        })
-                
-                return {
-                    "status": "completed",
-                    "steps": steps
-                }
-                
-            except Exception as e:
-                print(f"Error running group chat: {e}")
-                print(traceback.format_exc())
-                return {
-                    "status": "error",
-                    "message": f"Group chat error: {str(e)}",
-                    "steps": self._generate_fallback_steps(incident_description)
+                expected = {self._format_agent_name(agent.name) for agent in team.agents}
+                tracker = BudgetTracker(self.budget)
+                watchdog = None
+                try:
+                    if self.execution_mode == "graph":
+                        messages = self._run_graph(team.agents, incident_description, timings, tracker, run_token,
+                                                   timed_out, direct)
+                    else:
+                        group_chat = team.round_robin(self.budget.termination_condition(), self.budget.max_turns)
+                        messages = group_chat.run_stream(task=incident_description, cancellation_token=run_token)
+                    
+                    turn_started = time.perf_counter()
+                    turn_started_ns = time.time_ns()
+                    turn_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+                    async for message in iterate_in_span(messages, run_span):
+                        if isinstance(message, TaskResult):
+                            print(f"Group chat completed with stop reason: {message.stop_reason}")
+                            stop_reason = message.stop_reason
+                            continue
+                        if isinstance(message, ModelClientStreamingChunkEvent):
+                            if stream_tokens:
+                                yield {
+                                    "event": "token",
+                                    "data": {"name": self._format_agent_name(message.source), "content": message.content}
+                                }
+                            continue
+                        usage = add_usage(usage, getattr(message, "models_usage", None))
+                        turn_usage = add_usage(turn_usage, getattr(message, "models_usage", None))
+                        step = self._format_step(message)
+                        if step is not None and self.execution_mode != "graph":
+                            # Round robin turns are sequential: a turn lasts until its reply arrives
+                            timings[step["name"]] = time.perf_counter() - turn_started
+                            self._trace_turn(run_span, step["name"], turn_started_ns, turn_usage)
+                        if step is not None:
+                            emitted.add(step["name"])
+                        if isinstance(message, BaseChatMessage):
+                            turn_started = time.perf_counter()
+                            turn_started_ns = time.time_ns()
+                            turn_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+                            if self.execution_mode != "graph":
+                                if watchdog is not None:
+                                    watchdog.cancel()
+                                watchdog = self._watch_turn(team.agents, len(emitted), cancel_run, timed_out)
+                        if step is not None:
+                            yield {"event": "step", "data": step}
+                    if self.execution_mode == "graph":
+                        stop_reason = tracker.stop_reason or "All agents replied"
+                except asyncio.CancelledError:
+                    # Our own token fired (deadline or stalled turn): degrade instead of failing
+                    if not cancel_reason:
+                        raise
+                    stop_reason = cancel_reason["reason"]
+                    print(f"Run cancelled: {stop_reason}")
+                finally:
+                    if watchdog is not None:
+                        watchdog.cancel()
+                    # Read before the team goes back to the pool, where reset() clears the counters
+                    context_tokens = self._context_usage(team.agents)
+            
+            if cancel_reason:
+                # A stalled round-robin turn cancels the run the same way the deadline does
+                reason = "agent_timeout" if timed_out else "deadline"
+                for step in self._generate_fallback_steps(incident_description):
+                    if step["name"] in expected and step["name"] not in emitted:
+                        emitted.add(step["name"])
+                        record_fallback(step["name"], reason)
+                        yield {"event": "step", "data": step}
+            
+            # Stopping after the configured final agent is a normal finish; any other early stop is partial
+            finished = not cancel_reason and not timed_out and (expected <= emitted or self.budget.stop_after in emitted)
+            if not finished:
+                print(f"Run stopped early or degraded ({stop_reason}); timed out: {timed_out or 'none'}")
+            status = "completed" if finished else "partial"
+            yield {
+                "event": "done",
+                "data": {
+                    "status": status,
+                    "stop_reason": stop_reason,
+                    "timed_out_agents": [self._format_agent_name(name) for name in timed_out],
+                    "direct_agents": [self._format_agent_name(name) for name in direct],
+                    "timings": self._format_timings(timings),
+                    "context_tokens": context_tokens
                 }
-                
+            }
+            
         except Exception as e:
-            print(f"Error running team: {e}")
+            print(f"Error running group chat: {e}")
             print(traceback.format_exc())
             
-            # Fall back to debug/mock data for frontend testing
-            return {
-                "status": "error",
-                "message": str(e),
-                "steps": self._generate_fallback_steps(incident_description)
-            }
+            # Fill in the agents that never got a turn so the timeline stays complete
+            status = "error"
+            for step in self._generate_fallback_steps(incident_description):
+                if step["name"] not in emitted:
+                    record_fallback(step["name"], "error")
+                    yield {"event": "step", "data": step}
+            yield {"event": "done", "data": {"status": "error", "message": f"Group chat error: {str(e)}", "timings": self._format_timings(timings), "context_tokens": context_tokens}}
+        
+        finally:
+            # Stop any model or tool call still in flight, e.g. when the caller disconnected
+            deadline.cancel()
+            run_token.cancel()
+            observe_run(self.execution_mode, status, time.perf_counter() - run_started, timings, direct)
+            run_span.set_attribute("metro.status", status)
+            if stop_reason:
+                run_span.set_attribute("metro.stop_reason", stop_reason)
+            if timed_out:
+                run_span.set_attribute("metro.timed_out_agents", timed_out)
+            if direct:
+                run_span.set_attribute("metro.direct_agents", direct)
+            set_usage(run_span, usage)
+            run_span.end()
+            if messages is not None:
+                await messages.aclose()
+    
+    def _trace_turn(self, run_span: trace.Span, agent: str, started_ns: int, usage: RequestUsage) -> None:
+        """Records a finished round-robin turn, whose model and tool calls AutoGen ran outside our code"""
+        span = tracer.start_span(f"{agent} turn", context=trace.set_span_in_context(run_span),
+                                 start_time=started_ns, attributes={"metro.agent": agent})
+        set_usage(span, usage)
+        span.end()
+    
+    def _watch_turn(self, agents: list, turn: int, cancel_run, timed_out: List[str]) -> Optional[asyncio.TimerHandle]:
+        """Arms the timeout of the round-robin turn that is about to start"""
+        if turn >= len(agents):
+            return None
+        name = agents[turn].name
+        agent_timeout = get_agent_timeout(name)
+        def expire() -> None:
+            timed_out.append(name)
+            cancel_run(f"{name} timed out after {agent_timeout:g} seconds")
+        return asyncio.get_running_loop().call_later(agent_timeout, expire)
+    
+    async def _run_graph(self, agents: list, incident_description: str, timings: Dict[str, float],
+                         tracker: BudgetTracker, run_token: CancellationToken,
+                         timed_out: List[str], direct: List[str]) -> AsyncGenerator[Any, None]:
+        """
+        Runs the agents level by level following AGENT_GRAPH.
+        
+        Agents in the same level run concurrently. Each agent receives the task and
+        the replies of all agents it (transitively) depends on. Streaming events are
+        yielded as they happen; final replies are yielded in declaration order.
+        Each agent's wall-clock time is recorded in timings. Every message is fed
+        to the budget tracker, and no further level starts once it is exhausted;
+        agents already running finish their turn.
+        
+        Each agent runs with its own CancellationToken, cancelled with run_token or
+        when the agent exceeds its timeout. A timed-out agent is recorded in
+        timed_out and replies with its fallback step, which its dependents then see.
+        
+        An agent with a direct tool call runs it without the model when
+        plan_direct_call() allows, and is recorded in direct; if the call fails
+        the agent asks the model as usual.
+        """
+        loop = asyncio.get_running_loop()
+        agents_by_name = {agent.name: agent for agent in agents}
+        task_message = TextMessage(content=incident_description, source="user")
+        replies: Dict[str, BaseChatMessage] = {}
+        incident = parse_incident(incident_description)
+        # Tool results of the direct turns so far, which later direct calls may depend on
+        direct_results: Dict[str, Dict[str, Any]] = {}
+        yield task_message
+        await tracker.observe([task_message])
+        
+        for level in EXECUTION_LEVELS:
+            level = [name for name in level if name in agents_by_name]
+            if not level:
+                continue
+            # An empty check still catches the wall-clock limit
+            if await tracker.observe([]):
+                return
+            
+            events: asyncio.Queue = asyncio.Queue()
+            
+            async def run_agent(name: str) -> BaseChatMessage:
+                context = [task_message] + [replies[dep] for dep in get_ancestors(name) if dep in replies]
+                agent_token = CancellationToken()
+                run_token.add_callback(agent_token.cancel)
+                started = time.perf_counter()
+                # Current for this task only, so the agent's model and tool calls become its children
+                with traced(f"{name} turn", {"metro.agent": name}) as span:
+                    usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+                    try:
+                        reply = await self._run_direct(name, incident, direct_results, agent_token, events)
+                        if reply is not None:
+                            timings[name] = time.perf_counter() - started
+                            get_direct_turn_stats().record(name, "direct", timings[name])
+                            direct.append(name)
+                            span.set_attribute("metro.direct", True)
+                            return reply
+                        async for item in agents_by_name[name].on_messages_stream(context, agent_token):
+                            message = item.chat_message if isinstance(item, Response) else item
+                            usage = add_usage(usage, getattr(message, "models_usage", None))
+                            if isinstance(item, Response):
+                                timings[name] = time.perf_counter() - started
+                                return item.chat_message
+                            await events.put(item)
+                    except asyncio.CancelledError:
+                        if name not in timed_out:
+                            raise
+                        span.set_attribute("metro.timed_out", True)
+                    finally:
+                        set_usage(span, usage)
+                if name not in timed_out:
+                    raise RuntimeError(f"{name} finished without a response")
+                timings[name] = time.perf_counter() - started
+                print(f"{name} timed out after {get_agent_timeout(name):g} seconds, using its fallback step")
+                record_fallback(self._format_agent_name(name), "agent_timeout")
+                return TextMessage(content=self._fallback_content(name, incident_description), source=name)
+            
+            def expire(name: str) -> None:
+                if not tasks[name].done():
+                    timed_out.append(name)
+                    tasks[name].cancel()
+            
+            tasks = {name: asyncio.create_task(run_agent(name)) for name in level}
+            timers = [loop.call_later(get_agent_timeout(name), expire, name) for name in level]
+            try:
+                for name in level:
+                    # Forward intermediate events while waiting for this agent's reply
+                    while not tasks[name].done():
+                        waiter = asyncio.create_task(events.get())
+                        await asyncio.wait({waiter, tasks[name]}, return_when=asyncio.FIRST_COMPLETED)
+                        if waiter.done():
+                            await tracker.observe([waiter.result()])
+                            yield waiter.result()
+                        else:
+                            waiter.cancel()
+                    while not events.empty():
+                        event = events.get_nowait()
+                        await tracker.observe([event])
+                        yield event
+                    replies[name] = tasks[name].result()
+                    await tracker.observe([replies[name]])
+                    yield replies[name]
+            finally:
+                for timer in timers:
+                    timer.cancel()
+                for task in tasks.values():
+                    task.cancel()
+    
+    async def _run_direct(self, name: str, incident: ParsedIncident, results: Dict[str, Dict[str, Any]],
+                          token: CancellationToken, events: asyncio.Queue) -> Optional[BaseChatMessage]:
+        """Runs the agent's tool call without the model, or returns None if the model has to be asked"""
+        call, outcome = plan_direct_call(name, incident, results)
+        if call is None:
+            if outcome != "disabled":
+                get_direct_turn_stats().record(name, outcome)
+            return None
+        try:
+            result = await call.tool.run_json(call.arguments, token)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Direct {call.tool.name} call of {name} failed, asking the model instead: {e}")
+            get_direct_turn_stats().record(name, "error")
+            return None
+        
+        # The same events and reply the agent produces for a tool call, minus the model usage
+        content = call.tool.return_value_as_string(result)
+        function_call = FunctionCall(id=f"direct-{uuid.uuid4().hex[:12]}", arguments=json.dumps(call.arguments), name=call.tool.name)
+        await events.put(ToolCallRequestEvent(content=[function_call], source=name))
+        await events.put(ToolCallExecutionEvent(
+            content=[FunctionExecutionResult(content=content, name=call.tool.name, call_id=function_call.id, is_error=False)],
+            source=name,
+        ))
+        if isinstance(result, dict):
+            results[name] = result
+        return ToolCallSummaryMessage(content=content, source=name)
+    
+    def _format_step(self, message) -> Optional[Dict[str, str]]:
+        """Convert a group chat message into a UI step, or None if it is not an agent reply"""
+        # Only chat messages from our agents become steps (not the task or tool call events)
+        if not isinstance(message, BaseChatMessage) or message.source == "user":
+            return None
+        
+        agent_name = message.source
+        content = message.to_text()
+        if isinstance(message, ToolCallSummaryMessage):
+            content = self._tool_summary_text(content)
+        
+        # Process by agent type and add emoji prefixes
+        return {
+            "name": self._format_agent_name(agent_name),
+            "content": self._format_content_with_emoji(agent_name, content)
+        }
+    
+    def _tool_summary_text(self, content: str) -> str:
+        """The "message" of each JSON tool result in a tool call summary (one result per line); other lines as they are"""
+        lines = []
+        for line in content.splitlines():
+            if line.startswith("{"):
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    result = None
+                if isinstance(result, dict) and result.get("message"):
+                    line = result["message"]
+            lines.append(line)
+        return "\n".join(lines)
+    
+    def _context_usage(self, agents: list) -> Dict[str, Dict[str, Any]]:
+        """Prompt tokens each agent sent with its context strategy and without it (full transcript)"""
+        usage = {}
+        for agent in agents:
+            model_context = getattr(agent, "model_context", None)
+            if hasattr(model_context, "stats"):
+                usage[self._format_agent_name(agent.name)] = model_context.stats()
+        return usage
+    
+    def _format_timings(self, timings: Dict[str, float]) -> Dict[str, float]:
+        """Per-agent durations in milliseconds, keyed by clean agent name"""
+        return {self._format_agent_name(name): round(seconds * 1000, 1) for name, seconds in timings.items()}
     
     def _format_agent_name(self, name: str) -> str:
         """Extract the clean agent name from potentially longer qualified names"""
@@ -141,6 +493,8 @@ class MetroPlanner:
     
     def _format_content_with_emoji(self, agent_name: str, content: str) -> str:
         """Add appropriate emoji prefix to agent messages if not already present"""
+        if content.startswith(STATUS_EMOJIS):
+            return content
         if "TrainBreakdownAgent" in agent_name:
             if not content.startswith("🚨"):
                 content = f"🚨 {content}"
@@ -165,6 +519,14 @@ class MetroPlanner:
         
         return content
     
+    def _fallback_content(self, agent_name: str, incident_text: str) -> str:
+        """The fallback step content of a single agent"""
+        name = self._format_agent_name(agent_name)
+        for step in self._generate_fallback_steps(incident_text):
+            if step["name"] == name:
+                return step["content"]
+        return f"{name} did not respond in time."
+    
     def _generate_fallback_steps(self, incident_text: str) -> List[Dict[str, str]]:
         """Generates fallback response steps when the real system fails"""
         # Extract location from incident text if possible
@@ -0,0 +1,203 @@
+"""
+RequestCoalescer.py
+
+Single-flight coalescing of duplicate incident reports.
+
+During a major outage several controllers report the same breakdown within
+seconds. Reports whose incident key (see IncidentParser.py) matches a run that
+started less than `window_seconds` ago attach to that run instead of starting
+another one: they replay the events recorded so far, follow the live ones, and
+get the same result. The agents, model calls and driver/depot notifications
+therefore happen once per incident. When every report of a run has gone away
+(e.g. the clients disconnected) the run is cancelled. A run that fails or is
+cancelled is forgotten as soon as it ends, so the next report starts afresh.
+
+Settings (environment variables):
+- METRO_COALESCE_WINDOW: seconds after a run starts during which matching reports join it (default 60, 0 disables)
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from planner.IncidentParser import parse_incident
+from planner.MetroPlanner import MetroPlanner
+
+# Results that later matching reports may reuse; failed or cancelled runs are forgotten at once
+REUSABLE_STATUSES = ("completed", "partial")
+
+
+@dataclass
+class Flight:
+    """One shared run and the events it has produced so far."""
+
+    key: str
+    incident: str
+    started_at: float = field(default_factory=time.monotonic)
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    done: bool = False
+    subscribers: int = 0
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        async with self.changed:
+            self.events.append(event)
+            self.done = self.done or event["event"] == "done"
+            self.changed.notify_all()
+
+    async def follow(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """Yields every event of the run from the beginning, waiting for new ones until it is done."""
+        index = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: index < len(self.events) or self.done)
+                pending = self.events[index:]
+                finished = self.done
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= len(self.events):
+                return
+
+
+class RequestCoalescer:
+    """Runs each distinct incident once and shares the run with duplicate reports."""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self._flights: Dict[str, Flight] = {}
+
+        # Counters reported by stats()
+        self._runs = 0
+        self._coalesced = 0
+
+    async def run_stream(self, planner: MetroPlanner, incident_description: str,
+                         stream_tokens: bool = False,
+                         timeout: Optional[float] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Same events as MetroPlanner.run_stream, shared with matching reports.
+
+        The "done" event additionally carries the incident key and whether this
+        report joined an existing run. Token events are only forwarded when
+        stream_tokens is set; a report that joins a run started without token
+        streaming receives steps only.
+
+        Args:
+            planner (MetroPlanner): Planner used when a new run has to be started.
+            incident_description (str): Description of the metro incident.
+            stream_tokens (bool): Ask for "token" events.
+            timeout (float, optional): Deadline of a newly started run in seconds.
+
+        Yields:
+            dict: Events of the form {"event": "step" | "token" | "done", "data": {...}}.
+        """
+        if self.window_seconds <= 0:
+            async for event in planner.run_stream(incident_description, stream_tokens=stream_tokens, timeout=timeout):
+                if event["event"] == "done":
+                    event = {"event": "done", "data": {**event["data"], "coalesced": False}}
+                yield event
+            return
+
+        flight, coalesced = self._join(planner, incident_description, stream_tokens, timeout)
+        if coalesced:
+            print(f"Coalesced report into running incident '{flight.key}'")
+        flight.subscribers += 1
+        try:
+            async for event in flight.follow():
+                if event["event"] == "token" and not stream_tokens:
+                    continue
+                if event["event"] == "done":
+                    event = {"event": "done", "data": {**event["data"], "incident_key": flight.key, "coalesced": coalesced}}
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is waiting for this run any more: stop its model and tool calls
+                print(f"All reports of '{flight.key}' went away, cancelling the run")
+                flight.task.cancel()
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+    async def run(self, planner: MetroPlanner, incident_description: str,
+                  timeout: Optional[float] = None) -> dict:
+        """
+        Same result as MetroPlanner.run, shared with matching reports.
+
+        Returns:
+            dict: Response with status, steps, timings and whether the report was coalesced
+        """
+        steps = []
+        async for event in self.run_stream(planner, incident_description, timeout=timeout):
+            if event["event"] == "step":
+                steps.append(event["data"])
+            elif event["event"] == "done":
+                result = dict(event["data"])
+                result["steps"] = steps
+                return result
+
+    def _join(self, planner: MetroPlanner, incident_description: str, stream_tokens: bool,
+              timeout: Optional[float]):
+        self._prune()
+        key = parse_incident(incident_description).key
+        flight = self._flights.get(key)
+        if flight is not None:
+            self._coalesced += 1
+            return flight, True
+
+        flight = Flight(key=key, incident=incident_description)
+        # The run belongs to the flight, not to the first caller, so it finishes
+        # for everyone else even if that caller disconnects
+        flight.task = asyncio.create_task(self._drive(flight, planner, stream_tokens, timeout))
+        self._flights[key] = flight
+        self._runs += 1
+        return flight, False
+
+    async def _drive(self, flight: Flight, planner: MetroPlanner, stream_tokens: bool,
+                     timeout: Optional[float]) -> None:
+        try:
+            async for event in planner.run_stream(flight.incident, stream_tokens=stream_tokens, timeout=timeout):
+                await flight.publish(event)
+        except asyncio.CancelledError:
+            print(f"Coalesced run '{flight.key}' was cancelled")
+        except Exception as e:
+            print(f"Coalesced run '{flight.key}' failed: {e}")
+        finally:
+            if not flight.done:
+                await flight.publish({"event": "done", "data": {"status": "error", "message": "Run ended without a result", "timings": {}}})
+            # Reports already attached get the error, but later ones start a fresh run
+            # instead of inheriting it for the rest of the window
+            if flight.events[-1]["data"].get("status") not in REUSABLE_STATUSES and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def _prune(self) -> None:
+        """Forgets finished runs that are older than the window."""
+        cutoff = time.monotonic() - self.window_seconds
+        expired = [key for key, flight in self._flights.items() if flight.done and flight.started_at < cutoff]
+        for key in expired:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns how many runs were started and how many reports joined one."""
+        reports = self._runs + self._coalesced
+        return {
+            "window_seconds": self.window_seconds,
+            "runs": self._runs,
+            "coalesced_reports": self._coalesced,
+            "coalesce_rate": round(self._coalesced / reports, 4) if reports else 0.0,
+            "active_runs": sum(1 for flight in self._flights.values() if not flight.done),
+            "tracked_incidents": len(self._flights),
+        }
+
+
+_coalescer: Optional[RequestCoalescer] = None
+
+
+def get_coalescer() -> RequestCoalescer:
+    """Returns the process-wide coalescer, creating it on first use."""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = RequestCoalescer(window_seconds=float(os.getenv("METRO_COALESCE_WINDOW", "60")))
+    return _coalescer
@@ -0,0 +1,109 @@
+"""
+RunBudget.py
+
+Per-run limits for the metro response team, built from AutoGen termination
+conditions so no single incident can hold model capacity indefinitely.
+
+A budget combines (any of):
+- max_turns: agent replies allowed in the run
+- max_tokens: total model tokens (prompt + completion) used by the run
+- timeout_seconds: wall-clock time of the run
+- stop_after: stop as soon as this agent has replied (the final public update)
+
+In round-robin mode the combined condition is handed to the group chat. In
+graph mode BudgetTracker applies the same condition to the agents' messages
+and the planner checks it before starting each level.
+
+Settings (environment variables):
+- METRO_RUN_MAX_TURNS: agent replies per run (default: one per agent)
+- METRO_RUN_MAX_TOKENS: model tokens per run (default unlimited)
+- METRO_RUN_TIMEOUT: seconds per run (default 120, 0 for none)
+- METRO_RUN_STOP_AFTER: agent whose reply ends the run (default PublicUpdateAgent, empty for none)
+"""
+
+import os
+from dataclasses import asdict, dataclass
+from functools import reduce
+from operator import or_
+from typing import Any, Dict, Optional, Sequence
+
+from autogen_agentchat.base import TerminationCondition
+from autogen_agentchat.conditions import (
+    MaxMessageTermination,
+    SourceMatchTermination,
+    TimeoutTermination,
+    TokenUsageTermination,
+)
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage
+
+
+def _optional_number(name: str, default: Optional[str], cast=int):
+    value = os.getenv(name, default)
+    if value is None or value.strip() in ("", "0"):
+        return None
+    return cast(value)
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    """The limits applied to one incident run; None means unlimited."""
+
+    max_turns: Optional[int] = None
+    max_tokens: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    stop_after: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "RunBudget":
+        """Builds the default budget from the METRO_RUN_* environment variables."""
+        return cls(
+            max_turns=_optional_number("METRO_RUN_MAX_TURNS", None),
+            max_tokens=_optional_number("METRO_RUN_MAX_TOKENS", None),
+            timeout_seconds=_optional_number("METRO_RUN_TIMEOUT", "120", float),
+            stop_after=os.getenv("METRO_RUN_STOP_AFTER", "PublicUpdateAgent") or None,
+        )
+
+    def termination_condition(self) -> Optional[TerminationCondition]:
+        """
+        Returns a fresh condition that fires when any limit is reached, or None
+        for an unlimited budget. Build one per run: conditions keep state.
+        """
+        conditions = []
+        if self.max_turns:
+            # The task message counts as a message too
+            conditions.append(MaxMessageTermination(self.max_turns + 1))
+        if self.max_tokens:
+            conditions.append(TokenUsageTermination(max_total_token=self.max_tokens))
+        if self.timeout_seconds:
+            conditions.append(TimeoutTermination(self.timeout_seconds))
+        if self.stop_after:
+            conditions.append(SourceMatchTermination([self.stop_after]))
+        return reduce(or_, conditions) if conditions else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BudgetTracker:
+    """Applies a budget to messages produced outside a group chat."""
+
+    def __init__(self, budget: RunBudget):
+        self._condition = budget.termination_condition()
+        self.stop_reason: Optional[str] = None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.stop_reason is not None
+
+    async def observe(self, messages: Sequence[BaseAgentEvent | BaseChatMessage]) -> Optional[str]:
+        """
+        Feeds new messages to the condition.
+
+        Returns:
+            str: The stop reason once the budget is exhausted, otherwise None.
+        """
+        if self.stop_reason is None and self._condition is not None:
+            stop = await self._condition(messages)
+            if stop is not None:
+                self.stop_reason = stop.content
+        return self.stop_reason
@@ -0,0 +1,245 @@
+"""
+TeamFactory.py
+
+Builds isolated metro response teams and keeps a bounded pool of them.
+
+Every incident run gets its own set of AssistantAgents (and therefore its own
+model contexts), so concurrent incidents never see each other's transcripts.
+Finished teams are reset() and handed to the next run instead of being rebuilt.
+Only the lightweight group chat is created per run, so each run starts with
+fresh termination state. Teams built before a prompt file changed are retired
+instead of being reused, so edited prompts take effect without a restart.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+from autogen_agentchat.agents import AssistantAgent
+from autogen_agentchat.base import TerminationCondition
+from autogen_agentchat.teams import RoundRobinGroupChat
+from autogen_core import CancellationToken
+
+from agent_config import create_agent, list_agents
+from prompts import get_prompt_registry
+
+DEFAULT_POOL_SIZE = int(os.getenv("METRO_TEAM_POOL_SIZE", "16"))
+
+
+@dataclass
+class MetroTeam:
+    """One isolated set of response agents."""
+
+    agents: List[AssistantAgent]
+    model_client_stream: bool = False
+    created_at: float = field(default_factory=time.monotonic)
+    # PromptRegistry.generation the agents' system messages were read at
+    prompt_generation: int = 0
+
+    def round_robin(self, termination_condition: Optional[TerminationCondition] = None,
+                    max_turns: Optional[int] = None) -> RoundRobinGroupChat:
+        """
+        Builds a round-robin group chat over the team's agents for one run.
+
+        Args:
+            termination_condition (TerminationCondition, optional): Ends the run early.
+            max_turns (int, optional): Turns before the chat stops. Defaults to one lap,
+                so every agent speaks once, in order.
+        """
+        return RoundRobinGroupChat(
+            participants=self.agents,
+            termination_condition=termination_condition,
+            max_turns=max_turns or max(len(self.agents), 1),
+        )
+
+    async def reset(self) -> None:
+        """Clears every agent's model context."""
+        for agent in self.agents:
+            await agent.on_reset(CancellationToken())
+
+
+class TeamFactory:
+    """Creates fresh MetroTeam instances."""
+
+    def __init__(self, model_client_stream: bool = False):
+        self.model_client_stream = model_client_stream
+
+    def build(self) -> MetroTeam:
+        """
+        Builds a new team with its own agent instances.
+
+        Returns:
+            MetroTeam: The team; agents whose factory failed are left out.
+        """
+        generation = get_prompt_registry().generation
+        agents = [
+            agent for agent in (
+                create_agent(name, model_client_stream=self.model_client_stream) for name in list_agents()
+            ) if agent is not None
+        ]
+        return MetroTeam(agents=agents, model_client_stream=self.model_client_stream, prompt_generation=generation)
+
+
+class TeamPool:
+    """
+    A bounded pool of reusable teams.
+
+    At most max_size teams exist at any time. acquire() hands out an idle team
+    when one is available, builds a new one while under the limit, and otherwise
+    waits for a team to be released.
+    """
+
+    def __init__(self, factory: TeamFactory, max_size: int = DEFAULT_POOL_SIZE):
+        if max_size < 1:
+            raise ValueError("Team pool size must be at least 1.")
+        self.factory = factory
+        self.max_size = max_size
+        self._idle: List[MetroTeam] = []
+        self._size = 0
+        self._condition = asyncio.Condition()
+
+        # Counters reported by stats()
+        self._acquisitions = 0
+        self._hits = 0
+        self._builds = 0
+        self._waits = 0
+        self._discarded = 0
+        self._retired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def prewarm(self, count: int) -> None:
+        """
+        Builds up to count idle teams ahead of the first request.
+
+        Args:
+            count (int): Number of teams to build (capped by max_size).
+        """
+        async with self._condition:
+            count = max(min(count, self.max_size - self._size), 0)
+            self._size += count
+        for built in range(count):
+            try:
+                team = self.factory.build()
+            except Exception:
+                # Give back the slots reserved for this and the remaining teams
+                for _ in range(count - built):
+                    await self._drop_slot()
+                raise
+            self._builds += 1
+            async with self._condition:
+                self._idle.append(team)
+                self._condition.notify()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[MetroTeam]:
+        """Checks a team out of the pool for the duration of one run."""
+        team = await self._checkout()
+        try:
+            yield team
+        finally:
+            await self._release(team)
+
+    async def _checkout(self) -> MetroTeam:
+        started = time.monotonic()
+        waited = False
+        async with self._condition:
+            self._retire_stale()
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                await self._condition.wait()
+
+            self._acquisitions += 1
+            if self._idle:
+                self._hits += 1
+                team = self._idle.pop()
+            else:
+                # Reserve the slot before building so concurrent callers respect the limit
+                self._size += 1
+                team = None
+
+        if team is None:
+            try:
+                team = self.factory.build()
+            except Exception:
+                await self._drop_slot()
+                raise
+            self._builds += 1
+
+        if waited:
+            wait = time.monotonic() - started
+            self._waits += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return team
+
+    def _retire_stale(self) -> None:
+        """Drops idle teams built with prompts that have changed since. Call with the condition held."""
+        generation = get_prompt_registry().generation
+        fresh = [team for team in self._idle if team.prompt_generation == generation]
+        retired = len(self._idle) - len(fresh)
+        if retired:
+            self._idle = fresh
+            self._size -= retired
+            self._retired += retired
+
+    async def _release(self, team: MetroTeam) -> None:
+        try:
+            await team.reset()
+        except Exception as e:
+            # A team that cannot be reset is not safe to reuse
+            print(f"Discarding team that failed to reset: {e}")
+            self._discarded += 1
+            await self._drop_slot()
+            return
+
+        async with self._condition:
+            self._idle.append(team)
+            self._condition.notify()
+
+    async def _drop_slot(self) -> None:
+        async with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns pool size, hit rate and wait time statistics."""
+        return {
+            "max_size": self.max_size,
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._size - len(self._idle),
+            "acquisitions": self._acquisitions,
+            "hits": self._hits,
+            "builds": self._builds,
+            "hit_rate": round(self._hits / self._acquisitions, 4) if self._acquisitions else 0.0,
+            "waits": self._waits,
+            "avg_wait_ms": round(self._total_wait / self._waits * 1000, 2) if self._waits else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 2),
+            "discarded": self._discarded,
+            "retired_for_prompt_change": self._retired,
+        }
+
+
+# Process-wide pools, one per streaming mode (streaming agents are built differently)
+_team_pools: Dict[bool, TeamPool] = {}
+
+
+def get_team_pool(model_client_stream: bool = False) -> TeamPool:
+    """
+    Returns the shared team pool for the given streaming mode, creating it on first use.
+    """
+    if model_client_stream not in _team_pools:
+        _team_pools[model_client_stream] = TeamPool(TeamFactory(model_client_stream=model_client_stream))
+    return _team_pools[model_client_stream]
+
+
+def team_pool_stats() -> Dict[str, Dict[str, float]]:
+    """Returns stats for every pool created so far, keyed by mode."""
+    return {
+        ("streaming" if stream else "default"): pool.stats()
+        for stream, pool in _team_pools.items()
+    }
@@ -1,13 +1,211 @@
 """
 __init__.py
 
-Utility to load prompt templates from the /app/prompts directory.
+Prompt registry for the /app/prompts directory.
+
+Every *.txt file is read once when the registry is created and served from
+memory afterwards. Each prompt carries a version: the first 16 hex digits of
+the SHA-256 of its text, so the same text always has the same version and the
+version can stand in for the text in cache keys.
+
+A background task re-reads files whose size or modification time changed, so
+prompts can be edited without a restart; teams built with an older prompt are
+retired by the team pool (see planner/TeamFactory.py). It waits for file
+system events through watchfiles (installed with uvicorn[standard]) and falls
+back to polling every METRO_PROMPT_RELOAD_INTERVAL seconds without it. Files
+are read on a worker thread; the new prompts replace the old ones on the event
+loop in one step, so readers never see a half-applied reload.
+
+Settings (environment variables):
+- METRO_PROMPT_RELOAD_INTERVAL: seconds between checks when polling (default 2, 0 disables reloading)
 """
 
+import asyncio
+import hashlib
 import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from watchfiles import awatch
+except ImportError:
+    awatch = None
+
+PROMPT_DIR = os.path.dirname(__file__)
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """One prompt file as loaded."""
+
+    name: str
+    text: str
+    version: str
+    path: str
+    mtime_ns: int
+    size: int
+
+
+def prompt_version(text: str) -> str:
+    """The stable version ID of a prompt text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class PromptRegistry:
+    """Loads the prompt files of a directory and keeps them current."""
+
+    def __init__(self, directory: str = PROMPT_DIR):
+        self.directory = directory
+        self._prompts: Dict[str, Prompt] = {}
+        self._versions_by_text: Dict[str, str] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        # Incremented whenever any prompt changes; lets callers notice stale copies cheaply
+        self.generation = 0
+        self.reloads = 0
+        self.reload()
+
+    def _load(self, name: str, path: str, stat: os.stat_result) -> Prompt:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        return Prompt(name=name, text=text, version=prompt_version(text), path=path,
+                      mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+    def reload(self) -> List[str]:
+        """
+        Re-reads prompt files that were added, changed or removed since the last load.
+
+        Only files whose size or modification time changed are read again.
+
+        Returns:
+            list: Names of the prompts whose text changed.
+        """
+        prompts, changed = self._scan()
+        self._apply(prompts, changed)
+        return changed
+
+    async def reload_async(self) -> List[str]:
+        """reload() with the file reads on a worker thread."""
+        prompts, changed = await asyncio.to_thread(self._scan)
+        self._apply(prompts, changed)
+        return changed
+
+    def _scan(self) -> Tuple[Dict[str, Prompt], List[str]]:
+        # Only reads self._prompts, so it may run on a worker thread
+        current_prompts = self._prompts
+        prompts: Dict[str, Prompt] = {}
+        changed = []
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".txt"):
+                continue
+            name = filename[:-len(".txt")]
+            path = os.path.join(self.directory, filename)
+            current = current_prompts.get(name)
+            try:
+                stat = os.stat(path)
+                if current is not None and (current.mtime_ns, current.size) == (stat.st_mtime_ns, stat.st_size):
+                    prompts[name] = current
+                    continue
+                prompt = self._load(name, path, stat)
+            except OSError as e:
+                # Mid-save or removed between listing and reading: keep the copy we have
+                print(f"Could not read prompt {filename}: {e}")
+                if current is not None:
+                    prompts[name] = current
+                continue
+            if current is None or current.version != prompt.version:
+                changed.append(name)
+            prompts[name] = prompt
+
+        changed.extend(name for name in current_prompts if name not in prompts)
+        return prompts, changed
+
+    def _apply(self, prompts: Dict[str, Prompt], changed: List[str]) -> None:
+        # Unchanged files may have new mtimes, so the prompts are swapped in either way
+        versions_by_text = {prompt.text: prompt.version for prompt in prompts.values()}
+        self._prompts, self._versions_by_text = prompts, versions_by_text
+        if changed:
+            self.generation += 1
+            self.reloads += 1
+
+    def get(self, name: str) -> Prompt:
+        """
+        Returns a prompt by name, e.g. "TrainBreakdownAgent" (a ".txt" suffix is accepted too).
+
+        Raises:
+            FileNotFoundError: If there is no such prompt file.
+        """
+        if name.endswith(".txt"):
+            name = name[:-len(".txt")]
+        prompt = self._prompts.get(name)
+        if prompt is None:
+            raise FileNotFoundError(f"Prompt file not found: {os.path.join(self.directory, name + '.txt')}")
+        return prompt
+
+    def version_of(self, text: str) -> Optional[str]:
+        """The version of a registered prompt with exactly this text, or None."""
+        return self._versions_by_text.get(text)
+
+    def versions(self) -> Dict[str, str]:
+        """The current version of every prompt, keyed by name."""
+        return {name: prompt.version for name, prompt in self._prompts.items()}
+
+    async def watch(self, interval: float) -> None:
+        """
+        Reloads changed prompt files until cancelled: on file system events with
+        watchfiles, otherwise every interval seconds.
+        """
+        if awatch is not None:
+            async for _ in awatch(self.directory, watch_filter=lambda change, path: path.endswith(".txt")):
+                self._report(await self.reload_async())
+        else:
+            while True:
+                await asyncio.sleep(interval)
+                self._report(await self.reload_async())
+
+    def _report(self, changed: List[str]) -> None:
+        if changed:
+            print(f"Reloaded prompts: {', '.join(changed)}")
+
+    def start_watching(self, interval: Optional[float] = None) -> None:
+        """Starts the reload task on the running event loop (no-op for an interval of 0)."""
+        if interval is None:
+            interval = float(os.getenv("METRO_PROMPT_RELOAD_INTERVAL", "2"))
+        if interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self.watch(interval))
+
+    async def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prompts": self.versions(),
+            "generation": self.generation,
+            "reloads": self.reloads,
+            "watching": self._watcher is not None,
+            "watcher": "watchfiles" if awatch is not None else "polling",
+        }
+
+
+_registry: Optional[PromptRegistry] = None
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Returns the process-wide prompt registry, loading every prompt on first use."""
+    global _registry
+    if _registry is None:
+        _registry = PromptRegistry()
+    return _registry
+
+
 def load_prompt(filename: str) -> str:
     """
-    Loads a prompt template file from the prompts directory.
+    Returns the text of a prompt file from the registry.
 
     Args:
         filename (str): Name of the prompt file (e.g., "TrainBreakdownAgent.txt").
@@ -18,11 +216,4 @@ def load_prompt(filename: str) -> str:
     Raises:
         FileNotFoundError: If the prompt file does not exist.
     """
-    prompt_dir = os.path.dirname(__file__)
-    full_path = os.path.join(prompt_dir, filename)
-
-    if not os.path.exists(full_path):
-        raise FileNotFoundError(f"Prompt file not found: {full_path}")
-
-    with open(full_path, "r", encoding="utf-8") as f:
-        return f.read()
\ No newline at end of file
+    return get_prompt_registry().get(filename).text
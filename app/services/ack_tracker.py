@@ -0,0 +1,271 @@
+"""
+ack_tracker.py
+
+Tracks driver acknowledgments of dispatches.
+
+Acks arrive on POST /api/metro_task/acks (or from the stub gateway's
+simulated drivers) and are stored per dispatch ID. confirm_driver_ack awaits
+wait_for_acks(), which returns as soon as enough drivers have acknowledged or
+the timeout passes, so the agent spends one tool call on ack progress
+instead of a model round trip per poll. Waiters sleep on a future that the
+ack that completes them resolves; nothing polls.
+
+Acks may arrive before the dispatch is registered (the gateway can be faster
+than the tool's bookkeeping); they are kept and filtered against the
+recipient list once it is known. Dispatches are forgotten after
+METRO_ACK_RETENTION seconds.
+
+The parallel tool calls of one agent turn share a CancellationToken, so a
+dispatch registered with its turn's token can be found by a confirm_driver_ack
+call of the same turn that does not know the dispatch ID yet (dispatch_for()).
+notify_driver marks its turn's token before it dispatches (expect()); only a
+marked turn is waited on for the whole ack timeout, any other confirm call
+gives up after SCOPE_GRACE seconds.
+
+Settings (environment variables):
+- METRO_ACK_TIMEOUT: seconds confirm_driver_ack waits for acks (default 20)
+- METRO_ACK_RETENTION: seconds a dispatch's acks are kept (default 3600)
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from autogen_core import CancellationToken
+
+# Seconds dispatch_for() waits for a notify_driver call of the same turn to start
+# (it may still be queued for a tool slot) before concluding there is none
+SCOPE_GRACE = 1.0
+
+
+@dataclass
+class DispatchAcks:
+    """Ack state of one dispatch."""
+
+    dispatch_id: str
+    created: float = field(default_factory=time.monotonic)
+    # None until the dispatch is registered
+    recipients: Optional[Set[str]] = None
+    acked: Dict[str, float] = field(default_factory=dict)
+    waiters: List[Tuple[int, asyncio.Future]] = field(default_factory=list)
+
+    @property
+    def ack_count(self) -> int:
+        return len(self.acked)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dispatch_id": self.dispatch_id,
+            "recipients": len(self.recipients) if self.recipients is not None else None,
+            "ack_count": self.ack_count,
+            "waiting": len(self.waiters),
+        }
+
+
+class AckTracker:
+    """In-memory ack store keyed by dispatch ID, with awaitable ack targets."""
+
+    def __init__(self, retention: float = 3600.0):
+        self.retention = retention
+        self._dispatches: "OrderedDict[str, DispatchAcks]" = OrderedDict()
+        self._scopes: "weakref.WeakKeyDictionary[CancellationToken, asyncio.Future]" = weakref.WeakKeyDictionary()
+        # Set once a notify_driver call of the turn has started
+        self._expected: "weakref.WeakKeyDictionary[CancellationToken, asyncio.Event]" = weakref.WeakKeyDictionary()
+
+        # Counters reported by stats()
+        self._registered = 0
+        self._acks = 0
+        self._duplicate_acks = 0
+        self._unexpected_acks = 0
+        self._waits = 0
+        self._wait_timeouts = 0
+        self._total_wait = 0.0
+
+    def _record(self, dispatch_id: str) -> DispatchAcks:
+        record = self._dispatches.get(dispatch_id)
+        if record is None:
+            self._prune()
+            record = self._dispatches[dispatch_id] = DispatchAcks(dispatch_id)
+        return record
+
+    def _prune(self) -> None:
+        # Records are in creation order, so the expired ones are at the front
+        cutoff = time.monotonic() - self.retention
+        while self._dispatches:
+            record = next(iter(self._dispatches.values()))
+            if record.created >= cutoff or record.waiters:
+                break
+            self._dispatches.popitem(last=False)
+
+    def _scope_future(self, scope: CancellationToken) -> asyncio.Future:
+        future = self._scopes.get(scope)
+        if future is None:
+            future = self._scopes[scope] = asyncio.get_running_loop().create_future()
+        return future
+
+    def _expected_event(self, scope: CancellationToken) -> asyncio.Event:
+        event = self._expected.get(scope)
+        if event is None:
+            event = self._expected[scope] = asyncio.Event()
+        return event
+
+    def expect(self, scope: Optional[CancellationToken]) -> None:
+        """Marks that the agent turn of scope is about to register a dispatch."""
+        if scope is not None:
+            self._scope_future(scope)
+            self._expected_event(scope).set()
+
+    def abandon(self, scope: Optional[CancellationToken]) -> None:
+        """Tells waiters of scope that its dispatch failed and will not be registered."""
+        if scope is not None:
+            future = self._scope_future(scope)
+            if not future.done():
+                future.set_result(None)
+
+    def register(self, dispatch_id: str, recipients: Iterable[str], scope: Optional[CancellationToken] = None) -> DispatchAcks:
+        """
+        Starts tracking a dispatch sent to recipients (the drivers it was delivered to).
+
+        Args:
+            scope: The CancellationToken of the agent turn that sent the dispatch, if any.
+        """
+        record = self._record(dispatch_id)
+        record.recipients = set(recipients)
+        for driver_id in [d for d in record.acked if d not in record.recipients]:
+            del record.acked[driver_id]
+            self._unexpected_acks += 1
+        self._registered += 1
+        self._notify(record)
+        if scope is not None:
+            self._expected_event(scope).set()
+            future = self._scope_future(scope)
+            if not future.done():
+                future.set_result(dispatch_id)
+        return record
+
+    def record_ack(self, dispatch_id: str, driver_ids: Iterable[str]) -> DispatchAcks:
+        """Records acks of drivers and wakes the waiters whose target they reach."""
+        record = self._record(dispatch_id)
+        now = time.monotonic()
+        for driver_id in driver_ids:
+            if record.recipients is not None and driver_id not in record.recipients:
+                self._unexpected_acks += 1
+            elif driver_id in record.acked:
+                self._duplicate_acks += 1
+            else:
+                record.acked[driver_id] = now
+                self._acks += 1
+        self._notify(record)
+        return record
+
+    def _notify(self, record: DispatchAcks) -> None:
+        if not record.waiters:
+            return
+        remaining = []
+        for target, future in record.waiters:
+            if future.done():
+                continue
+            if record.ack_count >= target:
+                future.set_result(None)
+            else:
+                remaining.append((target, future))
+        record.waiters = remaining
+
+    def get(self, dispatch_id: str) -> Optional[DispatchAcks]:
+        return self._dispatches.get(dispatch_id)
+
+    async def dispatch_for(self, scope: CancellationToken, timeout: float) -> Optional[str]:
+        """
+        The ID of the dispatch registered with scope; None if there is none.
+
+        Waits up to timeout for a dispatch that notify_driver of the turn is
+        sending, but only SCOPE_GRACE seconds for such a call to start.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(self._expected_event(scope).wait(), timeout=min(SCOPE_GRACE, timeout))
+            return await asyncio.wait_for(asyncio.shield(self._scope_future(scope)),
+                                          timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            return None
+
+    async def wait_for_acks(self, dispatch_id: str, count: Optional[int] = None, timeout: float = 20.0) -> Dict[str, Any]:
+        """
+        Waits until count drivers (all recipients by default) acknowledged dispatch_id.
+
+        The target is capped at the number of recipients once the dispatch is
+        registered, since nobody else can acknowledge it.
+
+        Returns:
+            dict: dispatch_id, recipients, ack_count, target, complete, timed_out and waited_ms.
+        """
+        record = self._record(dispatch_id)
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        while True:
+            target = count if count is not None and count > 0 else len(record.recipients or ())
+            if record.recipients is not None:
+                target = min(target, len(record.recipients))
+            if record.recipients is not None and record.ack_count >= target:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            # Woken by the ack that reaches the target, or by registration (which may lower it)
+            waiter = (target if record.recipients is not None else 0, asyncio.get_running_loop().create_future())
+            record.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in record.waiters:
+                    record.waiters.remove(waiter)
+
+        waited = time.perf_counter() - started
+        self._waits += 1
+        self._total_wait += waited
+        if timed_out:
+            self._wait_timeouts += 1
+        return {
+            **record.to_dict(),
+            "target": target,
+            "complete": not timed_out,
+            "timed_out": timed_out,
+            "waited_ms": round(waited * 1000, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns tracked dispatches and ack/wait counters."""
+        return {
+            "dispatches": len(self._dispatches),
+            "registered": self._registered,
+            "acks": self._acks,
+            "duplicate_acks": self._duplicate_acks,
+            "unexpected_acks": self._unexpected_acks,
+            "waiting": sum(len(record.waiters) for record in self._dispatches.values()),
+            "waits": self._waits,
+            "wait_timeouts": self._wait_timeouts,
+            "avg_wait_ms": round(self._total_wait / self._waits * 1000, 1) if self._waits else 0.0,
+        }
+
+
+def ack_timeout() -> float:
+    return float(os.getenv("METRO_ACK_TIMEOUT", "20"))
+
+
+_tracker: Optional[AckTracker] = None
+
+
+def get_ack_tracker() -> AckTracker:
+    """Returns the process-wide ack tracker, creating it on first use."""
+    global _tracker
+    if _tracker is None:
+        _tracker = AckTracker(retention=float(os.getenv("METRO_ACK_RETENTION", "3600")))
+    return _tracker
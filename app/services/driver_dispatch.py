@@ -0,0 +1,403 @@
+"""
+driver_dispatch.py
+
+Pages standby drivers for notify_driver.
+
+A dispatch sends one message to every driver on the standby roster. Recipients
+are split into batches that go to the paging gateway concurrently; recipients
+whose delivery failed with a transient error are retried with exponential
+backoff and jitter, and a rate-limited batch (HTTP 429) pauses every batch of
+the engine until the gateway's Retry-After has passed. A batch that is still
+rate-limited METRO_DISPATCH_MAX_RATE_LIMIT_WAIT seconds after its first 429
+gives up, and its recipients count as failed. The result is a
+dispatch ID plus delivery counts, which the ack tracker
+(services/ack_tracker.py) keys on.
+
+Gateways are pluggable (DriverGateway). "stub" simulates paging in-process;
+an http(s) URL posts batches to a real gateway or to the local stub server
+(services/stub_server.py).
+
+Settings (environment variables):
+- METRO_DRIVER_GATEWAY: "stub" or the URL batches are POSTed to (default stub)
+- METRO_DRIVER_ROSTER: JSON file with a list of {"id", "depot", "phone"} drivers
+- METRO_STANDBY_DRIVERS: size of the generated roster when no file is given (default 10)
+- METRO_DISPATCH_BATCH_SIZE: recipients per gateway request (default 50)
+- METRO_DISPATCH_CONCURRENCY: gateway requests in flight per engine (default 8)
+- METRO_DISPATCH_MAX_ATTEMPTS: delivery attempts per recipient (default 4)
+- METRO_DISPATCH_BACKOFF: base retry delay in seconds, doubled per attempt (default 0.2)
+- METRO_DISPATCH_MAX_RATE_LIMIT_WAIT: seconds a batch may stay rate-limited before its recipients fail (default 15)
+- METRO_STUB_LATENCY / METRO_STUB_FAILURE_RATE / METRO_STUB_RATE_LIMIT: behaviour of the stub gateway
+  (seconds per request, transient failure probability per recipient, requests per second; 0 for unlimited)
+- METRO_STUB_ACK_DELAY / METRO_STUB_ACK_RATE: mean seconds until a stub-paged driver acknowledges,
+  and the share of drivers who do (defaults 0.5 and 1)
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+import httpx
+
+from services.ack_tracker import get_ack_tracker
+
+
+@dataclass(frozen=True)
+class Driver:
+    """A standby driver who can be paged."""
+
+    id: str
+    depot: str = "main"
+    phone: str = ""
+
+
+@dataclass
+class BatchResult:
+    """What the gateway did with one batch of recipients."""
+
+    delivered: List[str] = field(default_factory=list)
+    # Transient failures, retried with backoff: driver ID -> reason
+    failed: Dict[str, str] = field(default_factory=dict)
+    # Permanent failures (e.g. unknown number), not retried: driver ID -> reason
+    rejected: Dict[str, str] = field(default_factory=dict)
+
+
+class GatewayRateLimited(Exception):
+    """The gateway refused a batch because of its rate limit."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:g} seconds")
+        self.retry_after = retry_after
+
+
+class DriverGateway(ABC):
+    """Delivers a message to a batch of drivers."""
+
+    @abstractmethod
+    async def send_batch(self, dispatch_id: str, message: str, drivers: Sequence[Driver]) -> BatchResult:
+        """
+        Raises:
+            GatewayRateLimited: If the batch was refused and should be sent again later.
+            Exception: Any other error fails every driver of the batch transiently.
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class StubDriverGateway(DriverGateway):
+    """In-process gateway with configurable latency, transient failures and a rate limit."""
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0, rate_limit: float = 0.0,
+                 ack_delay: float = 0.5, ack_rate: float = 1.0,
+                 ack_sink: Optional[Callable[[str, str], None]] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        # Simulated drivers: ack_rate of the paged drivers call ack_sink(dispatch_id, driver_id)
+        # after a random delay of up to twice ack_delay
+        self.ack_delay = ack_delay
+        self.ack_rate = ack_rate
+        self.ack_sink = ack_sink
+        self._rng = random.Random(seed)
+        self._recent: Deque[float] = deque()
+
+    @classmethod
+    def from_env(cls, ack_sink: Optional[Callable[[str, str], None]] = None) -> "StubDriverGateway":
+        return cls(
+            latency=float(os.getenv("METRO_STUB_LATENCY", "0.05")),
+            failure_rate=float(os.getenv("METRO_STUB_FAILURE_RATE", "0")),
+            rate_limit=float(os.getenv("METRO_STUB_RATE_LIMIT", "0")),
+            ack_delay=float(os.getenv("METRO_STUB_ACK_DELAY", "0.5")),
+            ack_rate=float(os.getenv("METRO_STUB_ACK_RATE", "1")),
+            ack_sink=ack_sink,
+        )
+
+    def _check_rate(self) -> None:
+        if self.rate_limit <= 0:
+            return
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit:
+            raise GatewayRateLimited(retry_after=max(1.0 - (now - self._recent[0]), 0.01))
+        self._recent.append(now)
+
+    async def send_batch(self, dispatch_id: str, message: str, drivers: Sequence[Driver]) -> BatchResult:
+        self._check_rate()
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        result = BatchResult()
+        for driver in drivers:
+            if not driver.phone:
+                result.rejected[driver.id] = "no phone number"
+            elif self._rng.random() < self.failure_rate:
+                result.failed[driver.id] = "carrier timeout"
+            else:
+                result.delivered.append(driver.id)
+        if self.ack_sink is not None:
+            loop = asyncio.get_running_loop()
+            for driver_id in result.delivered:
+                if self._rng.random() < self.ack_rate:
+                    loop.call_later(self._rng.uniform(0, 2 * self.ack_delay), self.ack_sink, dispatch_id, driver_id)
+        return result
+
+
+class HttpDriverGateway(DriverGateway):
+    """
+    POSTs {"dispatch_id", "message", "recipients": [{"id", "depot", "phone"}]} to a URL.
+
+    Expects {"delivered": [...], "failed": {...}, "rejected": {...}} back; a 429
+    with Retry-After is a rate limit, other errors fail the batch transiently.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0, max_connections: int = 32):
+        self.url = url
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def send_batch(self, dispatch_id: str, message: str, drivers: Sequence[Driver]) -> BatchResult:
+        response = await self._client.post(self.url, json={
+            "dispatch_id": dispatch_id,
+            "message": message,
+            "recipients": [{"id": d.id, "depot": d.depot, "phone": d.phone} for d in drivers],
+        })
+        if response.status_code == 429:
+            raise GatewayRateLimited(retry_after=float(response.headers.get("Retry-After", "1")))
+        response.raise_for_status()
+        body = response.json()
+        return BatchResult(
+            delivered=list(body.get("delivered", [])),
+            failed=dict(body.get("failed", {})),
+            rejected=dict(body.get("rejected", {})),
+        )
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def load_roster() -> List[Driver]:
+    """Reads METRO_DRIVER_ROSTER, or generates METRO_STANDBY_DRIVERS drivers across four depots."""
+    path = os.getenv("METRO_DRIVER_ROSTER")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return [Driver(id=str(d["id"]), depot=d.get("depot", "main"), phone=d.get("phone", "")) for d in json.load(f)]
+    count = int(os.getenv("METRO_STANDBY_DRIVERS", "10"))
+    depots = ["north", "south", "east", "west"]
+    return [
+        Driver(id=f"D{index:04d}", depot=depots[index % len(depots)], phone=f"+1555{index:07d}")
+        for index in range(1, count + 1)
+    ]
+
+
+@dataclass
+class DispatchResult:
+    """Delivery outcome of one dispatch."""
+
+    dispatch_id: str
+    recipients: int
+    delivered: int = 0
+    failed: int = 0
+    rejected: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    gateway_requests: int = 0
+    elapsed_ms: float = 0.0
+    # A few failure reasons, keyed by driver ID, for the agent and operators
+    failures: Dict[str, str] = field(default_factory=dict)
+    delivered_ids: List[str] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dispatch_id": self.dispatch_id,
+            "recipients": self.recipients,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "gateway_requests": self.gateway_requests,
+            "elapsed_ms": self.elapsed_ms,
+            "failures": self.failures,
+        }
+
+
+class DispatchEngine:
+    """Sends a message to many drivers through a gateway, with batching, retries and rate-limit backoff."""
+
+    # Failure reasons kept per dispatch
+    MAX_REPORTED_FAILURES = 10
+
+    def __init__(self, gateway: DriverGateway, roster: Optional[List[Driver]] = None, batch_size: int = 50,
+                 concurrency: int = 8, max_attempts: int = 4, backoff: float = 0.2, max_backoff: float = 5.0,
+                 max_rate_limit_wait: float = 15.0):
+        self.gateway = gateway
+        self.roster = roster if roster is not None else load_roster()
+        self.batch_size = max(batch_size, 1)
+        self.concurrency = max(concurrency, 1)
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._paused_until = 0.0
+        self._rng = random.Random()
+
+        # Counters reported by stats()
+        self._dispatches = 0
+        self._recipients = 0
+        self._delivered = 0
+        self._failed = 0
+        self._retries = 0
+        self._rate_limited = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the event loop that serves requests
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def dispatch(self, message: str, drivers: Optional[Sequence[Driver]] = None) -> DispatchResult:
+        """
+        Pages every driver (the standby roster by default) with message.
+
+        Returns:
+            DispatchResult: The dispatch ID and delivery counts. Recipients still
+                failing after max_attempts, or rate-limited for longer than
+                max_rate_limit_wait, count as failed; the call itself
+                only raises on cancellation.
+        """
+        drivers = list(drivers if drivers is not None else self.roster)
+        result = DispatchResult(dispatch_id=f"dsp-{uuid.uuid4().hex[:12]}", recipients=len(drivers))
+        started = time.perf_counter()
+        batches = [drivers[i:i + self.batch_size] for i in range(0, len(drivers), self.batch_size)]
+        await asyncio.gather(*(self._send(result, message, batch) for batch in batches))
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        self._dispatches += 1
+        self._recipients += result.recipients
+        self._delivered += result.delivered
+        self._failed += result.failed + result.rejected
+        self._retries += result.retries
+        self._rate_limited += result.rate_limited
+        print(f"Dispatch {result.dispatch_id}: {result.delivered}/{result.recipients} drivers paged "
+              f"in {result.elapsed_ms} ms ({result.retries} retries)")
+        return result
+
+    async def _send(self, result: DispatchResult, message: str, batch: List[Driver]) -> None:
+        pending = {driver.id: driver for driver in batch}
+        attempt = 0
+        last_errors: Dict[str, str] = {}
+        # Set by the first 429; a gateway that keeps refusing must not hold the batch forever
+        give_up_at: Optional[float] = None
+        while pending and attempt < self.max_attempts:
+            await self._wait_for_rate_limit()
+            async with self.semaphore:
+                result.gateway_requests += 1
+                try:
+                    outcome = await self.gateway.send_batch(result.dispatch_id, message, list(pending.values()))
+                except GatewayRateLimited as e:
+                    # Not the recipients' fault: hold every batch back and try again without using an attempt
+                    result.rate_limited += 1
+                    now = time.monotonic()
+                    if give_up_at is None:
+                        give_up_at = now + self.max_rate_limit_wait
+                    if now + e.retry_after > give_up_at:
+                        reason = f"rate limited by the gateway for over {self.max_rate_limit_wait:g} seconds"
+                        last_errors = {driver_id: reason for driver_id in pending}
+                        break
+                    self._paused_until = max(self._paused_until, now + e.retry_after)
+                    continue
+                except Exception as e:
+                    outcome = BatchResult(failed={driver_id: str(e) or type(e).__name__ for driver_id in pending})
+
+            for driver_id in outcome.delivered:
+                if pending.pop(driver_id, None) is not None:
+                    result.delivered += 1
+                    result.delivered_ids.append(driver_id)
+            for driver_id, reason in outcome.rejected.items():
+                if pending.pop(driver_id, None) is not None:
+                    result.rejected += 1
+                    self._report(result, driver_id, reason)
+            last_errors = outcome.failed
+            attempt += 1
+            if pending and attempt < self.max_attempts:
+                result.retries += len(pending)
+                delay = min(self.backoff * (2 ** (attempt - 1)), self.max_backoff)
+                await asyncio.sleep(delay * (0.5 + self._rng.random() / 2))
+
+        for driver_id in pending:
+            result.failed += 1
+            self._report(result, driver_id, last_errors.get(driver_id, "not delivered"))
+
+    def _report(self, result: DispatchResult, driver_id: str, reason: str) -> None:
+        if len(result.failures) < self.MAX_REPORTED_FAILURES:
+            result.failures[driver_id] = reason
+
+    async def _wait_for_rate_limit(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        await self.gateway.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns dispatch and delivery counters."""
+        return {
+            "gateway": type(self.gateway).__name__,
+            "roster_size": len(self.roster),
+            "dispatches": self._dispatches,
+            "recipients": self._recipients,
+            "delivered": self._delivered,
+            "failed": self._failed,
+            "delivery_rate": round(self._delivered / self._recipients, 4) if self._recipients else 0.0,
+            "retries": self._retries,
+            "rate_limited_batches": self._rate_limited,
+        }
+
+
+def create_gateway(spec: str) -> DriverGateway:
+    """Builds the gateway named by METRO_DRIVER_GATEWAY ("stub" or a URL)."""
+    if spec == "stub":
+        # The simulated drivers acknowledge through the ack tracker, as the ingestion endpoint would
+        tracker = get_ack_tracker()
+        return StubDriverGateway.from_env(ack_sink=lambda dispatch_id, driver_id: tracker.record_ack(dispatch_id, [driver_id]))
+    if spec.startswith(("http://", "https://")):
+        return HttpDriverGateway(spec)
+    raise ValueError(f"Unknown driver gateway: {spec}")
+
+
+_engine: Optional[DispatchEngine] = None
+
+
+def get_dispatch_engine() -> DispatchEngine:
+    """Returns the process-wide dispatch engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = DispatchEngine(
+            create_gateway(os.getenv("METRO_DRIVER_GATEWAY", "stub")),
+            batch_size=int(os.getenv("METRO_DISPATCH_BATCH_SIZE", "50")),
+            concurrency=int(os.getenv("METRO_DISPATCH_CONCURRENCY", "8")),
+            max_attempts=int(os.getenv("METRO_DISPATCH_MAX_ATTEMPTS", "4")),
+            backoff=float(os.getenv("METRO_DISPATCH_BACKOFF", "0.2")),
+            max_rate_limit_wait=float(os.getenv("METRO_DISPATCH_MAX_RATE_LIMIT_WAIT", "15")),
+        )
+    return _engine
+
+
+async def close_dispatch_engine() -> None:
+    """Closes the engine's gateway, if the engine was created."""
+    global _engine
+    if _engine is not None:
+        await _engine.close()
+        _engine = None
@@ -0,0 +1,104 @@
+"""
+incident_simulator.py
+
+Stands in for the operations feed during development: every new incident is
+marked resolved after a short random delay, as if service had been restored.
+It reaches the incident store the same way as the feed would
+(update_status), so subscribers and waiting tools see the same events.
+Incidents still open when it starts (left by an earlier process, or logged
+while nothing resolved them) are resolved the same way.
+
+Only enabled when METRO_INCIDENT_FEED is "simulator", for development and
+benchmarks; by default ("external") statuses come from
+POST /api/metro_task/incidents/{id}/status, so a fake feed never resolves
+real incidents.
+
+Settings (environment variables):
+- METRO_INCIDENT_FEED: "simulator" or "external" (default external)
+- METRO_SIMULATED_RESOLUTION: mean seconds until a simulated incident is resolved (default 1)
+"""
+
+import asyncio
+import os
+import random
+from typing import Any, Dict, Optional, Set
+
+from services.incident_store import Incident, IncidentStore
+
+
+# Open incidents picked up at startup
+STARTUP_SWEEP_LIMIT = 10000
+
+
+class IncidentSimulator:
+    """Resolves open incidents after a random delay of 0.5x to 1.5x the mean."""
+
+    def __init__(self, store: IncidentStore, mean_delay: float = 1.0):
+        self.store = store
+        self.mean_delay = mean_delay
+        self._tasks: Set[asyncio.Task] = set()
+        # Incidents with a resolution scheduled, so the startup sweep and new reports do not double up
+        self._scheduled: Set[str] = set()
+        self._resolved = 0
+
+    def start(self) -> None:
+        self.store.subscribe(self._on_incident)
+        self._track(asyncio.get_running_loop().create_task(self._resolve_open()))
+
+    def stop(self) -> None:
+        self.store.unsubscribe(self._on_incident)
+        for task in self._tasks:
+            task.cancel()
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _schedule(self, incident_id: str) -> None:
+        if incident_id in self._scheduled:
+            return
+        self._scheduled.add(incident_id)
+        self._track(asyncio.get_running_loop().create_task(self._resolve_later(incident_id)))
+
+    def _on_incident(self, incident: Incident) -> None:
+        if incident.status == "open":
+            self._schedule(incident.id)
+
+    async def _resolve_open(self) -> None:
+        for incident in await self.store.find(status="open", limit=STARTUP_SWEEP_LIMIT):
+            self._schedule(incident.id)
+
+    async def _resolve_later(self, incident_id: str) -> None:
+        try:
+            await asyncio.sleep(self.mean_delay * random.uniform(0.5, 1.5))
+            incident = await self.store.get(incident_id)
+            if incident is not None and incident.status == "open":
+                await self.store.update_status(incident_id, "resolved")
+                self._resolved += 1
+        finally:
+            self._scheduled.discard(incident_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._tasks), "resolved": self._resolved}
+
+
+_simulator: Optional[IncidentSimulator] = None
+
+
+def start_incident_simulator(store: IncidentStore) -> Optional[IncidentSimulator]:
+    """Starts the simulator on store if METRO_INCIDENT_FEED is "simulator"."""
+    global _simulator
+    feed = os.getenv("METRO_INCIDENT_FEED", "external").lower()
+    if feed == "external":
+        return None
+    if feed != "simulator":
+        raise ValueError(f"Unknown METRO_INCIDENT_FEED: {feed}")
+    if _simulator is None:
+        _simulator = IncidentSimulator(store, mean_delay=float(os.getenv("METRO_SIMULATED_RESOLUTION", "1")))
+        _simulator.start()
+        print("Incident simulator resolves open incidents (METRO_INCIDENT_FEED=simulator)")
+    return _simulator
+
+
+def get_incident_simulator() -> Optional[IncidentSimulator]:
+    return _simulator
@@ -0,0 +1,468 @@
+"""
+incident_store.py
+
+Embedded, persistent incident store behind log_incident and
+check_incident_status.
+
+Incidents live in a SQLite database in WAL mode, keyed by incident ID, with
+secondary indexes on station, line, status and report time, so lookups by ID
+or by location are B-tree searches (O(log n)) however many incidents pile up.
+
+Writes never run on the event loop. A single writer thread owns the write
+connection and commits queued writes in groups: it takes the first waiting
+write, collects whatever else arrives within METRO_INCIDENT_COMMIT_DELAY (up
+to METRO_INCIDENT_COMMIT_BATCH writes) and commits them in one transaction,
+so a burst of reports during a network-wide event costs one fsync per group
+rather than per incident. Each write runs under its own savepoint; a failing
+write is reported to its caller without aborting the rest of the group.
+Reads go to a small thread pool with one connection per thread (WAL readers
+do not block the writer).
+
+A report whose incident key (planner/IncidentParser.py) matches an
+incident that is still open is counted as another report of it instead of
+opening a new incident.
+
+Status changes are pushed, not polled: listeners registered with subscribe()
+are called with every new incident and every status change, and
+wait_for_status() lets a caller sleep until an incident reaches a status.
+Statuses are set through POST /api/metro_task/incidents/{id}/status by the
+operations feed or, for development, by services/incident_simulator.py.
+
+Settings (environment variables):
+- METRO_INCIDENT_DB: path of the SQLite database (default app/data/incidents.db)
+- METRO_INCIDENT_COMMIT_BATCH: most writes per transaction (default 256)
+- METRO_INCIDENT_COMMIT_DELAY: seconds the writer waits for more writes before committing (default 0.002)
+- METRO_INCIDENT_READERS: reader threads (default 4)
+"""
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from planner.IncidentParser import ParsedIncident, parse_incident
+
+INCIDENT_STATUSES = ("open", "resolved")
+
+# Next to the code rather than in the working directory, so every entry point uses the same file
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "incidents.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    incident_type TEXT NOT NULL,
+    station TEXT,
+    line TEXT,
+    location TEXT,
+    description TEXT NOT NULL,
+    status TEXT NOT NULL,
+    reports INTEGER NOT NULL DEFAULT 1,
+    reported_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    resolved_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_station ON incidents (station, reported_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_line ON incidents (line, reported_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents (status, reported_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_reported_at ON incidents (reported_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_key ON incidents (key, status);
+"""
+
+_COLUMNS = "id, key, incident_type, station, line, location, description, status, reports, reported_at, updated_at, resolved_at"
+
+
+@dataclass
+class Incident:
+    """One incident record."""
+
+    id: str
+    key: str
+    incident_type: str
+    station: Optional[str]
+    line: Optional[str]
+    location: Optional[str]
+    description: str
+    status: str
+    reports: int
+    reported_at: float
+    updated_at: float
+    resolved_at: Optional[float] = None
+
+    @property
+    def resolved(self) -> bool:
+        return self.status == "resolved"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _parse_location(location: str, incident_type: str = "disruption") -> ParsedIncident:
+    """Parses a bare location such as "Central station", "Red line" or "Central"."""
+    parsed = parse_incident(location)
+    if parsed.location is None:
+        parsed = parse_incident(f"{incident_type} at {location}")
+    if parsed.location is None and location.strip():
+        # An unrecognised name is taken as the station name itself
+        return ParsedIncident(text=location, incident_type=incident_type, station=" ".join(location.lower().split()))
+    return ParsedIncident(text=location, incident_type=incident_type, station=parsed.station, line=parsed.line)
+
+
+def _row_to_incident(row: Optional[tuple]) -> Optional[Incident]:
+    return Incident(*row) if row is not None else None
+
+
+class IncidentStore:
+    """SQLite-backed incident records with a group-committing writer thread."""
+
+    def __init__(self, path: str = DEFAULT_PATH, commit_batch: int = 256, commit_delay: float = 0.002,
+                 readers: int = 4):
+        self.path = path
+        self.commit_batch = max(commit_batch, 1)
+        self.commit_delay = commit_delay
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="metro-incident-read")
+        self._listeners: List[Callable[[Incident], None]] = []
+        # Futures of wait_for_status() callers, by incident ID
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+        # Counters reported by stats(); only the writer thread updates the write counters
+        self._writes = 0
+        self._write_errors = 0
+        self._transactions = 0
+        self._max_group = 0
+        self._total_commit = 0.0
+        self._reads = 0
+        self._status_changes = 0
+        self._waits = 0
+        self._wait_timeouts = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly by the writer
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last commits on power loss, never corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    # Writes
+
+    def _ensure_writer(self) -> None:
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="metro-incident-writer", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            group = [item]
+            deadline = time.monotonic() + self.commit_delay
+            while len(group) < self.commit_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            self._commit(conn, group)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, group: List[tuple]) -> None:
+        started = time.perf_counter()
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, _, _ in group:
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((fn(conn), None))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(None, e)] * len(group)
+
+        self._transactions += 1
+        self._writes += len(group)
+        self._max_group = max(self._max_group, len(group))
+        self._total_commit += time.perf_counter() - started
+        for (_, future, loop), (result, error) in zip(group, results):
+            if error is not None:
+                self._write_errors += 1
+            try:
+                loop.call_soon_threadsafe(self._resolve, future, result, error)
+            except RuntimeError:
+                # The caller's loop has closed; nobody is waiting for the result
+                pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any, error: Optional[Exception]) -> None:
+        # The caller may have been cancelled; the write is committed regardless
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        self._ensure_writer()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((fn, future, loop))
+        return await future
+
+    async def log(self, description: str, location: Optional[str] = None) -> Incident:
+        """
+        Records a reported incident, or another report of a matching open incident.
+
+        Args:
+            description (str): The incident report.
+            location (str, optional): Station or line named by the reporter, used
+                when the report itself does not name one.
+        """
+        parsed = parse_incident(description)
+        if parsed.location is None and location:
+            located = _parse_location(location, parsed.incident_type)
+            if located.location is not None:
+                parsed = ParsedIncident(text=description, incident_type=parsed.incident_type,
+                                        station=located.station, line=located.line)
+        now = time.time()
+
+        def write(conn: sqlite3.Connection) -> Incident:
+            existing = conn.execute(
+                f"SELECT {_COLUMNS} FROM incidents WHERE key = ? AND status = 'open' ORDER BY reported_at DESC LIMIT 1",
+                (parsed.key,),
+            ).fetchone()
+            if existing is not None:
+                conn.execute("UPDATE incidents SET reports = reports + 1, updated_at = ? WHERE id = ?", (now, existing[0]))
+                incident = _row_to_incident(existing)
+                incident.reports += 1
+                incident.updated_at = now
+                return incident
+            incident = Incident(
+                id=f"inc-{uuid.uuid4().hex[:12]}", key=parsed.key, incident_type=parsed.incident_type,
+                station=parsed.station, line=parsed.line, location=parsed.location or location,
+                description=description, status="open", reports=1, reported_at=now, updated_at=now,
+            )
+            conn.execute(f"INSERT INTO incidents ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         tuple(asdict(incident).values()))
+            return incident
+
+        incident = await self._write(write)
+        if incident.reports == 1:
+            self._publish(incident)
+        return incident
+
+    async def update_status(self, incident_id: str, status: str) -> Optional[Incident]:
+        """
+        Sets an incident's status.
+
+        Returns:
+            Incident: The updated incident, or None if there is no such incident.
+
+        Raises:
+            ValueError: If status is not one of INCIDENT_STATUSES.
+        """
+        if status not in INCIDENT_STATUSES:
+            raise ValueError(f"Unknown incident status: {status} (expected one of {', '.join(INCIDENT_STATUSES)})")
+        now = time.time()
+
+        def write(conn: sqlite3.Connection) -> Optional[Incident]:
+            conn.execute(
+                "UPDATE incidents SET status = ?, updated_at = ?, resolved_at = ? WHERE id = ?",
+                (status, now, now if status == "resolved" else None, incident_id),
+            )
+            return _row_to_incident(conn.execute(f"SELECT {_COLUMNS} FROM incidents WHERE id = ?", (incident_id,)).fetchone())
+
+        incident = await self._write(write)
+        if incident is not None:
+            self._status_changes += 1
+            self._publish(incident)
+        return incident
+
+    # Status subscriptions
+
+    def subscribe(self, listener: Callable[[Incident], None]) -> None:
+        """Calls listener (on the event loop) with every new incident and every status change."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[Incident], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _publish(self, incident: Incident) -> None:
+        for future in self._waiters.pop(incident.id, []):
+            if not future.done():
+                future.set_result(incident)
+        for listener in list(self._listeners):
+            try:
+                listener(incident)
+            except Exception as e:
+                print(f"Incident listener failed for {incident.id}: {e}")
+
+    async def wait_for_status(self, incident_id: str, statuses: Sequence[str] = ("resolved",),
+                              timeout: float = 30.0) -> Optional[Incident]:
+        """
+        Waits until the incident has one of statuses, woken by its status changes.
+
+        Returns:
+            Incident: The incident as last seen, whether or not it reached one of
+                statuses in time; None if there is no such incident.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        self._waits += 1
+        # Registered before the first read, so a change in between is not missed
+        future = loop.create_future()
+        self._waiters.setdefault(incident_id, []).append(future)
+        try:
+            incident = await self.get(incident_id)
+            while incident is not None and incident.status not in statuses:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self._wait_timeouts += 1
+                    break
+                try:
+                    incident = await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+                except asyncio.TimeoutError:
+                    continue
+                future = loop.create_future()
+                self._waiters.setdefault(incident_id, []).append(future)
+            return incident
+        finally:
+            waiters = self._waiters.get(incident_id)
+            if waiters is not None and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[incident_id]
+
+    # Reads
+
+    def _read_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    async def _read(self, sql: str, params: tuple) -> List[tuple]:
+        def read() -> List[tuple]:
+            return self._read_connection().execute(sql, params).fetchall()
+        self._reads += 1
+        return await asyncio.get_running_loop().run_in_executor(self._readers, read)
+
+    async def get(self, incident_id: str) -> Optional[Incident]:
+        """The incident with this ID, or None."""
+        rows = await self._read(f"SELECT {_COLUMNS} FROM incidents WHERE id = ?", (incident_id,))
+        return _row_to_incident(rows[0] if rows else None)
+
+    async def find(self, station: Optional[str] = None, line: Optional[str] = None, status: Optional[str] = None,
+                   since: Optional[float] = None, limit: int = 50) -> List[Incident]:
+        """Incidents matching every given filter, newest first. since is a Unix timestamp."""
+        clauses, params = [], []
+        for column, value in (("station", station), ("line", line), ("status", status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value.lower() if column != "status" else value)
+        if since is not None:
+            clauses.append("reported_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = await self._read(f"SELECT {_COLUMNS} FROM incidents {where} ORDER BY reported_at DESC LIMIT ?",
+                                (*params, limit))
+        return [_row_to_incident(row) for row in rows]
+
+    async def latest_at(self, location: str) -> Optional[Incident]:
+        """The most recent incident at a station or on a line named in location, or None."""
+        parsed = _parse_location(location)
+        if parsed.station is not None:
+            found = await self.find(station=parsed.station, limit=1)
+            if found:
+                return found[0]
+        if parsed.line is not None:
+            found = await self.find(line=parsed.line, limit=1)
+            if found:
+                return found[0]
+        return None
+
+    # Lifecycle
+
+    def close(self) -> None:
+        """Commits queued writes, then stops the writer thread and the readers."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        self._readers.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns write, group-commit, read and status subscription counters."""
+        return {
+            "path": self.path,
+            "writes": self._writes,
+            "write_errors": self._write_errors,
+            "queued_writes": self._queue.qsize(),
+            "transactions": self._transactions,
+            "avg_group_size": round(self._writes / self._transactions, 2) if self._transactions else 0.0,
+            "max_group_size": self._max_group,
+            "avg_commit_ms": round(self._total_commit / self._transactions * 1000, 2) if self._transactions else 0.0,
+            "reads": self._reads,
+            "status_changes": self._status_changes,
+            "status_waiters": sum(len(waiters) for waiters in self._waiters.values()),
+            "status_waits": self._waits,
+            "status_wait_timeouts": self._wait_timeouts,
+        }
+
+
+_store: Optional[IncidentStore] = None
+
+
+def get_incident_store() -> IncidentStore:
+    """Returns the process-wide incident store, opening the database on first use."""
+    global _store
+    if _store is None:
+        _store = IncidentStore(
+            path=os.getenv("METRO_INCIDENT_DB", DEFAULT_PATH),
+            commit_batch=int(os.getenv("METRO_INCIDENT_COMMIT_BATCH", "256")),
+            commit_delay=float(os.getenv("METRO_INCIDENT_COMMIT_DELAY", "0.002")),
+            readers=int(os.getenv("METRO_INCIDENT_READERS", "4")),
+        )
+    return _store
+
+
+def close_incident_store() -> None:
+    """Flushes and closes the incident store, if it was opened."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
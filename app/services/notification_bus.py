@@ -0,0 +1,325 @@
+"""
+notification_bus.py
+
+In-process publish/subscribe bus for internal notifications.
+
+Internal teams subscribe to topics such as "role:control_room", "line:red"
+or "depot:north"; send_internal_notification publishes to the topics of an
+incident and reports how many subscribers received and acknowledged it.
+A subscriber on several matching topics gets a notification once.
+
+Every subscription has a bounded queue and an overflow policy:
+
+- "drop_oldest": the oldest queued notification makes room (default; a
+  console that falls behind sees the latest news)
+- "drop_newest": the new notification is not queued for that subscriber
+- "block": the publisher waits up to METRO_BUS_BLOCK_TIMEOUT for room, then
+  drops; only this policy can slow a publish down
+
+Fan-out yields to the event loop every METRO_BUS_FANOUT_CHUNK subscribers,
+so publishing to thousands of subscribers does not stall request handling.
+Subscribers acknowledge a notification once handled (handler subscriptions
+automatically, stream subscribers when the event was written out); publish()
+waits up to METRO_BUS_ACK_WAIT for the acks.
+
+INTERNAL_TEAMS are subscribed in-process with an acknowledging handler;
+consoles subscribe over GET /api/metro_task/notifications/stream.
+
+Settings (environment variables):
+- METRO_BUS_QUEUE_SIZE: notifications queued per subscriber (default 100)
+- METRO_BUS_POLICY: default overflow policy (default drop_oldest)
+- METRO_BUS_BLOCK_TIMEOUT: seconds a "block" subscriber may hold up a publish (default 1)
+- METRO_BUS_ACK_WAIT: seconds publish() waits for acknowledgments (default 0.5)
+- METRO_BUS_FANOUT_CHUNK: subscribers served between yields to the event loop (default 100)
+"""
+
+import asyncio
+import itertools
+import os
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+# Teams subscribed in-process: name -> topics
+INTERNAL_TEAMS: Dict[str, List[str]] = {
+    "Control Room": ["role:control_room"],
+    "Bus Operations": ["role:bus_ops"],
+    "Maintenance": ["role:maintenance"],
+    "Depot Operations": ["role:depot_ops", "depot:north", "depot:south", "depot:east", "depot:west"],
+}
+
+# Topics every incident notification goes to, on top of its line and station
+DEFAULT_TOPICS = ["role:control_room", "role:bus_ops", "role:maintenance", "role:depot_ops"]
+
+
+@dataclass
+class Notification:
+    """One published notification and its delivery counts."""
+
+    id: str
+    summary: str
+    topics: List[str]
+    created: float = field(default_factory=time.time)
+    recipients: int = 0
+    delivered: int = 0
+    dropped: int = 0
+    acked: int = 0
+    # Delivered, then pushed out of a full "drop_oldest" queue unhandled
+    evicted: int = 0
+    _fanned_out: bool = field(default=False, repr=False)
+    _settled: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def pending(self) -> int:
+        return self.delivered - self.evicted - self.acked
+
+    def _check_settled(self) -> None:
+        if self._fanned_out and self.pending <= 0:
+            self._settled.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "notification_id": self.id,
+            "summary": self.summary,
+            "topics": self.topics,
+            "created": self.created,
+        }
+
+    def counts(self) -> Dict[str, int]:
+        return {"recipients": self.recipients, "delivered": self.delivered, "dropped": self.dropped, "acknowledged": self.acked}
+
+
+class Subscription:
+    """A subscriber's topics, bounded queue and counters."""
+
+    def __init__(self, name: str, topics: Iterable[str], maxsize: int, policy: str,
+                 handler: Optional[Callable[[Notification], Awaitable[None]]] = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy} (expected one of {', '.join(OVERFLOW_POLICIES)})")
+        self.id = f"sub-{uuid.uuid4().hex[:12]}"
+        self.name = name
+        self.topics = set(topics)
+        self.policy = policy
+        self.queue: "asyncio.Queue[Notification]" = asyncio.Queue(maxsize=maxsize)
+        self.handler = handler
+        self.received = 0
+        self.dropped = 0
+        self.acked = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self) -> Notification:
+        """The next notification; call ack() once it was handled."""
+        return await self.queue.get()
+
+    def ack(self, notification: Notification) -> None:
+        self.acked += 1
+        notification.acked += 1
+        notification._check_settled()
+
+    def _offer(self, notification: Notification) -> str:
+        """Queues without waiting: "queued", "dropped", or "full" for a full "block" subscriber."""
+        if self.queue.full():
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return "dropped"
+            if self.policy == "block":
+                return "full"
+            evicted = self.queue.get_nowait()
+            self.dropped += 1
+            evicted.dropped += 1
+            evicted.evicted += 1
+            evicted._check_settled()
+        self.queue.put_nowait(notification)
+        self.received += 1
+        return "queued"
+
+    def _start(self) -> None:
+        if self.handler is not None and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_handler())
+
+    async def _run_handler(self) -> None:
+        while True:
+            notification = await self.queue.get()
+            try:
+                await self.handler(notification)
+                self.ack(notification)
+            except Exception as e:
+                print(f"Notification handler of {self.name} failed: {e}")
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "topics": sorted(self.topics),
+            "policy": self.policy,
+            "queued": self.queue.qsize(),
+            "received": self.received,
+            "dropped": self.dropped,
+            "acked": self.acked,
+        }
+
+
+class NotificationBus:
+    """Topic-based fan-out to bounded subscriber queues."""
+
+    def __init__(self, queue_size: int = 100, policy: str = "drop_oldest", block_timeout: float = 1.0,
+                 ack_wait: float = 0.5, fanout_chunk: int = 100):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.ack_wait = ack_wait
+        self.fanout_chunk = max(fanout_chunk, 1)
+        self._subscriptions: Dict[str, Subscription] = {}
+        self._by_topic: Dict[str, Set[str]] = defaultdict(set)
+
+        # Counters reported by stats()
+        self._published = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._acked = 0
+        self._max_fanout = 0
+        self._max_publish = 0.0
+
+    def subscribe(self, name: str, topics: Iterable[str], maxsize: Optional[int] = None, policy: Optional[str] = None,
+                  handler: Optional[Callable[[Notification], Awaitable[None]]] = None) -> Subscription:
+        """
+        Subscribes to topics. With a handler, notifications are handled and
+        acknowledged on a task of their own; without one, the caller reads
+        them with get() and acknowledges them with ack().
+
+        Raises:
+            ValueError: If policy is not one of OVERFLOW_POLICIES.
+        """
+        subscription = Subscription(name, topics, maxsize or self.queue_size, policy or self.policy, handler)
+        self._subscriptions[subscription.id] = subscription
+        for topic in subscription.topics:
+            self._by_topic[topic].add(subscription.id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.pop(subscription.id, None)
+        for topic in subscription.topics:
+            ids = self._by_topic.get(topic)
+            if ids is not None:
+                ids.discard(subscription.id)
+                if not ids:
+                    del self._by_topic[topic]
+        subscription.close()
+
+    async def publish(self, summary: str, topics: Iterable[str], ack_wait: Optional[float] = None) -> Notification:
+        """
+        Delivers a notification to every subscriber of any of topics.
+
+        Returns:
+            Notification: With recipient, delivery, drop and acknowledgment counts
+                as of the end of the ack wait.
+        """
+        started = time.perf_counter()
+        topics = list(dict.fromkeys(topics))
+        notification = Notification(id=f"ntf-{uuid.uuid4().hex[:12]}", summary=summary, topics=topics)
+        recipient_ids = set(itertools.chain.from_iterable(self._by_topic.get(topic, ()) for topic in topics))
+        notification.recipients = len(recipient_ids)
+
+        blocked: List[Subscription] = []
+        for index, subscription_id in enumerate(recipient_ids, start=1):
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is None:
+                continue
+            subscription._start()
+            outcome = subscription._offer(notification)
+            if outcome == "queued":
+                notification.delivered += 1
+            elif outcome == "dropped":
+                notification.dropped += 1
+            else:
+                blocked.append(subscription)
+            if index % self.fanout_chunk == 0:
+                await asyncio.sleep(0)
+        if blocked:
+            await asyncio.gather(*(self._put_blocking(subscription, notification) for subscription in blocked))
+
+        wait = self.ack_wait if ack_wait is None else ack_wait
+        notification._fanned_out = True
+        notification._check_settled()
+        if wait > 0 and notification.pending > 0:
+            try:
+                await asyncio.wait_for(notification._settled.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+        self._published += 1
+        self._delivered += notification.delivered
+        self._dropped += notification.dropped
+        self._acked += notification.acked
+        self._max_fanout = max(self._max_fanout, notification.recipients)
+        self._max_publish = max(self._max_publish, time.perf_counter() - started)
+        return notification
+
+    async def _put_blocking(self, subscription: Subscription, notification: Notification) -> None:
+        try:
+            await asyncio.wait_for(subscription.queue.put(notification), timeout=self.block_timeout)
+            notification.delivered += 1
+            subscription.received += 1
+        except asyncio.TimeoutError:
+            subscription.dropped += 1
+            notification.dropped += 1
+
+    async def close(self) -> None:
+        for subscription in list(self._subscriptions.values()):
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns subscription, fan-out, drop and acknowledgment counters."""
+        subscriptions = list(self._subscriptions.values())
+        return {
+            "subscribers": len(subscriptions),
+            "topics": len(self._by_topic),
+            "queued": sum(subscription.queue.qsize() for subscription in subscriptions),
+            "published": self._published,
+            "delivered": self._delivered,
+            "dropped": self._dropped,
+            "acknowledged_within_wait": self._acked,
+            "max_fanout": self._max_fanout,
+            "max_publish_ms": round(self._max_publish * 1000, 2),
+            "teams": [subscription.stats() for subscription in subscriptions if subscription.handler is not None][:20],
+        }
+
+
+async def _acknowledge(notification: Notification) -> None:
+    # The in-process teams only need to receive the notification
+    return None
+
+
+_bus: Optional[NotificationBus] = None
+
+
+def get_notification_bus() -> NotificationBus:
+    """Returns the process-wide bus, creating it (with INTERNAL_TEAMS subscribed) on first use."""
+    global _bus
+    if _bus is None:
+        _bus = NotificationBus(
+            queue_size=int(os.getenv("METRO_BUS_QUEUE_SIZE", "100")),
+            policy=os.getenv("METRO_BUS_POLICY", "drop_oldest"),
+            block_timeout=float(os.getenv("METRO_BUS_BLOCK_TIMEOUT", "1")),
+            ack_wait=float(os.getenv("METRO_BUS_ACK_WAIT", "0.5")),
+            fanout_chunk=int(os.getenv("METRO_BUS_FANOUT_CHUNK", "100")),
+        )
+        for name, topics in INTERNAL_TEAMS.items():
+            _bus.subscribe(name, topics, handler=_acknowledge)
+    return _bus
+
+
+async def close_notification_bus() -> None:
+    """Cancels the subscribers' handler tasks, if the bus was created."""
+    global _bus
+    if _bus is not None:
+        await _bus.close()
+        _bus = None
@@ -0,0 +1,428 @@
+"""
+public_publisher.py
+
+Sends public notices to every public channel: X, Facebook, Instagram, the
+mobile app push service and the station displays.
+
+publish() formats the notice for each channel (length limits differ) and
+puts it on that channel's queue, then returns; it never waits for a channel
+longer than METRO_PUBLISH_WAIT. Each channel has its own workers, so a slow
+or rate-limited channel only delays its own queue:
+
+- a token bucket keeps each channel under its request rate (CHANNEL_LIMITS)
+- a 429 pauses the channel until Retry-After; a notice still rate-limited
+  METRO_PUBLISH_MAX_RATE_LIMIT_WAIT seconds after its first 429 fails on that
+  channel, so a channel that keeps refusing cannot tie up its workers
+- transient errors are retried with exponential backoff and jitter, up to
+  METRO_PUBLISH_MAX_ATTEMPTS
+- a full queue drops the notice for that channel instead of blocking
+- per-channel send and end-to-end (queued to delivered) latencies are kept
+  for stats() and GET /api/metro_task/notices/{notice_id}
+
+Channel adapters are pluggable (ChannelAdapter). "stub" simulates the
+channels in-process; a base URL posts to {url}/channels/{channel} over one
+pooled HTTP client, e.g. the local stub server (services/stub_server.py).
+
+Settings (environment variables):
+- METRO_PUBLISH_GATEWAY: "stub" or the base URL of the channel gateways (default stub)
+- METRO_PUBLISH_CHANNELS: comma-separated channels to publish to (default: all of CHANNEL_LIMITS)
+- METRO_PUBLISH_WAIT: seconds publish() waits for deliveries before returning (default 0.25)
+- METRO_PUBLISH_MAX_ATTEMPTS: delivery attempts per channel (default 4)
+- METRO_PUBLISH_BACKOFF: base retry delay in seconds, doubled per attempt (default 0.5)
+- METRO_PUBLISH_MAX_RATE_LIMIT_WAIT: seconds a notice may stay rate-limited on a channel before it fails there (default 60)
+- METRO_PUBLISH_QUEUE_SIZE: notices queued per channel before new ones are dropped (default 1000)
+- METRO_STUB_CHANNEL_LATENCY / METRO_STUB_CHANNEL_FAILURE_RATE: behaviour of the stub channels
+  (seconds per post, transient failure probability; defaults 0.1 and 0)
+"""
+
+import asyncio
+import math
+import os
+import random
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+# Per-channel limits: requests per second, burst, concurrent posts and the
+# longest text the channel accepts
+CHANNEL_LIMITS: Dict[str, Dict[str, float]] = {
+    "x": {"rate": 5, "burst": 5, "concurrency": 2, "max_length": 280},
+    "facebook": {"rate": 10, "burst": 10, "concurrency": 4, "max_length": 2000},
+    "instagram": {"rate": 2, "burst": 2, "concurrency": 1, "max_length": 2200},
+    "app_push": {"rate": 50, "burst": 50, "concurrency": 8, "max_length": 178},
+    "station_displays": {"rate": 20, "burst": 20, "concurrency": 4, "max_length": 120},
+}
+
+# Recent latencies kept per channel for the percentiles in stats()
+LATENCY_WINDOW = 500
+
+# Notices whose delivery status is kept for GET /notices/{notice_id}
+NOTICE_HISTORY = 1000
+
+
+class ChannelRateLimited(Exception):
+    """The channel refused a post because of its rate limit."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:g} seconds")
+        self.retry_after = retry_after
+
+
+class ChannelRejected(Exception):
+    """The channel refused a post for good (e.g. invalid content); not retried."""
+
+
+class ChannelAdapter(ABC):
+    """Posts text to one public channel."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    async def send(self, notice_id: str, kind: str, text: str) -> str:
+        """
+        Returns:
+            str: The channel's ID of the post.
+
+        Raises:
+            ChannelRateLimited: If the post should be sent again after retry_after.
+            ChannelRejected: If the post must not be retried.
+            Exception: Any other error is retried.
+        """
+
+
+class StubChannel(ChannelAdapter):
+    """In-process channel with configurable latency and transient failures."""
+
+    def __init__(self, name: str, latency: float = 0.1, failure_rate: float = 0.0):
+        super().__init__(name)
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    async def send(self, notice_id: str, kind: str, text: str) -> str:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.failure_rate:
+            raise ConnectionError(f"{self.name} unavailable")
+        return f"{self.name}-{uuid.uuid4().hex[:8]}"
+
+
+class HttpChannel(ChannelAdapter):
+    """Posts {"notice_id", "kind", "text"} to a channel gateway URL; expects {"post_id"} back."""
+
+    def __init__(self, name: str, url: str, client: httpx.AsyncClient):
+        super().__init__(name)
+        self.url = url
+        self._client = client
+
+    async def send(self, notice_id: str, kind: str, text: str) -> str:
+        response = await self._client.post(self.url, json={"notice_id": notice_id, "kind": kind, "text": text})
+        if response.status_code == 429:
+            raise ChannelRateLimited(retry_after=float(response.headers.get("Retry-After", "1")))
+        if 400 <= response.status_code < 500:
+            raise ChannelRejected(f"{self.name} rejected the post: HTTP {response.status_code}")
+        response.raise_for_status()
+        return str(response.json().get("post_id", ""))
+
+
+class TokenBucket:
+    """Allows rate acquisitions per second on average, with bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(math.ceil(q * len(ordered))) - 1, len(ordered) - 1)] if q > 0 else ordered[0]
+
+
+@dataclass
+class Delivery:
+    """Delivery state of a notice on one channel."""
+
+    notice_id: str
+    kind: str
+    channel: str
+    text: str
+    status: str = "queued"  # queued, delivered, failed or dropped
+    attempts: int = 0
+    post_id: Optional[str] = None
+    error: Optional[str] = None
+    queued_at: float = field(default_factory=time.perf_counter)
+    latency_ms: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.latency_ms = round((time.perf_counter() - self.queued_at) * 1000, 1)
+        self.done.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "attempts": self.attempts,
+            "post_id": self.post_id,
+            "error": self.error,
+            "latency_ms": self.latency_ms,
+        }
+
+
+@dataclass
+class Notice:
+    """A notice published to every channel."""
+
+    notice_id: str
+    kind: str
+    text: str
+    deliveries: Dict[str, Delivery]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "notice_id": self.notice_id,
+            "kind": self.kind,
+            "text": self.text,
+            "channels": {name: delivery.to_dict() for name, delivery in self.deliveries.items()},
+        }
+
+
+class ChannelQueue:
+    """The queue, workers, rate limiter and counters of one channel."""
+
+    def __init__(self, adapter: ChannelAdapter, limits: Dict[str, float], queue_size: int,
+                 max_attempts: int, backoff: float, max_rate_limit_wait: float = 60.0):
+        self.adapter = adapter
+        self.max_length = int(limits.get("max_length", 280))
+        self.concurrency = int(limits.get("concurrency", 1))
+        self.bucket = TokenBucket(limits.get("rate", 1), limits.get("burst", 1))
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.queue: "asyncio.Queue[Delivery]" = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+        self._send_latency: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._delivery_latency: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {"accepted": 0, "delivered": 0, "failed": 0, "dropped": 0, "retries": 0, "rate_limited": 0}
+
+    def format(self, text: str) -> str:
+        return text if len(text) <= self.max_length else text[:self.max_length - 1] + "…"
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def submit(self, delivery: Delivery) -> None:
+        try:
+            self.queue.put_nowait(delivery)
+            self.counts["accepted"] += 1
+        except asyncio.QueueFull:
+            self.counts["dropped"] += 1
+            delivery.finish("dropped", "channel queue full")
+
+    async def _work(self) -> None:
+        while True:
+            delivery = await self.queue.get()
+            try:
+                await self._deliver(delivery)
+            except Exception as e:
+                delivery.finish("failed", str(e) or type(e).__name__)
+                self.counts["failed"] += 1
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, delivery: Delivery) -> None:
+        # Set by the first 429 of this delivery
+        give_up_at: Optional[float] = None
+        while True:
+            await self.bucket.acquire()
+            delivery.attempts += 1
+            started = time.perf_counter()
+            try:
+                delivery.post_id = await self.adapter.send(delivery.notice_id, delivery.kind, delivery.text)
+            except ChannelRateLimited as e:
+                # Not the notice's fault: hold the whole channel back and try again
+                self.counts["rate_limited"] += 1
+                delivery.attempts -= 1
+                now = time.monotonic()
+                if give_up_at is None:
+                    give_up_at = now + self.max_rate_limit_wait
+                if now + e.retry_after > give_up_at:
+                    delivery.finish("failed", f"rate limited for over {self.max_rate_limit_wait:g} seconds")
+                    self.counts["failed"] += 1
+                    return
+                self.bucket.paused_until = max(self.bucket.paused_until, now + e.retry_after)
+                continue
+            except ChannelRejected as e:
+                delivery.finish("failed", str(e))
+                self.counts["failed"] += 1
+                return
+            except Exception as e:
+                if delivery.attempts >= self.max_attempts:
+                    delivery.finish("failed", str(e) or type(e).__name__)
+                    self.counts["failed"] += 1
+                    return
+                self.counts["retries"] += 1
+                delay = self.backoff * (2 ** (delivery.attempts - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+            self._send_latency.append(time.perf_counter() - started)
+            delivery.finish("delivered")
+            self._delivery_latency.append(delivery.latency_ms / 1000)
+            self.counts["delivered"] += 1
+            return
+
+    async def stop(self, drain_timeout: float) -> None:
+        if drain_timeout > 0 and self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> Dict[str, Any]:
+        send = list(self._send_latency)
+        delivery = list(self._delivery_latency)
+        return {
+            **self.counts,
+            "queue_depth": self.queue.qsize(),
+            "rate": self.bucket.rate,
+            "send_ms_p50": round(_percentile(send, 0.5) * 1000, 1),
+            "send_ms_p95": round(_percentile(send, 0.95) * 1000, 1),
+            "delivery_ms_p50": round(_percentile(delivery, 0.5) * 1000, 1),
+            "delivery_ms_p95": round(_percentile(delivery, 0.95) * 1000, 1),
+            "delivery_ms_max": round(max(delivery, default=0.0) * 1000, 1),
+        }
+
+
+class PublicPublisher:
+    """Publishes notices to every channel through per-channel queues."""
+
+    def __init__(self, adapters: List[ChannelAdapter], limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 queue_size: int = 1000, max_attempts: int = 4, backoff: float = 0.5, wait: float = 0.25,
+                 max_rate_limit_wait: float = 60.0, client: Optional[httpx.AsyncClient] = None):
+        limits = limits if limits is not None else CHANNEL_LIMITS
+        self.wait = wait
+        self._client = client
+        self.channels: Dict[str, ChannelQueue] = {
+            adapter.name: ChannelQueue(adapter, limits.get(adapter.name, {}), queue_size, max_attempts, backoff,
+                                       max_rate_limit_wait)
+            for adapter in adapters
+        }
+        self._notices: "OrderedDict[str, Notice]" = OrderedDict()
+
+    async def publish(self, text: str, kind: str = "update") -> Notice:
+        """
+        Queues text on every channel and waits up to METRO_PUBLISH_WAIT for the deliveries.
+
+        Returns:
+            Notice: Per-channel delivery state; channels still "queued" keep
+                delivering in the background.
+        """
+        notice = Notice(notice_id=f"ntc-{uuid.uuid4().hex[:12]}", kind=kind, text=text, deliveries={})
+        for name, channel in self.channels.items():
+            channel.start()
+            delivery = Delivery(notice_id=notice.notice_id, kind=kind, channel=name, text=channel.format(text))
+            notice.deliveries[name] = delivery
+            channel.submit(delivery)
+
+        self._notices[notice.notice_id] = notice
+        while len(self._notices) > NOTICE_HISTORY:
+            self._notices.popitem(last=False)
+
+        if self.wait > 0:
+            pending = [asyncio.ensure_future(delivery.done.wait())
+                       for delivery in notice.deliveries.values() if not delivery.done.is_set()]
+            if pending:
+                _, still_pending = await asyncio.wait(pending, timeout=self.wait)
+                for waiter in still_pending:
+                    waiter.cancel()
+        return notice
+
+    def get(self, notice_id: str) -> Optional[Notice]:
+        return self._notices.get(notice_id)
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Gives queued notices up to drain_timeout seconds to go out, then stops the workers."""
+        await asyncio.gather(*(channel.stop(drain_timeout) for channel in self.channels.values()))
+        if self._client is not None:
+            await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns counters, queue depth and latency percentiles per channel."""
+        return {name: channel.stats() for name, channel in self.channels.items()}
+
+
+def create_publisher() -> PublicPublisher:
+    """Builds the publisher for METRO_PUBLISH_GATEWAY and METRO_PUBLISH_CHANNELS."""
+    names = [name.strip() for name in os.getenv("METRO_PUBLISH_CHANNELS", ",".join(CHANNEL_LIMITS)).split(",") if name.strip()]
+    gateway = os.getenv("METRO_PUBLISH_GATEWAY", "stub")
+    client = None
+    if gateway == "stub":
+        latency = float(os.getenv("METRO_STUB_CHANNEL_LATENCY", "0.1"))
+        failure_rate = float(os.getenv("METRO_STUB_CHANNEL_FAILURE_RATE", "0"))
+        adapters: List[ChannelAdapter] = [StubChannel(name, latency, failure_rate) for name in names]
+    elif gateway.startswith(("http://", "https://")):
+        connections = int(sum(CHANNEL_LIMITS.get(name, {}).get("concurrency", 1) for name in names))
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        )
+        adapters = [HttpChannel(name, f"{gateway.rstrip('/')}/channels/{name}", client) for name in names]
+    else:
+        raise ValueError(f"Unknown publish gateway: {gateway}")
+    return PublicPublisher(
+        adapters,
+        queue_size=int(os.getenv("METRO_PUBLISH_QUEUE_SIZE", "1000")),
+        max_attempts=int(os.getenv("METRO_PUBLISH_MAX_ATTEMPTS", "4")),
+        backoff=float(os.getenv("METRO_PUBLISH_BACKOFF", "0.5")),
+        wait=float(os.getenv("METRO_PUBLISH_WAIT", "0.25")),
+        max_rate_limit_wait=float(os.getenv("METRO_PUBLISH_MAX_RATE_LIMIT_WAIT", "60")),
+        client=client,
+    )
+
+
+_publisher: Optional[PublicPublisher] = None
+
+
+def get_public_publisher() -> PublicPublisher:
+    """Returns the process-wide publisher, creating it on first use."""
+    global _publisher
+    if _publisher is None:
+        _publisher = create_publisher()
+    return _publisher
+
+
+async def close_public_publisher() -> None:
+    """Drains and stops the publisher, if it was created."""
+    global _publisher
+    if _publisher is not None:
+        await _publisher.close()
+        _publisher = None
@@ -0,0 +1,139 @@
+"""
+stub_server.py
+
+Local stand-in for the external gateways, for load tests and development.
+
+POST /drivers/page accepts the batches HttpDriverGateway sends and answers
+like a paging provider would, using StubDriverGateway for latency, transient
+failures and the rate limit (a 429 with Retry-After when it is exceeded).
+
+POST /channels/{channel} stands in for the public channels of
+services/public_publisher.py (x, facebook, instagram, app_push,
+station_displays): it answers after METRO_STUB_CHANNEL_LATENCY, fails with
+METRO_STUB_CHANNEL_FAILURE_RATE and returns 429 above the channel's rate in
+CHANNEL_LIMITS.
+
+Run from /app:
+    uvicorn services.stub_server:app --port 8900
+and point the app at it:
+    METRO_DRIVER_GATEWAY=http://localhost:8900/drivers/page
+    METRO_PUBLISH_GATEWAY=http://localhost:8900
+
+The METRO_STUB_* settings of services/driver_dispatch.py apply. With
+METRO_STUB_ACK_URL set (e.g. http://localhost:8000/api/metro_task/acks) the
+simulated drivers post their acknowledgments back to the app.
+"""
+
+import asyncio
+import math
+import os
+import random
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Set
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from services.driver_dispatch import Driver, GatewayRateLimited, StubDriverGateway
+from services.public_publisher import CHANNEL_LIMITS
+
+app = FastAPI(title="Metro gateway stubs")
+
+ACK_URL = os.getenv("METRO_STUB_ACK_URL")
+_ack_client = httpx.AsyncClient(timeout=10.0) if ACK_URL else None
+_ack_tasks: Set[asyncio.Task] = set()
+
+
+async def _post_ack(dispatch_id: str, driver_id: str) -> None:
+    try:
+        await _ack_client.post(ACK_URL, json={"dispatch_id": dispatch_id, "driver_ids": [driver_id]})
+    except httpx.HTTPError as e:
+        print(f"Could not post ack of {driver_id} for {dispatch_id}: {e}")
+
+
+def _send_ack(dispatch_id: str, driver_id: str) -> None:
+    task = asyncio.ensure_future(_post_ack(dispatch_id, driver_id))
+    _ack_tasks.add(task)
+    task.add_done_callback(_ack_tasks.discard)
+
+
+driver_gateway = StubDriverGateway.from_env(ack_sink=_send_ack if ACK_URL else None)
+
+
+class Recipient(BaseModel):
+    id: str
+    depot: str = "main"
+    phone: str = ""
+
+
+class PageRequest(BaseModel):
+    dispatch_id: str
+    message: str
+    recipients: List[Recipient]
+
+
+@app.post("/drivers/page")
+async def page_drivers(request: PageRequest):
+    drivers = [Driver(id=r.id, depot=r.depot, phone=r.phone) for r in request.recipients]
+    try:
+        result = await driver_gateway.send_batch(request.dispatch_id, request.message, drivers)
+    except GatewayRateLimited as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))},
+        )
+    return {"delivered": result.delivered, "failed": result.failed, "rejected": result.rejected}
+
+
+class ChannelPost(BaseModel):
+    notice_id: str
+    kind: str = "update"
+    text: str
+
+
+CHANNEL_LATENCY = float(os.getenv("METRO_STUB_CHANNEL_LATENCY", "0.1"))
+CHANNEL_FAILURE_RATE = float(os.getenv("METRO_STUB_CHANNEL_FAILURE_RATE", "0"))
+_channel_requests: Dict[str, Deque[float]] = {name: deque() for name in CHANNEL_LIMITS}
+_channel_posts: Dict[str, int] = {name: 0 for name in CHANNEL_LIMITS}
+
+
+@app.post("/channels/{channel}")
+async def post_to_channel(channel: str, post: ChannelPost):
+    limits = CHANNEL_LIMITS.get(channel)
+    if limits is None:
+        raise HTTPException(status_code=404, detail=f"Unknown channel: {channel}")
+    if len(post.text) > limits["max_length"]:
+        raise HTTPException(status_code=422, detail=f"Text longer than {limits['max_length']:g} characters")
+
+    # Sliding one-second window at the channel's rate
+    now = time.monotonic()
+    recent = _channel_requests[channel]
+    while recent and now - recent[0] >= 1.0:
+        recent.popleft()
+    if len(recent) >= limits["rate"]:
+        retry_after = max(math.ceil(1.0 - (now - recent[0])), 1)
+        return JSONResponse(status_code=429, content={"detail": "rate limited"}, headers={"Retry-After": str(retry_after)})
+    recent.append(now)
+
+    await asyncio.sleep(CHANNEL_LATENCY * random.uniform(0.5, 1.5))
+    if random.random() < CHANNEL_FAILURE_RATE:
+        raise HTTPException(status_code=503, detail=f"{channel} unavailable")
+    _channel_posts[channel] += 1
+    return {"post_id": f"{channel}-{uuid.uuid4().hex[:8]}"}
+
+
+@app.get("/stats")
+def stats() -> Dict[str, Any]:
+    return {
+        "drivers": {
+            "latency": driver_gateway.latency,
+            "failure_rate": driver_gateway.failure_rate,
+            "rate_limit": driver_gateway.rate_limit,
+        },
+        "channel_posts": _channel_posts,
+    }
@@ -94,103 +94,241 @@ document.addEventListener('DOMContentLoaded', () => {
         if (loadingIndicator) loadingIndicator.classList.remove('hidden');
         if (submitButton) submitButton.disabled = true;
         
-        // Define the API URL
-        const apiUrl = "/api/metro_task/fallback/text";
+        // Show result section with an empty timeline
+        if (resultSection) resultSection.style.display = "block";
+        resultSteps.innerHTML = "";
+        resultSection.scrollIntoView({ behavior: 'smooth' });
         
         try {
             console.log(`Processing incident: ${incident}`);
             
-            const response = await fetch(apiUrl, {
-                method: "POST",
-                headers: { 
-                    "Content-Type": "application/json",
-                    "Accept": "application/json"
-                },
-                body: JSON.stringify({ text: incident })
-            });
-            
-            let data;
+            const done = await streamIncident(incident);
             
-            try {
-                data = await response.json();
-            } catch (parseError) {
-                console.error("Error parsing response:", parseError);
-                data = {
-                    status: "error",
-                    message: "Invalid response format",
-                    steps: getMockSteps()
-                };
+            if (done.status === "partial") {
+                resultSteps.insertAdjacentHTML('beforeend', `
+                    <div class="notice">
+                        <strong>⏱️ Note:</strong> The response was stopped before every agent replied.
+                        <span class="notice-details"></span>
+                    </div>
+                `);
+                resultSteps.lastElementChild.querySelector('.notice-details').textContent = `(${done.stop_reason || "run budget reached"})`;
+            } else if (done.status !== "completed") {
+                // Show notice about fallback
+                resultSteps.insertAdjacentHTML('afterbegin', `
+                    <div class="notice">
+                        <strong>⚠️ Note:</strong> Using automated response system.
+                        <span class="notice-details">(${done.status})</span>
+                    </div>
+                `);
             }
             
-            // Show result section
-            if (resultSection) resultSection.style.display = "block";
+        } catch (err) {
+            console.error("Streaming error, falling back:", err);
+            await processIncidentFallback(incident);
             
-            // Smooth scroll to results
-            resultSection.scrollIntoView({ behavior: 'smooth' });
+        } finally {
+            // Hide loading indicator
+            if (loadingIndicator) loadingIndicator.classList.add('hidden');
+            if (submitButton) submitButton.disabled = false;
+        }
+    }
+    
+    // Stream steps from the server and render each one as soon as it arrives
+    async function streamIncident(incident) {
+        const response = await fetch("/api/metro_task/run/stream?tokens=true", {
+            method: "POST",
+            headers: { 
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream"
+            },
+            body: JSON.stringify({ text: incident })
+        });
+        
+        if (!response.ok || !response.body) {
+            throw new Error(`Stream request failed with status ${response.status}`);
+        }
+        
+        const stepsContainer = getStepsContainer();
+        const typingIndicator = createTypingIndicator();
+        stepsContainer.appendChild(typingIndicator);
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let stepCount = 0;
+        const liveSteps = {};
+        let done = { status: "error", message: "Stream ended unexpectedly" };
+        
+        while (true) {
+            const { value, done: streamClosed } = await reader.read();
+            if (streamClosed) break;
+            buffer += decoder.decode(value, { stream: true });
             
-            if (data.steps && data.steps.length > 0) {
-                if (data.status !== "completed") {
-                    // Show notice about fallback
-                    resultSteps.innerHTML = `
-                        <div class="notice">
-                            <strong>⚠️ Note:</strong> Using automated response system.
-                            <span class="notice-details">(${data.status})</span>
-                        </div>
-                    `;
-                } else {
-                    resultSteps.innerHTML = "";
+            // SSE frames are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                const frame = parseSseFrame(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!frame) continue;
+                
+                if (frame.event === "token") {
+                    // Show partial model output in a provisional step until the agent finishes.
+                    // Independent agents can run concurrently, so keep one per agent.
+                    let liveStep = liveSteps[frame.data.name];
+                    if (!liveStep) {
+                        liveStep = renderStep({ name: frame.data.name, content: "" }, stepCount + Object.keys(liveSteps).length, stepsContainer);
+                        liveStep.classList.add('step-live');
+                        liveSteps[frame.data.name] = liveStep;
+                    }
+                    liveStep.querySelector('.step-content').textContent += frame.data.content;
+                } else if (frame.event === "step") {
+                    if (liveSteps[frame.data.name]) {
+                        liveSteps[frame.data.name].remove();
+                        delete liveSteps[frame.data.name];
+                    }
+                    const stepEl = renderStep(frame.data, stepCount, stepsContainer);
+                    const firstLive = stepsContainer.querySelector('.step-live');
+                    if (firstLive) stepsContainer.insertBefore(stepEl, firstLive);
+                    stepCount += 1;
+                } else if (frame.event === "done") {
+                    done = frame.data;
                 }
                 
-                displayStepsSequentially(data.steps);
-            } else {
-                resultSteps.innerHTML = `
-                    <div class="notice">
-                        <strong>⚠️ System Notice:</strong> Using fallback response protocol.
-                    </div>
-                `;
-                displayStepsSequentially(getMockSteps());
+                // Keep the typing indicator below the newest step while the run is active
+                stepsContainer.appendChild(typingIndicator);
             }
+        }
+        
+        if (typingIndicator.parentNode) {
+            typingIndicator.parentNode.removeChild(typingIndicator);
+        }
+        return done;
+    }
+    
+    // Parse a single "event: ...\ndata: ..." SSE frame
+    function parseSseFrame(frame) {
+        let event = "message";
+        const dataLines = [];
+        frame.split("\n").forEach(line => {
+            if (line.startsWith("event:")) event = line.slice(6).trim();
+            else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+        });
+        if (!dataLines.length) return null;
+        try {
+            return { event, data: JSON.parse(dataLines.join("\n")) };
+        } catch (parseError) {
+            console.error("Error parsing stream frame:", parseError);
+            return null;
+        }
+    }
+    
+    // Non-streaming fallback used when the stream cannot be opened
+    async function processIncidentFallback(incident) {
+        try {
+            const response = await fetch("/api/metro_task/fallback/text", {
+                method: "POST",
+                headers: { 
+                    "Content-Type": "application/json",
+                    "Accept": "application/json"
+                },
+                body: JSON.stringify({ text: incident })
+            });
+            const data = await response.json();
+            
+            resultSteps.innerHTML = `
+                <div class="notice">
+                    <strong>⚠️ System Notice:</strong> Using fallback response protocol.
+                </div>
+            `;
+            displayStepsSequentially(data.steps && data.steps.length > 0 ? data.steps : getMockSteps());
             
         } catch (err) {
             console.error("Error:", err);
             
-            if (resultSection) resultSection.style.display = "block";
             resultSteps.innerHTML = `
                 <div class="notice">
                     <strong>⚠️ Connection Error:</strong> Using emergency response protocol.
                 </div>
             `;
             displayStepsSequentially(getMockSteps());
-            
-        } finally {
-            // Hide loading indicator
-            if (loadingIndicator) loadingIndicator.classList.add('hidden');
-            if (submitButton) submitButton.disabled = false;
         }
     }
     
-    // Display steps with professional animation and consistent 1.5s delay between steps
-    function displayStepsSequentially(steps) {
-        if (!steps || !steps.length) return;
-        
-        // Clear previous content if needed
+    function getStepsContainer() {
         if (!resultSteps.querySelector('.steps-container')) {
             resultSteps.innerHTML = resultSteps.innerHTML + '<div class="steps-container"></div>';
         }
+        return resultSteps.querySelector('.steps-container');
+    }
+    
+    function createTypingIndicator() {
+        const typingIndicator = document.createElement('div');
+        typingIndicator.className = 'typing-indicator';
+        typingIndicator.innerHTML = '<span></span><span></span><span></span>';
+        return typingIndicator;
+    }
+    
+    // Create, animate and append a single step element
+    function renderStep(step, index, stepsContainer) {
+        const stepEl = document.createElement('div');
+        stepEl.className = 'step-item';
+        stepEl.style.opacity = '0';
+        stepEl.style.transform = 'translateY(20px)';
+        
+        // Determine agent icon
+        let agentIcon = '🤖';
+        if (step.name.includes('TrainBreakdown')) agentIcon = '🚨';
+        else if (step.name.includes('DriverCoordination')) agentIcon = '📣';
+        else if (step.name.includes('DepotMaintenance')) agentIcon = '🚍';
+        else if (step.name.includes('PublicCommunication')) agentIcon = '⚠️';
+        else if (step.name.includes('IncidentResolution')) agentIcon = '✅';
+        else if (step.name.includes('InternalNotification')) agentIcon = '📨';
+        else if (step.name.includes('PublicUpdate')) agentIcon = '📢';
+        
+        // Format the agent name to be more readable
+        const formattedName = step.name
+            .replace(/([A-Z])/g, ' $1')
+            .replace(/^./, str => str.toUpperCase())
+            .trim();
+        
+        stepEl.innerHTML = `
+            <div class="step-header">
+                <span class="step-icon">${agentIcon}</span>
+                <span class="step-name">${formattedName}</span>
+                <span class="step-number">${index + 1}</span>
+            </div>
+            <div class="step-content"></div>
+        `;
+        stepEl.querySelector('.step-content').textContent = step.content;
+        
+        stepsContainer.appendChild(stepEl);
+        
+        // Add appearing animation with subtle bounce
+        setTimeout(() => {
+            stepEl.style.transition = 'all 0.6s cubic-bezier(0.2, 0.8, 0.2, 1.0)';
+            stepEl.style.opacity = '1';
+            stepEl.style.transform = 'translateY(0)';
+        }, 50);
+        
+        // Scroll the new step into view with smooth animation
+        stepEl.scrollIntoView({ behavior: 'smooth', block: 'end' });
+        return stepEl;
+    }
+    
+    // Display pre-computed steps (fallback/mock data) with a fixed delay between steps
+    function displayStepsSequentially(steps) {
+        if (!steps || !steps.length) return;
         
-        const stepsContainer = resultSteps.querySelector('.steps-container');
+        const stepsContainer = getStepsContainer();
         stepsContainer.innerHTML = ''; // Clear any existing steps
         
-        // Fixed 1.5 second delay between steps (1000ms) as requested
+        // Fixed 1 second delay between steps
         const stepDelay = 1000; 
         
         // Add a "typing" indicator that moves between agents
-        const typingIndicator = document.createElement('div');
-        typingIndicator.className = 'typing-indicator';
-        typingIndicator.innerHTML = '<span></span><span></span><span></span>';
+        const typingIndicator = createTypingIndicator();
         stepsContainer.appendChild(typingIndicator);
         
-        // Process each step with the exact 1.5 second delay
         steps.forEach((step, index) => {
             setTimeout(() => {
                 // Remove typing indicator from previous position
@@ -198,54 +336,13 @@ document.addEventListener('DOMContentLoaded', () => {
                     typingIndicator.parentNode.removeChild(typingIndicator);
                 }
                 
-                // Create the step element
-                const stepEl = document.createElement('div');
-                stepEl.className = 'step-item';
-                stepEl.style.opacity = '0';
-                stepEl.style.transform = 'translateY(20px)';
-                
-                // Determine agent icon
-                let agentIcon = '🤖';
-                if (step.name.includes('TrainBreakdown')) agentIcon = '🚨';
-                else if (step.name.includes('DriverCoordination')) agentIcon = '📣';
-                else if (step.name.includes('DepotMaintenance')) agentIcon = '🚍';
-                else if (step.name.includes('PublicCommunication')) agentIcon = '⚠️';
-                else if (step.name.includes('IncidentResolution')) agentIcon = '✅';
-                else if (step.name.includes('InternalNotification')) agentIcon = '📨';
-                else if (step.name.includes('PublicUpdate')) agentIcon = '📢';
-                
-                // Format the agent name to be more readable
-                const formattedName = step.name
-                    .replace(/([A-Z])/g, ' $1')
-                    .replace(/^./, str => str.toUpperCase())
-                    .trim();
-                
-                stepEl.innerHTML = `
-                    <div class="step-header">
-                        <span class="step-icon">${agentIcon}</span>
-                        <span class="step-name">${formattedName}</span>
-                        <span class="step-number">${index + 1}</span>
-                    </div>
-                    <div class="step-content">${step.content}</div>
-                `;
-                
-                stepsContainer.appendChild(stepEl);
-                
-                // Add appearing animation with subtle bounce
-                setTimeout(() => {
-                    stepEl.style.transition = 'all 0.6s cubic-bezier(0.2, 0.8, 0.2, 1.0)';
-                    stepEl.style.opacity = '1';
-                    stepEl.style.transform = 'translateY(0)';
-                }, 50);
-                
-                // Scroll the new step into view with smooth animation
-                stepEl.scrollIntoView({ behavior: 'smooth', block: 'end' });
+                renderStep(step, index, stepsContainer);
                 
                 // Add the typing indicator for the next step (if not the last step)
                 if (index < steps.length - 1) {
                     stepsContainer.appendChild(typingIndicator);
                 }
-            }, index * stepDelay); // Exactly 1.5 seconds (1000) between each step
+            }, index * stepDelay);
         });
     }
     
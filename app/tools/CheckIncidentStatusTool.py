@@ -1,28 +1,62 @@
 """
 CheckIncidentStatusTool.py
 
-Simulates querying metro operational systems to confirm whether
-a reported disruption has been resolved. Used by IncidentResolutionAgent.
+Looks up the most recent incident at a station or on a line in the incident
+store (services/incident_store.py) and, while it is still open, waits for
+its resolved event for up to METRO_RESOLUTION_TIMEOUT seconds. One call
+covers the whole wait, so IncidentResolutionAgent needs no further model
+turns to poll. Used by IncidentResolutionAgent.
 """
 
+import os
+import time
 from typing import Annotated
 
+from services.incident_store import get_incident_store
 
-def check_incident_status(
+
+async def check_incident_status(
     location: Annotated[str, "The affected station or location to check for resolution status."]
 ) -> dict:
     """
-    Simulates checking if train service has resumed at a specific location.
+    Checks if train service has resumed at a specific location, waiting for
+    the incident to be resolved if it is still open.
 
     Args:
         location (str): Name of the disrupted station or metro line.
 
     Returns:
-        dict: Contains resolution status and a human-readable message.
+        dict: Contains resolution status, the incident checked (if any), how
+            long the call waited and a human-readable message.
     """
-    # Simulated fixed response
-    resolved = True
+    store = get_incident_store()
+    incident = await store.latest_at(location)
+    if incident is None:
+        return {
+            "resolved": True,
+            "incident_id": None,
+            "message": f"✅ No incident is recorded at {location}; normal train service is running."
+        }
+
+    started = time.perf_counter()
+    timeout = float(os.getenv("METRO_RESOLUTION_TIMEOUT", "30"))
+    if not incident.resolved and timeout > 0:
+        incident = await store.wait_for_status(incident.id, ("resolved",), timeout) or incident
+    waited_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    # The message names the place as asked; the result carries the normalized location
+    if incident.resolved:
+        message = f"✅ Normal train service has resumed at {location} (incident {incident.id} resolved)."
+    else:
+        message = (
+            f"⚠️ Incident {incident.id} at {location} is still {incident.status} "
+            f"(waited {waited_ms / 1000:.1f} seconds); service has not resumed yet."
+        )
     return {
-        "resolved": resolved,
-        "message": f"✅ Normal train service has resumed at {location}."
+        "resolved": incident.resolved,
+        "incident_id": incident.id,
+        "location": incident.location,
+        "status": incident.status,
+        "waited_ms": waited_ms,
+        "message": message
     }
@@ -1,27 +1,56 @@
 """
 ConfirmDriverAckTool.py
 
-Simulates checking how many of the 10 notified drivers have acknowledged
-a dispatch request. Used by DriverCoordinationAgent in AutoGen v0.5.6.
+Waits for standby drivers to acknowledge a dispatch sent by notify_driver,
+using the ack tracker (services/ack_tracker.py). One call blocks until
+enough drivers have acknowledged or METRO_ACK_TIMEOUT passes, so the agent
+does not need further model turns to poll. Used by DriverCoordinationAgent
+in AutoGen v0.5.6.
 """
 
 from typing import Annotated
 
+from autogen_core import CancellationToken
 
-def confirm_driver_ack(
-    expected: Annotated[int, "The number of drivers expected to acknowledge (e.g., 10)."]
+from services.ack_tracker import ack_timeout, get_ack_tracker
+
+
+async def confirm_driver_ack(
+    expected: Annotated[int, "The number of drivers expected to acknowledge (e.g., 10); capped at the drivers reached."],
+    dispatch_id: Annotated[str, "The dispatch ID returned by notify_driver; leave empty for this turn's dispatch."] = "",
+    cancellation_token: CancellationToken = None,
 ) -> dict:
     """
-    Simulates confirming driver acknowledgments.
+    Waits until the expected number of drivers acknowledged a dispatch.
+
+    If dispatch_id is not a known dispatch, the dispatch sent by notify_driver
+    in the same agent turn is used (the two tools are usually called together).
+    Without such a call the tool returns after a short grace period instead of
+    waiting for the ack timeout.
 
     Args:
         expected (int): Number of driver responses expected.
+        dispatch_id (str): ID returned by notify_driver.
 
     Returns:
-        dict: Count of acknowledgments and a confirmation message.
+        dict: Dispatch ID, ack count, target and whether the wait timed out,
+            plus a confirmation message.
     """
-    ack_count = expected  # Simulate 100% acknowledgment
-    return {
-        "ack_count": ack_count,
-        "message": f"✅ All {ack_count} drivers have acknowledged and are ready."
-    }
+    tracker = get_ack_tracker()
+    timeout = ack_timeout()
+    if tracker.get(dispatch_id) is None:
+        dispatch_id = None
+        if cancellation_token is not None:
+            dispatch_id = await tracker.dispatch_for(cancellation_token, timeout)
+        if dispatch_id is None:
+            return {"ack_count": 0, "message": "⚠️ No dispatch found to confirm; call notify_driver first."}
+
+    status = await tracker.wait_for_acks(dispatch_id, expected, timeout)
+    if status["complete"]:
+        status["message"] = f"✅ {status['ack_count']} drivers have acknowledged dispatch {dispatch_id} and are ready."
+    else:
+        status["message"] = (
+            f"⚠️ Only {status['ack_count']} of {status['target']} drivers acknowledged dispatch {dispatch_id} "
+            f"within {timeout:g} seconds."
+        )
+    return status
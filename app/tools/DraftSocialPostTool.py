@@ -1,36 +1,46 @@
 """
 DraftSocialPostTool.py
 
-Simulates creating a short, public-facing message about the metro disruption.
-The message is designed to fit within 280 characters (e.g., for X/Twitter).
+Creates a short, public-facing message about the metro disruption and
+publishes it to every public channel through the publisher
+(services/public_publisher.py). Each channel gets the message cut to its own
+length limit (280 characters for X).
 """
-#
-# from autogen_agentchat.function_calling_tool import FunctionCallingTool
+
 from typing import Annotated
 
+from services.public_publisher import get_public_publisher
+
 
-def draft_social_post(
+async def draft_social_post(
     disruption_info: Annotated[str, "Summary of the disruption including location, delay, and shuttle availability."]
-) -> str:
+) -> dict:
     """
-    Generates a public-facing disruption update message.
+    Generates and publishes a public-facing disruption update message.
+
+    Returns once the alert is queued on every channel (after at most
+    METRO_PUBLISH_WAIT seconds); slower channels keep delivering in the
+    background.
 
     Args:
         disruption_info (str): Short description of what commuters should know.
 
     Returns:
-        str: A message under 280 characters for public posting.
+        dict: The post, its notice ID, the delivery status per channel and
+            a confirmation message.
     """
     base_message = (
         f"⚠️ Service Alert: {disruption_info}. "
         "Shuttle buses have been deployed. We apologize for the inconvenience. #MetroUpdate"
     )
-
-    return base_message if len(base_message) <= 280 else base_message[:277] + "..."
-
-
-# draft_social_post_tool = FunctionCallingTool(
-#     name="draft_social_post",
-#     description="Creates a 280-character message about the metro disruption for public posting.",
-#     func=draft_social_post
-# )
+    post = base_message if len(base_message) <= 280 else base_message[:277] + "..."
+
+    notice = await get_public_publisher().publish(post, kind="alert")
+    statuses = {name: delivery.status for name, delivery in notice.deliveries.items()}
+    delivered = sum(1 for status in statuses.values() if status == "delivered")
+    return {
+        "post": post,
+        "notice_id": notice.notice_id,
+        "channels": statuses,
+        "message": f"{post}\nPosted to {delivered} of {len(statuses)} public channels so far.",
+    }
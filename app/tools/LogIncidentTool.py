@@ -2,22 +2,44 @@
 LogIncidentTool.py
 
 Defines the log_incident function used by TrainBreakdownAgent
-to register a train disruption. Wrapped using Function.from_function().
+to register a train disruption in the incident store
+(services/incident_store.py). Wrapped as a PooledFunctionTool.
 """
 
 from typing import Annotated
 
+from services.incident_store import get_incident_store
 
-def log_incident(
-    location: Annotated[str, "The location (e.g., station or line) where the train breakdown occurred."]
-) -> str:
+
+async def log_incident(
+    location: Annotated[str, "The location (e.g., station or line) where the train breakdown occurred."],
+    description: Annotated[str, "The incident report as received."] = "",
+) -> dict:
     """
-    Simulates logging a metro disruption incident.
+    Records a metro disruption incident.
+
+    A report matching an incident that is still open at the same location is
+    recorded as another report of that incident.
 
     Args:
         location (str): Name of the station or area impacted.
+        description (str): The incident report; defaults to the location.
 
     Returns:
-        str: Acknowledgment message.
+        dict: The incident ID, status, location and number of reports, plus
+            an acknowledgment message.
     """
-    return f"🚨 Disruption recorded successfully at: {location}. Further response steps initiated."
+    incident = await get_incident_store().log(description or location, location=location)
+    # The message names the place as reported; the result carries the normalized location
+    if incident.reports > 1:
+        message = f"🚨 Additional report recorded for open incident {incident.id} at {location} ({incident.reports} reports)."
+    else:
+        message = f"🚨 Disruption recorded successfully at: {location} as incident {incident.id}. Further response steps initiated."
+    return {
+        "incident_id": incident.id,
+        "status": incident.status,
+        "incident_type": incident.incident_type,
+        "location": incident.location or location,
+        "reports": incident.reports,
+        "message": message,
+    }
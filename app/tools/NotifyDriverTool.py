@@ -1,24 +1,49 @@
 """
 NotifyDriverTool.py
 
-Defines a tool function that simulates sending a dispatch message
-to 10 standby bus drivers. This function is registered via
-Function.from_function() in the DriverCoordinationAgent.
+Defines a tool function that pages the standby bus drivers with a dispatch
+message through the driver dispatch engine (services/driver_dispatch.py).
+This function is registered as a PooledFunctionTool in the
+DriverCoordinationAgent.
 """
 
 from typing import Annotated
 
+from autogen_core import CancellationToken
 
-def notify_driver(
-    message: Annotated[str, "The dispatch message to be sent to 10 standby drivers."]
-) -> str:
+from services.ack_tracker import get_ack_tracker
+from services.driver_dispatch import get_dispatch_engine
+
+
+async def notify_driver(
+    message: Annotated[str, "The dispatch message to be sent to the standby drivers."],
+    cancellation_token: CancellationToken = None,
+) -> dict:
     """
-    Simulates notifying drivers of a dispatch order.
+    Sends a dispatch order to every standby driver on the roster and starts
+    tracking the acknowledgments of the drivers it reached.
 
     Args:
         message (str): Content of the message to be sent to drivers.
 
     Returns:
-        str: Confirmation that the message was delivered.
+        dict: The dispatch ID and delivery counts (recipients, delivered,
+            failed, rejected, retries, rate_limited, gateway_requests,
+            elapsed_ms) plus a confirmation message.
     """
-    return f"📣 Notification sent to 10 standby drivers: '{message}'. Awaiting acknowledgments."
+    tracker = get_ack_tracker()
+    # Marked first so confirm_driver_ack of the same turn waits for this dispatch
+    tracker.expect(cancellation_token)
+    try:
+        result = await get_dispatch_engine().dispatch(message)
+    except BaseException:
+        tracker.abandon(cancellation_token)
+        raise
+    # Registered with the turn's token so confirm_driver_ack of the same turn can find it
+    tracker.register(result.dispatch_id, result.delivered_ids, scope=cancellation_token)
+    summary = result.to_dict()
+    summary["message"] = (
+        f"📣 Dispatch {result.dispatch_id} delivered to {result.delivered} of {result.recipients} "
+        "standby drivers. Awaiting acknowledgments."
+    )
+    return summary
@@ -1,23 +1,39 @@
 """
 PostPublicUpdateTool.py
 
-Simulates posting a final public-facing message to confirm that metro train
-service has been restored. Used by the PublicUpdateAgent.
+Posts the final public-facing message confirming that metro train service
+has been restored to every public channel, through the publisher
+(services/public_publisher.py). Used by the PublicUpdateAgent.
 """
 
 from typing import Annotated
 
+from services.public_publisher import get_public_publisher
 
-def post_public_update(
+
+async def post_public_update(
     summary: Annotated[str, "Final public message confirming full service restoration."]
-) -> str:
+) -> dict:
     """
-    Simulates publicly announcing that service has resumed.
+    Publicly announces that service has resumed.
+
+    Returns once the notice is queued on every channel (after at most
+    METRO_PUBLISH_WAIT seconds); slower channels keep delivering in the
+    background.
 
     Args:
         summary (str): Short, commuter-friendly message.
 
     Returns:
-        str: Confirmation that the message was posted.
+        dict: The notice ID, the delivery status per channel and a
+            confirmation message.
     """
-    return f"📢 Public update posted: '{summary}'. Thank you for your patience. #MetroServiceResumed"
+    text = f"📢 {summary} Thank you for your patience. #MetroServiceResumed"
+    notice = await get_public_publisher().publish(text, kind="resolution")
+    statuses = {name: delivery.status for name, delivery in notice.deliveries.items()}
+    delivered = sum(1 for status in statuses.values() if status == "delivered")
+    return {
+        "notice_id": notice.notice_id,
+        "channels": statuses,
+        "message": f"📢 Public update posted to {delivered} of {len(statuses)} channels so far: '{summary}'"
+    }
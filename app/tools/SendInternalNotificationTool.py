@@ -1,26 +1,49 @@
 """
 SendInternalNotificationTool.py
 
-Simulates notifying internal teams (Control Room, Depot, Bus Operations)
-that metro service has been restored after a disruption.
+Notifies internal teams (Control Room, Depot, Bus Operations, Maintenance)
+that metro service has been restored after a disruption, through the
+internal notification bus (services/notification_bus.py).
 """
 
 from typing import Annotated
 
+from planner.IncidentParser import parse_incident
+from services.notification_bus import DEFAULT_TOPICS, get_notification_bus
 
-def send_internal_notification(
+
+async def send_internal_notification(
     summary: Annotated[str, "A brief resolution message for internal teams."]
-) -> str:
+) -> dict:
     """
-    Simulates sending a resolution update internally.
+    Publishes a resolution update to the internal teams' topics, plus the
+    line and station named in the summary.
 
     Args:
         summary (str): A message indicating the issue is resolved.
 
     Returns:
-        str: Confirmation message for internal teams.
+        dict: The notification ID, the topics, and how many subscribers
+            received, dropped and acknowledged it.
     """
-    return (
-        f"📨 Internal notification sent: '{summary}'. "
-        "Control Room, Depot, and Bus Operations teams have been informed."
+    parsed = parse_incident(summary)
+    topics = list(DEFAULT_TOPICS)
+    if parsed.line:
+        topics.append(f"line:{parsed.line}")
+    if parsed.station:
+        topics.append(f"station:{parsed.station}")
+
+    notification = await get_notification_bus().publish(summary, topics)
+    counts = notification.counts()
+    message = (
+        f"📨 Internal notification sent: '{summary}' "
+        f"{counts['acknowledged']} of {counts['recipients']} subscribed teams have acknowledged."
     )
+    if counts["dropped"]:
+        message += f" {counts['dropped']} could not take it (queue full)."
+    return {
+        "notification_id": notification.id,
+        "topics": topics,
+        **counts,
+        "message": message,
+    }
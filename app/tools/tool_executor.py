@@ -0,0 +1,235 @@
+"""
+tool_executor.py
+
+Runs the agents' tools without blocking the event loop.
+
+AutoGen's FunctionTool runs synchronous tools on the loop's default executor
+with no limit per tool and no timeout. Once tools talk to real gateways
+(driver paging, public channels, internal notifications) a slow gateway would
+tie up every thread and stall all other incidents. PooledFunctionTool routes
+every call through the process-wide ToolExecutor instead:
+
+- synchronous tools run on a dedicated, bounded thread pool
+- async tools are awaited directly on the event loop
+- each tool has a concurrency limit; calls beyond it queue
+- each call has a timeout, after which the agent gets an error result
+
+Queueing and execution time are recorded per tool (stats() and /metrics).
+Dict results reach the agent as JSON, so MetroPlanner can show their
+"message" as the step while the model still sees every field.
+A timed-out synchronous call keeps its thread until the function returns;
+the pool size bounds how many such threads can pile up.
+
+Settings (environment variables):
+- METRO_TOOL_THREADS: threads for synchronous tools (default 16)
+- METRO_TOOL_CONCURRENCY: concurrent calls per tool (default 8)
+- METRO_TOOL_TIMEOUT: seconds per tool call (default 15)
+Per-tool overrides live in TOOL_LIMITS.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from autogen_core import CancellationToken
+from autogen_core.tools import FunctionTool
+from pydantic import BaseModel
+
+from config.metrics import TOOL_DURATION, TOOL_QUEUE_DURATION, outcome_of
+
+# Per-tool limits: {"concurrency": calls at once, "timeout": seconds}. Tools
+# without an entry use METRO_TOOL_CONCURRENCY and METRO_TOOL_TIMEOUT.
+TOOL_LIMITS: Dict[str, Dict[str, float]] = {
+    # Paging drivers fans out to many recipients and may take a while
+    "notify_driver": {"timeout": 30},
+    # Mostly waits on the ack tracker without using a thread; a low limit would queue whole runs behind it
+    "confirm_driver_ack": {"concurrency": 1000, "timeout": 30},
+    # Waits for the incident's resolution event, likewise without a thread
+    "check_incident_status": {"concurrency": 1000, "timeout": 45},
+}
+
+
+class ToolTimeoutError(TimeoutError):
+    """A tool call took longer than its timeout."""
+
+
+@dataclass
+class ToolStats:
+    """Counters of one tool."""
+
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    in_flight: int = 0
+    queued: int = 0
+    total_queue: float = 0.0
+    max_queue: float = 0.0
+    total_run: float = 0.0
+    max_run: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "avg_queue_ms": round(self.total_queue / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_queue_ms": round(self.max_queue * 1000, 2),
+            "avg_run_ms": round(self.total_run / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_run_ms": round(self.max_run * 1000, 2),
+        }
+
+
+class ToolExecutor:
+    """Executes tool functions with per-tool concurrency limits and timeouts."""
+
+    def __init__(self, threads: int = 16, concurrency: int = 8, timeout: float = 15.0,
+                 limits: Optional[Dict[str, Dict[str, float]]] = None):
+        self.threads = threads
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.limits = limits if limits is not None else TOOL_LIMITS
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, ToolStats] = {}
+
+    def limit(self, tool: str) -> int:
+        return int(self.limits.get(tool, {}).get("concurrency", self.concurrency))
+
+    def timeout_for(self, tool: str) -> float:
+        return float(self.limits.get(tool, {}).get("timeout", self.timeout))
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="metro-tool")
+        return self._pool
+
+    def _semaphore(self, tool: str) -> asyncio.Semaphore:
+        # Created lazily so it binds to the event loop that runs the tools
+        if tool not in self._semaphores:
+            self._semaphores[tool] = asyncio.Semaphore(self.limit(tool))
+        return self._semaphores[tool]
+
+    async def run(self, tool: str, func: Callable[..., Any], kwargs: Dict[str, Any],
+                  cancellation_token: CancellationToken) -> Any:
+        """
+        Calls func(**kwargs) as tool, once a slot for the tool is free.
+
+        Raises:
+            ToolTimeoutError: If the call exceeds the tool's timeout.
+            asyncio.CancelledError: If the token is cancelled first.
+        """
+        stats = self._stats.setdefault(tool, ToolStats())
+        queued_at = time.perf_counter()
+        stats.queued += 1
+        try:
+            await self._semaphore(tool).acquire()
+        finally:
+            stats.queued -= 1
+
+        # For sync tools the wait for a free thread counts as queueing too
+        started = {"at": time.perf_counter()}
+        stats.in_flight += 1
+        error = None
+        try:
+            if inspect.iscoroutinefunction(func):
+                future = asyncio.ensure_future(func(**kwargs))
+            else:
+                def call() -> Any:
+                    started["at"] = time.perf_counter()
+                    return func(**kwargs)
+                future = asyncio.get_running_loop().run_in_executor(self.pool, call)
+            cancellation_token.link_future(future)
+            timeout = self.timeout_for(tool)
+            try:
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                raise ToolTimeoutError(f"Tool '{tool}' timed out after {timeout:g} seconds") from None
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            finished = time.perf_counter()
+            queue_seconds = max(started["at"] - queued_at, 0.0)
+            run_seconds = max(finished - started["at"], 0.0)
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.total_queue += queue_seconds
+            stats.max_queue = max(stats.max_queue, queue_seconds)
+            stats.total_run += run_seconds
+            stats.max_run = max(stats.max_run, run_seconds)
+            if isinstance(error, ToolTimeoutError):
+                stats.timeouts += 1
+                outcome = "timeout"
+            else:
+                if isinstance(error, Exception):
+                    stats.errors += 1
+                outcome = outcome_of(error)
+            TOOL_QUEUE_DURATION.labels(tool).observe(queue_seconds)
+            TOOL_DURATION.labels(tool, outcome).observe(run_seconds)
+            self._semaphore(tool).release()
+
+    def shutdown(self) -> None:
+        """Stops the thread pool without waiting for running tools; a later call starts a new one."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns limits and queueing/execution counters per tool."""
+        return {
+            "threads": self.threads,
+            "tools": {
+                tool: {"concurrency": self.limit(tool), "timeout": self.timeout_for(tool), **stats.to_dict()}
+                for tool, stats in self._stats.items()
+            },
+        }
+
+
+class PooledFunctionTool(FunctionTool):
+    """
+    A FunctionTool whose calls go through the shared ToolExecutor.
+
+    Takes the same arguments as FunctionTool and accepts sync and async functions.
+    """
+
+    def __init__(self, func: Callable[..., Any], description: str, name: Optional[str] = None, **kwargs: Any):
+        super().__init__(func, description, name=name, **kwargs)
+        self._target = func
+        self._parameters = list(inspect.signature(func).parameters)
+        self._accepts_token = "cancellation_token" in self._parameters
+
+    async def run(self, args: BaseModel, cancellation_token: CancellationToken) -> Any:
+        kwargs = {name: getattr(args, name) for name in self._parameters if hasattr(args, name)}
+        func = self._target
+        if self._accepts_token:
+            func = functools.partial(func, cancellation_token=cancellation_token)
+        return await get_tool_executor().run(self.name, func, kwargs, cancellation_token)
+
+    def return_value_as_string(self, value: Any) -> str:
+        if isinstance(value, dict):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return super().return_value_as_string(value)
+
+
+_executor: Optional[ToolExecutor] = None
+
+
+def get_tool_executor() -> ToolExecutor:
+    """Returns the process-wide tool executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ToolExecutor(
+            threads=int(os.getenv("METRO_TOOL_THREADS", "16")),
+            concurrency=int(os.getenv("METRO_TOOL_CONCURRENCY", "8")),
+            timeout=float(os.getenv("METRO_TOOL_TIMEOUT", "15")),
+        )
+    return _executor
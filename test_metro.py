@@ -1,12 +1,20 @@
 import asyncio
+import os
 from planner.MetroPlanner import MetroPlanner
+from services.incident_store import get_incident_store
+from services.incident_simulator import start_incident_simulator
+
+# Nothing else resolves the incident this script logs
+os.environ.setdefault("METRO_INCIDENT_FEED", "simulator")
 
 async def main():
+    start_incident_simulator(get_incident_store())
     planner = MetroPlanner()
     input_text = "Train breakdown at Redhill Station"
-    messages = await planner.run(input_text)
+    result = await planner.run(input_text)
+    print(f"Status: {result['status']}")
 
-    for i, msg in enumerate(messages, 1):
+    for i, msg in enumerate(result["steps"], 1):
         print(f"\n{i}. [{msg['name']}]")
         print(msg['content'])
 